@@ -0,0 +1 @@
+"""Jeux de données synthétiques et mesures de performance de l'application."""
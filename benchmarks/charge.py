@@ -0,0 +1,397 @@
+"""Test de charge : N sessions simultanées, chacune pilotée par son AppTest.
+
+    python -m benchmarks.charge --sessions 20 --actions 30 --stockage json sqlite --sortie charge.json
+
+Chaque session est un thread du même processus, comme les sessions d'un
+serveur Streamlit : elles partagent le magasin et ses caches. AppTest
+n'exécute qu'un script à la fois par processus (il installe son Runtime le
+temps d'une exécution) : les exécutions passent donc l'une après l'autre, sous
+un verrou, comme le code Python des pages sous le GIL. Entre deux exécutions
+d'une session, celles des autres s'intercalent avec leurs écritures, et le
+précalcul tourne en arrière-plan. Chaque session enchaîne
+des actions tirées au hasard (`MELANGE`) : ouverture d'une page (et d'un
+rapport), saisie d'un paiement, modification ou suppression d'un paiement
+retrouvé par la recherche. Les cibles des modifications et suppressions sont
+ses propres paiements ou des paiements partagés par toutes les sessions
+(notes `cible000`…), pour provoquer des écritures concurrentes.
+
+Chaque mode de stockage est mesuré dans son propre processus, sur une copie
+fraîche des données. Résultats par mode :
+
+- latence de chaque exécution du script (p50, p95, p99, max), en tout et par
+  type d'action, attente du verrou à part, et débit (actions et écritures
+  par seconde) ;
+- écritures perdues, relues sur disque après la charge : paiement saisi
+  absent, paiement supprimé encore là, montant modifié qui n'est aucun de
+  ceux enregistrés ; paiements saisis en double ;
+- écritures en conflit : une session écrit un paiement qu'une autre a écrit
+  depuis qu'elle l'a affiché (la sienne écrase l'autre sans l'avoir vue).
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from .generer import ECHELLES, generer
+from .mesurer import APPLICATION, RACINE, version_du_code
+
+# Part de chaque action dans le parcours d'une session
+MELANGE = {'page': 0.6, 'paiement': 0.2, 'modification': 0.1, 'suppression': 0.1}
+# Paiements partagés, cibles des modifications et suppressions de toutes les sessions
+NB_CIBLES = 10
+# Probabilité qu'une modification ou suppression vise un paiement partagé
+PART_CIBLES_PARTAGEES = 0.3
+MENU_PAIEMENTS = "💳 Paiements"
+MENU_RAPPORTS = "📈 Rapports"
+CENTILES = (50, 95, 99)
+
+
+# Une exécution d'AppTest à la fois dans le processus (voir plus haut)
+VERROU_EXECUTION = threading.Lock()
+
+
+def cible(numero):
+    # Largeur fixe : la recherche par début de mot ne confond pas cible001 et cible010
+    return f"cible{numero:03d}"
+
+
+def preparer(source, dossier, nb_cibles=NB_CIBLES, graine=0):
+    """Copie les données et marque `nb_cibles` paiements au hasard comme cibles partagées."""
+    shutil.copytree(source, dossier)
+    chemin = os.path.join(dossier, 'paiements.json')
+    with open(chemin, encoding='utf-8') as f:
+        paiements = json.load(f)
+    for numero, position in enumerate(random.Random(graine).sample(range(len(paiements)), nb_cibles)):
+        paiements[position]['note'] = cible(numero)
+    with open(chemin, 'w', encoding='utf-8') as f:
+        json.dump(paiements, f, ensure_ascii=False)
+
+
+class Session:
+    """Une session de l'application et son parcours."""
+
+    def __init__(self, numero, nb_cibles, valeurs, journal, delai, graine):
+        from streamlit.testing.v1 import AppTest
+
+        self.numero = numero
+        self.nb_cibles = nb_cibles
+        self.rng = random.Random(graine * 1000 + numero)
+        self._valeurs = valeurs  # montants uniques, partagés par les sessions
+        self._journal = journal  # écritures de toutes les sessions
+        self.latences = []  # (action, secondes)
+        self.attentes = []  # secondes passées à attendre le verrou
+        self.exceptions = 0
+        self.cibles_absentes = 0
+        self.actions = 0
+        self.erreurs = []
+        self._saisis = []  # notes de ses paiements encore là
+        self._nb_saisis = 0
+        self.at = AppTest.from_file(APPLICATION, default_timeout=delai)
+
+    def executer(self, action):
+        demande = time.perf_counter()
+        with VERROU_EXECUTION:
+            debut = time.perf_counter()
+            self.at.run()
+            fin = time.perf_counter()
+        self.attentes.append(debut - demande)
+        self.latences.append((action, fin - debut))
+        self.exceptions += len(self.at.exception)
+        return not self.at.exception
+
+    def _menu(self, menu, action):
+        if self.at.sidebar.selectbox[0].value != menu:
+            self.at.sidebar.selectbox[0].select(menu)
+            self.executer(action)
+
+    def _element(self, elements, libelle):
+        return next(e for e in elements if e.label == libelle)
+
+    def _bouton(self, libelle):
+        return next((b for b in self.at.button if b.label == libelle), None)
+
+    def parcourir(self, nb_actions, pause):
+        self.executer('page')
+        actions, poids = zip(*MELANGE.items())
+        for _ in range(nb_actions):
+            action = self.rng.choices(actions, poids)[0]
+            try:
+                getattr(self, action)()
+            except Exception as erreur:
+                # Délai dépassé, élément introuvable : l'action est comptée en erreur
+                self.erreurs.append(f"session {self.numero}, {action} : {type(erreur).__name__}: {erreur}")
+            self.actions += 1
+            if pause:
+                time.sleep(self.rng.uniform(0, pause))
+
+    def page(self):
+        menus = self.at.sidebar.selectbox[0].options
+        self.at.sidebar.selectbox[0].select(self.rng.choice(menus))
+        self.executer('page')
+        if self.at.sidebar.selectbox[0].value == MENU_RAPPORTS and self.at.radio:
+            self.at.radio[0].set_value(self.rng.choice(self.at.radio[0].options))
+            self.executer('page')
+
+    def paiement(self):
+        self._menu(MENU_PAIEMENTS, 'paiement')
+        note = f"chg{self.numero:03d}x{self._nb_saisis:04d}"
+        self._nb_saisis += 1
+        montant = next(self._valeurs)
+        for libelle in ("Voisin", "Cotisation"):
+            choix = self._element(self.at.selectbox, libelle)
+            choix.select(self.rng.choice(choix.options))
+        self._element(self.at.number_input, "Montant payé (DH)").set_value(montant)
+        self._element(self.at.text_input, "Note (facultatif)").input(note)
+        self._element(self.at.button, "Enregistrer le paiement").click()
+        vue = time.time()
+        if self.executer('paiement'):
+            self._saisis.append(note)
+            self._noter('paiement', note, montant, vue)
+
+    def modification(self):
+        self._ecrire_cible('modification')
+
+    def suppression(self):
+        self._ecrire_cible('suppression')
+
+    def _tableau_paiements(self):
+        # Clé du tableau sélectionnable de la page, seul widget « table_paiements… » affiché
+        return next((cle for cle in self.at.session_state.filtered_state if cle.startswith('table_paiements')),
+                    None)
+
+    def _ecrire_cible(self, action):
+        self._menu(MENU_PAIEMENTS, action)
+        if self._saisis and self.rng.random() > PART_CIBLES_PARTAGEES:
+            note = self.rng.choice(self._saisis)
+        else:
+            note = cible(self.rng.randrange(self.nb_cibles))
+        self.at.text_input(key="recherche_paiements").input(note)
+        self.executer(action)
+        tableaux = [t for t in self.at.dataframe if 'Note' in t.value.columns]
+        if not tableaux or tableaux[0].value.empty:
+            # Supprimé entre-temps
+            self.cibles_absentes += 1
+            return
+        # Sélection de la première ligne, comme un clic dans le tableau : AppTest
+        # ne déclenche pas le rappel du tableau, le paiement choisi (id en index
+        # du tableau) est écrit là où la page le garde
+        cle = self._tableau_paiements()
+        if cle is None:
+            self.cibles_absentes += 1
+            return
+        self.at.session_state['paiement_selectionne'] = (cle, int(tableaux[0].value.index[0]))
+        self.executer(action)
+        vue = time.time()
+        bouton = self._bouton("🗑️ Supprimer" if action == 'suppression' else "✏️ Modifier")
+        if bouton is None:
+            # Supprimé entre la recherche et la sélection
+            self.cibles_absentes += 1
+            return
+        bouton.click()
+        if action == 'suppression':
+            if self.executer(action):
+                if note in self._saisis:
+                    self._saisis.remove(note)
+                self._noter(action, note, None, vue)
+            return
+        self.executer(action)
+        champ = next((n for n in self.at.number_input if n.label == "Nouveau montant"), None)
+        if champ is None:
+            self.cibles_absentes += 1
+            return
+        montant = next(self._valeurs)
+        champ.set_value(montant)
+        self._element(self.at.button, "💾 Sauvegarder").click()
+        if self.executer(action):
+            self._noter(action, note, montant, vue)
+
+    def _noter(self, action, note, montant, vue):
+        self._journal.append({'session': self.numero, 'action': action, 'note': note,
+                              'montant': montant, 'vue': vue, 'fin': time.time()})
+
+
+def centiles(secondes):
+    if not secondes:
+        return {}
+    millisecondes = np.array(secondes) * 1000
+    resultat = {f"p{c}": round(float(np.percentile(millisecondes, c)), 1) for c in CENTILES}
+    resultat['max'] = round(float(millisecondes.max()), 1)
+    return resultat
+
+
+def attendre_compaction(stockage, delai=30):
+    # Le journal mis de côté disparaît quand la compaction est finie
+    if stockage.nom != 'json':
+        return
+    limite = time.time() + delai
+    while os.path.exists(stockage.chemin_journal('paiements', '.compaction')) and time.time() < limite:
+        time.sleep(0.05)
+
+
+def verifier(stockage, journal):
+    """Écritures perdues, doublons et conflits, d'après les paiements relus sur disque."""
+    attendre_compaction(stockage)
+    par_note = {}
+    for ligne in stockage.charger('paiements'):
+        par_note.setdefault(ligne.get('note'), []).append(ligne)
+    supprimees = {e['note'] for e in journal if e['action'] == 'suppression'}
+    modifications = {}
+    for ecriture in journal:
+        if ecriture['action'] == 'modification':
+            modifications.setdefault(ecriture['note'], set()).add(ecriture['montant'])
+
+    perdues = doublons = 0
+    for ecriture in journal:
+        lignes = par_note.get(ecriture['note'], [])
+        if ecriture['action'] == 'paiement':
+            perdues += not lignes and ecriture['note'] not in supprimees
+            doublons += len(lignes) > 1
+        elif ecriture['action'] == 'suppression':
+            perdues += bool(lignes)
+    for note, montants in modifications.items():
+        lignes = par_note.get(note, [])
+        if note not in supprimees and lignes and lignes[0]['montant_paye'] not in montants:
+            perdues += 1
+
+    # Conflit : une autre session a écrit le même paiement depuis qu'il a été affiché
+    conflits = sum(
+        any(autre['note'] == ecriture['note'] and autre['session'] != ecriture['session']
+            and ecriture['vue'] < autre['fin'] < ecriture['fin'] for autre in journal)
+        for ecriture in journal if ecriture['action'] != 'paiement')
+    return {'perdues': perdues, 'doublons': doublons, 'conflits': conflits}
+
+
+def mesurer_mode(dossier, nb_sessions, nb_actions, pause=0.0, delai=120, graine=0):
+    """Lance les sessions sur `dossier` ; le stockage est celui de VOISINS_STOCKAGE."""
+    if RACINE not in sys.path:
+        sys.path.insert(0, RACINE)
+    from gestion_voisins.session import TYPE_STOCKAGE
+    from gestion_voisins.stockage import ouvrir_stockage
+
+    os.chdir(dossier)
+    nb_cibles = min(NB_CIBLES, len(ouvrir_stockage(TYPE_STOCKAGE, dossier).charger('paiements')))
+    # Montants distincts, un par écriture (next() sur un itérateur C : sûr entre threads)
+    valeurs = map(lambda n: 10_000 + n / 100, itertools.count())
+    journal = []
+    sessions = [Session(numero, nb_cibles, valeurs, journal, delai, graine) for numero in range(nb_sessions)]
+    threads = [threading.Thread(target=session.parcourir, args=(nb_actions, pause)) for session in sessions]
+    debut = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duree = time.perf_counter() - debut
+
+    latences = [latence for session in sessions for latence in session.latences]
+    nb_faites = sum(session.actions for session in sessions)
+    return {
+        'sessions': nb_sessions,
+        'actions': nb_faites,
+        'executions': len(latences),
+        'duree_s': round(duree, 2),
+        'actions_par_s': round(nb_faites / duree, 2),
+        'ecritures_par_s': round(len(journal) / duree, 2),
+        'latence_ms': centiles([s for _, s in latences]),
+        'attente_ms': centiles([s for session in sessions for s in session.attentes]),
+        'latence_par_action_ms': {action: centiles([s for a, s in latences if a == action])
+                                  for action in MELANGE},
+        'ecritures': {action: sum(e['action'] == action for e in journal)
+                      for action in MELANGE if action != 'page'},
+        'cibles_absentes': sum(session.cibles_absentes for session in sessions),
+        'exceptions': sum(session.exceptions for session in sessions),
+        'erreurs': [erreur for session in sessions for erreur in session.erreurs],
+        **verifier(ouvrir_stockage(TYPE_STOCKAGE, dossier), journal),
+    }
+
+
+def lancer(modes, echelle, dossier_donnees, nb_sessions, nb_actions, pause=0.0, delai=120, graine=0):
+    """Mesure chaque mode de stockage dans un processus à part, sur une copie des données."""
+    source = os.path.join(dossier_donnees, echelle)
+    if not os.path.exists(os.path.join(source, 'paiements.json')):
+        generer(source, *ECHELLES[echelle], graine=graine)
+    resultats = {
+        'version': version_du_code(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'echelle': echelle,
+        'modes': {},
+    }
+    for mode in modes:
+        with tempfile.TemporaryDirectory() as temporaire:
+            dossier = os.path.join(temporaire, 'donnees')
+            preparer(source, dossier, graine=graine)
+            sortie = os.path.join(temporaire, 'resultat.json')
+            try:
+                subprocess.run([sys.executable, '-m', 'benchmarks.charge', '--mode-seul', dossier, sortie,
+                                '--sessions', str(nb_sessions), '--actions', str(nb_actions),
+                                '--pause', str(pause), '--delai', str(delai), '--graine', str(graine)],
+                               cwd=RACINE, env={**os.environ, 'VOISINS_STOCKAGE': mode},
+                               capture_output=True, text=True, check=True)
+            except subprocess.CalledProcessError as erreur:
+                # Sortie du processus de mesure, gardée jusqu'ici pour ne pas noyer les résultats
+                print(f"{mode} : échec de la mesure (code {erreur.returncode})", file=sys.stderr)
+                sys.stderr.write(erreur.stdout + erreur.stderr)
+                raise
+            with open(sortie, encoding='utf-8') as f:
+                resultats['modes'][mode] = json.load(f)
+        afficher(mode, resultats['modes'][mode])
+    return resultats
+
+
+def afficher(mode, mesure):
+    latence = mesure['latence_ms']
+    print(f"{mode} : {mesure['sessions']} sessions, {mesure['actions']} actions en {mesure['duree_s']} s "
+          f"({mesure['actions_par_s']} actions/s, {mesure['ecritures_par_s']} écritures/s)")
+    print(f"  latence p50 {latence.get('p50')} ms, p95 {latence.get('p95')} ms, p99 {latence.get('p99')} ms"
+          f" ; attente du verrou p95 {mesure['attente_ms'].get('p95')} ms")
+    for action, centiles_action in mesure['latence_par_action_ms'].items():
+        if centiles_action:
+            print(f"    {action:<14} p50 {centiles_action['p50']:>8} ms  p95 {centiles_action['p95']:>8} ms  "
+                  f"p99 {centiles_action['p99']:>8} ms")
+    print(f"  écritures {mesure['ecritures']} : {mesure['perdues']} perdue(s), {mesure['doublons']} en double, "
+          f"{mesure['conflits']} en conflit ; {mesure['exceptions']} exception(s)")
+    for erreur in mesure['erreurs']:
+        print(f"  {erreur}")
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Test de charge : sessions simultanées.")
+    parser.add_argument('--sessions', type=int, default=10)
+    parser.add_argument('--actions', type=int, default=20, help="actions par session")
+    parser.add_argument('--pause', type=float, default=0.0,
+                        help="pause maximale entre deux actions d'une session (s)")
+    parser.add_argument('--stockage', nargs='+', choices=['json', 'sqlite'], default=['json', 'sqlite'])
+    parser.add_argument('--echelle', choices=ECHELLES, default='petit')
+    parser.add_argument('--donnees', default=os.path.join(RACINE, 'benchmarks', 'donnees'),
+                        help="dossier des jeux de données générés")
+    parser.add_argument('--delai', type=float, default=120, help="délai maximal par exécution (s)")
+    parser.add_argument('--graine', type=int, default=0)
+    parser.add_argument('--sortie', help="fichier JSON des résultats")
+    parser.add_argument('--mode-seul', nargs=2, metavar=('DOSSIER', 'RESULTAT'), help=argparse.SUPPRESS)
+    args = parser.parse_args(arguments)
+
+    if args.mode_seul:
+        dossier, sortie = args.mode_seul
+        mesure = mesurer_mode(dossier, args.sessions, args.actions, args.pause, args.delai, args.graine)
+        with open(sortie, 'w', encoding='utf-8') as f:
+            json.dump(mesure, f, ensure_ascii=False, indent=2)
+        return
+
+    resultats = lancer(args.stockage, args.echelle, args.donnees, args.sessions, args.actions,
+                       args.pause, args.delai, args.graine)
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
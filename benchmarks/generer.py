@@ -0,0 +1,146 @@
+"""Génère un jeu de données réaliste : voisins.json, cotisations.json, paiements.json.
+
+    python -m benchmarks.generer DOSSIER --appartements 500 --cotisations 24 --paiements 50000
+
+Chaque voisin règle chaque cotisation en 0 à 3 versements ; une partie des
+paires reste partielle ou en excédent. Les paiements sont datés après leur
+cotisation et enregistrés dans l'ordre chronologique.
+"""
+import argparse
+import json
+import os
+from datetime import date, timedelta
+
+import numpy as np
+
+# Échelles du banc d'essai : appartements, cotisations, paiements
+ECHELLES = {
+    'petit': (50, 12, 2_000),
+    'moyen': (500, 24, 50_000),
+    'grand': (5_000, 120, 1_000_000),
+}
+
+PRENOMS = ["Ahmed", "Fatima", "Youssef", "Khadija", "Omar", "Salma", "Karim", "Nadia",
+           "Mehdi", "Imane", "Hassan", "Leila", "Rachid", "Sanaa", "Amine", "Houda"]
+NOMS = ["Alaoui", "Benali", "Cherkaoui", "El Idrissi", "Fassi", "Bennani", "Tazi",
+        "Berrada", "Lahlou", "Ouazzani", "Sqalli", "Kettani", "Chraibi", "Benjelloun"]
+COTISATIONS = [("Nettoyage", "Service", 100.0), ("Gardiennage", "Service", 150.0),
+               ("Ascenseur", "Service", 80.0), ("Peinture hall", "Achat", 250.0),
+               ("Ampoules", "Achat", 33.3), ("Jardinage", "Service", 75.5),
+               ("Interphone", "Achat", 420.0), ("Électricité commune", "Service", 60.0)]
+MODES = ["Espèces", "Virement", "Chèque"]
+NOTES = ["", "", "", "", "Premier versement", "Complément", "Reliquat", "Payé au syndic"]
+APPARTEMENTS_PAR_ETAGE = 8
+
+
+def generer_voisins(nb):
+    return [{
+        'id': i + 1,
+        'etage': i // APPARTEMENTS_PAR_ETAGE,
+        'numero_appt': str(i % APPARTEMENTS_PAR_ETAGE + 1),
+        'nom': f"{PRENOMS[i % len(PRENOMS)]} {NOMS[(i // len(PRENOMS)) % len(NOMS)]}",
+        'date_ajout': "2023-01-01",
+    } for i in range(nb)]
+
+
+def generer_cotisations(nb, debut=date(2023, 1, 1)):
+    cotisations = []
+    for j in range(nb):
+        titre, type_cotisation, montant = COTISATIONS[j % len(COTISATIONS)]
+        jour = debut + timedelta(days=30 * j)
+        cotisations.append({
+            'id': j + 1,
+            'titre': f"{titre} {jour:%m/%Y}",
+            'montant': montant,
+            'type': type_cotisation,
+            'description': f"{titre} de l'immeuble",
+            'date': jour.isoformat(),
+            'date_creation': f"{jour.isoformat()} 09:00",
+        })
+    return cotisations
+
+
+def generer_paiements(voisins, cotisations, nb, graine=0):
+    rng = np.random.default_rng(graine)
+    nb_v, nb_c = len(voisins), len(cotisations)
+
+    # Versements par paire (voisin, cotisation), coupés au nombre voulu
+    versements = rng.choice([0, 1, 2, 3], size=nb_v * nb_c, p=[0.1, 0.55, 0.25, 0.1])
+    manque = nb - versements.sum()
+    while manque > 0:
+        # Pas assez de paires : des versements en plus, au hasard
+        supplement = rng.integers(0, nb_v * nb_c, size=manque)
+        np.add.at(versements, supplement, 1)
+        manque = nb - versements.sum()
+    ordre = rng.permutation(nb_v * nb_c)
+    cumul = np.cumsum(versements[ordre])
+    coupure = np.searchsorted(cumul, nb)  # première paire qui atteint nb
+    versements[ordre[coupure + 1:]] = 0
+    versements[ordre[coupure]] -= cumul[coupure] - nb
+
+    paire = np.repeat(np.arange(nb_v * nb_c), versements)
+    code_v, code_c = paire // nb_c, paire % nb_c
+    montants_du = np.array([c['montant'] for c in cotisations])[code_c]
+
+    # Part de chaque versement : la cotisation divisée par le nombre de
+    # versements, puis 15 % de paires partielles et 3 % en excédent
+    part = 1 / np.repeat(versements, versements)
+    profil = rng.choice([1.0, 0.5, 1.1], size=nb_v * nb_c, p=[0.82, 0.15, 0.03])[paire]
+    montants = np.round(montants_du * part * profil, 2)
+
+    debuts = np.array([date.fromisoformat(c['date']).toordinal() for c in cotisations])[code_c]
+    jours = debuts + rng.integers(0, 90, size=len(paire))
+    chronologie = np.argsort(jours, kind='stable')
+
+    modes = rng.choice(len(MODES), size=len(paire), p=[0.5, 0.35, 0.15])
+    notes = rng.integers(0, len(NOTES), size=len(paire))
+    ids_v = np.array([v['id'] for v in voisins])
+    ids_c = np.array([c['id'] for c in cotisations])
+
+    paiements = []
+    for k, i in enumerate(chronologie.tolist(), 1):
+        jour = date.fromordinal(int(jours[i]))
+        paiements.append({
+            'id': k,
+            'voisin_id': int(ids_v[code_v[i]]),
+            'cotisation_id': int(ids_c[code_c[i]]),
+            'montant_paye': float(montants[i]),
+            'montant_du': float(montants_du[i]),
+            'date_paiement': jour.isoformat(),
+            'mode_paiement': MODES[modes[i]],
+            'note': NOTES[notes[i]],
+            'date_enregistrement': f"{jour.isoformat()} 18:00",
+        })
+    return paiements
+
+
+def generer(dossier, appartements, cotisations, paiements, graine=0):
+    """Écrit les trois fichiers JSON dans `dossier` ; renvoie les effectifs."""
+    os.makedirs(dossier, exist_ok=True)
+    voisins = generer_voisins(appartements)
+    liste_cotisations = generer_cotisations(cotisations)
+    liste_paiements = generer_paiements(voisins, liste_cotisations, paiements, graine)
+    for nom, donnees in (('voisins', voisins), ('cotisations', liste_cotisations),
+                         ('paiements', liste_paiements)):
+        with open(os.path.join(dossier, f"{nom}.json"), 'w', encoding='utf-8') as f:
+            json.dump(donnees, f, ensure_ascii=False)
+    return {'appartements': len(voisins), 'cotisations': len(liste_cotisations),
+            'paiements': len(liste_paiements)}
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Génère un jeu de données synthétique.")
+    parser.add_argument('dossier')
+    parser.add_argument('--echelle', choices=ECHELLES, help="taille prédéfinie")
+    parser.add_argument('--appartements', type=int, default=50)
+    parser.add_argument('--cotisations', type=int, default=12)
+    parser.add_argument('--paiements', type=int, default=2_000)
+    parser.add_argument('--graine', type=int, default=0)
+    args = parser.parse_args(arguments)
+
+    tailles = ECHELLES[args.echelle] if args.echelle else (args.appartements, args.cotisations, args.paiements)
+    print(generer(args.dossier, *tailles, graine=args.graine))
+
+
+if __name__ == '__main__':
+    main()
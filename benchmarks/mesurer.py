@@ -0,0 +1,207 @@
+"""Banc d'essai : chaque page de l'application, à plusieurs échelles de données.
+
+    python -m benchmarks.mesurer --echelles petit moyen --sortie resultats.json
+    python -m benchmarks.mesurer --comparer avant.json apres.json
+
+Pour chaque échelle, un jeu de données est généré (ou réutilisé) dans
+`--donnees`, puis l'application est pilotée sans navigateur par AppTest :
+premier chargement, chaque entrée du menu, puis chaque rapport de la page
+Rapports, deux fois : au premier affichage (calcul) et au second (cache).
+Chaque mesure relève le temps d'exécution du script, le pic de mémoire Python
+(tracemalloc) et le nombre d'éléments affichés. Les résultats sont écrits en
+JSON pour comparer deux versions.
+
+Le premier chargement est aussi vérifié dans un processus neuf : la page des
+voisins ne doit pas importer pandas (seuls les rapports, l'import et l'export
+en ont besoin). Sinon, la commande se termine en erreur, après avoir écrit
+ses résultats.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from .generer import ECHELLES, generer
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPLICATION = os.path.join(RACINE, 'voisins.py')
+MENUS = ["🏠 Gestion des Voisins", "💰 Cotisations", "💳 Paiements", "📈 Rapports"]
+
+# Exécuté dans un processus neuf, depuis le dossier des données : premier
+# chargement (page des voisins), puis les modules lourds déjà importés
+SCRIPT_DEMARRAGE = """
+import json, os, sys
+from streamlit.testing.v1 import AppTest
+sys.path.insert(0, os.path.dirname(sys.argv[1]))
+at = AppTest.from_file(sys.argv[1], default_timeout=float(sys.argv[2]))
+at.run()
+print(json.dumps({'exceptions': len(at.exception), 'pandas': 'pandas' in sys.modules}))
+"""
+
+
+def compter_elements(noeud):
+    """Nombre d'éléments affichés sous un noeud de l'arbre AppTest."""
+    enfants = getattr(noeud, 'children', None)
+    if isinstance(enfants, dict):
+        return sum(compter_elements(enfant) for enfant in enfants.values())
+    return 1
+
+
+def mesurer_execution(executer):
+    """Exécute `executer()` ; renvoie (résultat, temps en s, pic mémoire en Mo)."""
+    tracemalloc.start()
+    debut = time.perf_counter()
+    try:
+        resultat = executer()
+    finally:
+        duree = time.perf_counter() - debut
+        _, pic = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return resultat, round(duree, 4), round(pic / 2**20, 2)
+
+
+def mesurer_application(dossier, delai=600):
+    """Mesure le chargement puis chaque page de l'application sur `dossier`."""
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    if RACINE not in sys.path:
+        sys.path.insert(0, RACINE)
+    repertoire = os.getcwd()
+    os.chdir(dossier)
+    # Le magasin est partagé par le processus : il faut le recharger
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    mesures = {}
+    try:
+        at = AppTest.from_file(APPLICATION, default_timeout=delai)
+        _, duree, pic = mesurer_execution(at.run)
+        mesures['chargement'] = {'temps_s': duree, 'memoire_max_mo': pic,
+                                 'elements': compter_elements(at._tree),
+                                 'exceptions': len(at.exception)}
+
+        for menu in MENUS:
+            at.sidebar.selectbox[0].select(menu)
+            _, duree, pic = mesurer_execution(at.run)
+            mesures[menu] = {'temps_s': duree, 'memoire_max_mo': pic,
+                             'elements': compter_elements(at._tree),
+                             'exceptions': len(at.exception)}
+
+        # Page Rapports : un passage du script par rapport choisi
+        for rapport in at.radio[0].options:
+            for passage in ('calcul', 'cache'):
+                at.radio[0].set_value(rapport)
+                _, duree, pic = mesurer_execution(at.run)
+                mesures[f"{rapport} ({passage})"] = {'temps_s': duree, 'memoire_max_mo': pic,
+                                                     'elements': compter_elements(at._tree),
+                                                     'exceptions': len(at.exception)}
+    except Exception as erreur:
+        # Délai dépassé ou erreur du script : on garde les mesures déjà faites
+        mesures['erreur'] = f"{type(erreur).__name__}: {erreur}"
+    finally:
+        os.chdir(repertoire)
+    return mesures
+
+
+def verifier_demarrage(dossier, delai=600):
+    """Premier chargement dans un processus neuf ; renvoie {'exceptions': n, 'pandas': bool}."""
+    sortie = subprocess.run([sys.executable, '-c', SCRIPT_DEMARRAGE, APPLICATION, str(delai)], cwd=dossier,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(sortie.strip().splitlines()[-1])
+
+
+def version_du_code():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RACINE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def lancer(echelles, dossier_donnees, stockage='json', delai=600, graine=0):
+    os.environ['VOISINS_STOCKAGE'] = stockage
+    resultats = {
+        'version': version_du_code(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'stockage': stockage,
+        'echelles': {},
+    }
+    for nom in echelles:
+        dossier = os.path.join(dossier_donnees, nom)
+        if not os.path.exists(os.path.join(dossier, 'paiements.json')):
+            generer(dossier, *ECHELLES[nom], graine=graine)
+        appartements, cotisations, paiements = ECHELLES[nom]
+        print(f"{nom} : {appartements} appartements, {paiements} paiements", flush=True)
+        resultats['echelles'][nom] = {
+            'appartements': appartements,
+            'cotisations': cotisations,
+            'paiements': paiements,
+            'pages': mesurer_application(dossier, delai),
+        }
+        afficher(resultats['echelles'][nom]['pages'])
+    if echelles:
+        # Indépendant de l'échelle : vérifié sur la première
+        resultats['demarrage'] = verifier_demarrage(os.path.join(dossier_donnees, echelles[0]), delai)
+        print(f"démarrage : pandas {'importé' if resultats['demarrage']['pandas'] else 'non importé'}")
+    return resultats
+
+
+def afficher(pages):
+    for page, mesure in pages.items():
+        if page == 'erreur':
+            print(f"  erreur : {mesure}")
+            continue
+        print(f"  {page:<40} {mesure['temps_s']:>9.3f} s {mesure['memoire_max_mo']:>9.1f} Mo "
+              f"{mesure['elements']:>8} éléments")
+
+
+def comparer(ancien, nouveau):
+    """Affiche, page par page, le rapport des temps et mémoires nouveau / ancien."""
+    for nom, echelle in nouveau['echelles'].items():
+        reference = ancien['echelles'].get(nom)
+        if reference is None:
+            continue
+        print(f"{nom} ({ancien.get('version')} -> {nouveau.get('version')})")
+        for page, mesure in echelle['pages'].items():
+            avant = reference['pages'].get(page)
+            if page == 'erreur' or not avant or 'temps_s' not in avant:
+                continue
+            print(f"  {page:<40} temps x{mesure['temps_s'] / max(avant['temps_s'], 1e-9):.2f}  "
+                  f"mémoire x{mesure['memoire_max_mo'] / max(avant['memoire_max_mo'], 1e-9):.2f}  "
+                  f"éléments {avant['elements']} -> {mesure['elements']}")
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Mesure les performances de chaque page.")
+    parser.add_argument('--echelles', nargs='+', choices=ECHELLES, default=list(ECHELLES))
+    parser.add_argument('--donnees', default=os.path.join(RACINE, 'benchmarks', 'donnees'),
+                        help="dossier des jeux de données générés")
+    parser.add_argument('--stockage', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--delai', type=float, default=600, help="délai maximal par exécution (s)")
+    parser.add_argument('--graine', type=int, default=0)
+    parser.add_argument('--sortie', help="fichier JSON des résultats")
+    parser.add_argument('--comparer', nargs=2, metavar=('ANCIEN', 'NOUVEAU'),
+                        help="compare deux fichiers de résultats")
+    args = parser.parse_args(arguments)
+
+    if args.comparer:
+        with open(args.comparer[0], encoding='utf-8') as f, open(args.comparer[1], encoding='utf-8') as g:
+            comparer(json.load(f), json.load(g))
+        return
+
+    resultats = lancer(args.echelles, args.donnees, args.stockage, args.delai, args.graine)
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, ensure_ascii=False, indent=2)
+    if resultats.get('demarrage', {}).get('pandas'):
+        sys.exit("pandas est importé au premier chargement de la page des voisins")
+
+
+if __name__ == '__main__':
+    main()
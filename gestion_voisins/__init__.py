@@ -0,0 +1,10 @@
+"""Application de gestion des cotisations de voisinage.
+
+- données : stockage, magasin, table des paiements, cumuls, archives,
+  historique et index de recherche (numpy seulement), et leur accès depuis
+  les pages (session) ;
+- moteur des rapports : soldes et rapports (pandas), importés par le
+  précalcul à son premier calcul ; benchmarks/mesurer.py vérifie que le
+  premier chargement n'importe pas pandas ;
+- pages : une par entrée du menu, importée à son ouverture.
+"""
@@ -0,0 +1,172 @@
+"""Rapports en ligne de commande, sans Streamlit.
+
+    python -m gestion_voisins rapport impayes --donnees immeuble --etage 2
+    python -m gestion_voisins rapport partiels --cotisation "Ascenseur 2024" --format csv
+    python -m gestion_voisins rapport classement --sortie classement.json
+    python -m gestion_voisins rapport impayes --au 2026-09-15
+    python -m gestion_voisins export impayes --format parquet   (voir export.py)
+    python -m gestion_voisins archiver --avant 2025 --donnees immeuble
+
+Les fichiers de données sont lus directement, en lecture seule, sans magasin
+ni session : des paiements, seules les colonnes utiles aux soldes sont
+gardées (voisin, cotisation, centimes payés) ; en SQLite, ils ne sont même
+pas chargés, le stockage les agrège lui-même.
+
+Les filtres réduisent les données avant le calcul : --etage garde les voisins
+des étages donnés, --cotisation (titre ou id) les cotisations données et leurs
+seuls paiements. Les tableaux sont ceux de la page Rapports (impayés comme
+dans l'export, une ligne par cotisation non soldée) ; avec --repartir, le
+crédit de chaque voisin est réparti sur ses cotisations dues, comme sur la
+page (voir soldes.repartir_credits).
+
+Avec --au, les données sont celles de la fin du jour donné, reconstituées
+depuis l'historique des écritures du dossier (voir historique.py).
+"""
+import argparse
+import json
+import os
+import sys
+from collections import namedtuple
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from . import export, rapports
+from .historique import Historique, fin_du_jour
+from .magasin import Magasin
+from .soldes import calculer_soldes, repartir_credits
+from .stockage import ouvrir_stockage, une_par_id
+
+# Colonnes des paiements lues par calculer_soldes
+Paiements = namedtuple('Paiements', ['voisin_id', 'cotisation_id', 'montant_paye'])
+
+
+def _impayes(donnees, soldes):
+    return pd.concat(list(export.blocs_impayes(donnees, soldes)), ignore_index=True)
+
+
+def _classement(donnees, soldes):
+    return rapports.classement(donnees, soldes)['complet']
+
+
+# Nom -> tableau du rapport
+RAPPORTS = {
+    'impayes': _impayes,
+    'partiels': rapports.partiels,
+    'classement': _classement,
+}
+
+
+def _entiers(valeurs):
+    return np.fromiter((v if type(v) is int else -1 for v in valeurs), dtype=np.int64)
+
+
+def _colonnes_paiements(lignes):
+    montants = np.fromiter((v if type(v) in (int, float) else 0.0
+                            for v in (ligne.get('montant_paye') for ligne in lignes)), dtype=float)
+    return Paiements(_entiers(ligne.get('voisin_id') for ligne in lignes),
+                     _entiers(ligne.get('cotisation_id') for ligne in lignes),
+                     np.round(np.nan_to_num(montants * 100, posinf=0, neginf=0)).astype(np.int64))
+
+
+def charger(stockage, etages=None, cotisations=None, au=None):
+    """Données filtrées et leurs soldes ; cotisations : titres ou ids (textes).
+
+    au : jour (datetime.date) dont les données sont reconstituées depuis
+    l'historique ; lève ValueError s'il précède l'historique.
+    """
+    etat = None
+    if au is not None:
+        etat = Historique(stockage.dossier).reconstituer(fin_du_jour(au))
+        if etat is None:
+            raise ValueError(f"Aucun historique au {au.isoformat()}")
+    voisins = tuple(etat.voisins.values()) if etat is not None else une_par_id(stockage.charger('voisins'))
+    if etages:
+        voisins = tuple(v for v in voisins if v['etage'] in etages)
+    toutes = (tuple(etat.cotisations.values()) if etat is not None
+              else une_par_id(stockage.charger('cotisations')))
+    if cotisations:
+        choisies = tuple(c for c in toutes if c['titre'] in cotisations or str(c['id']) in cotisations)
+        inconnues = set(cotisations) - {c['titre'] for c in choisies} - {str(c['id']) for c in choisies}
+        if inconnues:
+            raise ValueError(f"Cotisation inconnue : {', '.join(sorted(inconnues))}")
+        toutes = choisies
+    ids_cotisations = [c['id'] for c in toutes]
+
+    if etat is not None:
+        agregats = None
+        paiements = Paiements(etat.paiements.voisin_id, etat.paiements.cotisation_id, etat.paiements.montant_paye)
+    else:
+        agregats = stockage.agreger_paiements()
+        paiements = _colonnes_paiements(stockage.charger('paiements')) if agregats is None else None
+    if agregats is None:
+        if cotisations:
+            garder = np.isin(paiements.cotisation_id, ids_cotisations)
+            paiements = Paiements(*(colonne[garder] for colonne in paiements))
+    elif cotisations:
+        agregats = [ligne for ligne in agregats if ligne[1] in ids_cotisations]
+    donnees = export.Donnees(voisins, toutes, paiements)
+    return donnees, calculer_soldes(voisins, toutes, paiements, agregats=agregats)
+
+
+def ecrire(tableau, format_, sortie):
+    """Écrit le tableau en JSON (liste d'objets) ou CSV, dans `sortie` ou sur la sortie standard."""
+    if format_ == 'json':
+        texte = json.dumps(tableau.to_dict('records'), ensure_ascii=False, indent=2)
+    else:
+        texte = tableau.to_csv(index=False)
+    if sortie is None:
+        sys.stdout.write(texte if texte.endswith('\n') else texte + '\n')
+    else:
+        with open(sortie, 'w', encoding='utf-8', newline='') as f:
+            f.write(texte)
+
+
+def main(arguments=None):
+    arguments = sys.argv[1:] if arguments is None else arguments
+    if arguments[:1] == ['export']:
+        return export.main(arguments[1:])
+
+    parser = argparse.ArgumentParser(prog='python -m gestion_voisins',
+                                     description="Rapports sans l'application Streamlit.")
+    commandes = parser.add_subparsers(dest='commande', required=True)
+    commandes.add_parser('export', help="exports CSV ou Parquet (voir --help de la commande)")
+    rapport = commandes.add_parser('rapport', aliases=['report'], help="impayés, partiels ou classement")
+    rapport.add_argument('rapport', choices=list(RAPPORTS))
+    rapport.add_argument('--format', choices=['json', 'csv'], default='json')
+    rapport.add_argument('--sortie', help="fichier écrit (sortie standard par défaut)")
+    rapport.add_argument('--etage', type=int, action='append', help="à répéter pour plusieurs étages")
+    rapport.add_argument('--cotisation', action='append', help="titre ou id, à répéter")
+    rapport.add_argument('--repartir', action='store_true',
+                         help="répartit les excédents sur les cotisations dues, les plus anciennes d'abord")
+    rapport.add_argument('--au', type=lambda texte: datetime.strptime(texte, '%Y-%m-%d').date(),
+                         metavar='AAAA-MM-JJ', help="données à la fin de ce jour, tirées de l'historique")
+    archiver = commandes.add_parser('archiver', help="archive les cotisations soldées des années closes")
+    archiver.add_argument('--avant', type=int, default=date.today().year,
+                          help="année exclue : cotisations datées d'avant (année en cours par défaut)")
+    for commande in (rapport, archiver):
+        commande.add_argument('--donnees', default='.', help="dossier des données de l'application")
+        commande.add_argument('--stockage', choices=['json', 'sqlite'],
+                              default=os.environ.get('VOISINS_STOCKAGE', 'json'))
+    args = parser.parse_args(arguments)
+
+    if args.commande == 'archiver':
+        magasin = Magasin(ouvrir_stockage(args.stockage, args.donnees))
+        resumes = magasin.archiver(args.avant)
+        magasin.historique.attendre_point()
+        ecrire(pd.DataFrame(resumes, columns=['id', 'titre', 'annee', 'nb_paiements', 'recu']), 'csv', None)
+        return
+
+    try:
+        donnees, soldes = charger(ouvrir_stockage(args.stockage, args.donnees, lecture_seule=True),
+                                  etages=args.etage, cotisations=args.cotisation, au=args.au)
+    except (ValueError, FileNotFoundError) as erreur:
+        parser.error(str(erreur))
+    if args.repartir:
+        soldes = repartir_credits(soldes, donnees.cotisations)
+    ecrire(RAPPORTS[args.rapport](donnees, soldes), args.format, args.sortie)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""Archives des cotisations soldées, hors des données chargées à chaque session.
+
+Une cotisation est archivable quand elle est datée d'une année close et que
+chaque voisin (il en faut au moins un) l'a payée en entier. `Magasin.archiver`
+la retire alors, avec tous ses paiements, des collections du stockage et la
+range dans la partition de son année :
+
+    archives/<année>/cotisations.jsonl.gz
+    archives/<année>/paiements.jsonl.gz
+
+Les lignes y sont gardées telles quelles, une par ligne JSON, compressées en
+gzip. Seul `archives/index.json` reste lu sans demande : une ligne de résumé
+par cotisation archivée (titre, date, montant, nombre de paiements, total
+reçu). Les partitions ne sont lues que pour un rapport sur les années
+archivées (`Archives.charger`).
+
+Ce qu'un voisin a payé au-delà du montant d'une cotisation archivée reste dans
+les données courantes : un paiement de report, du montant de l'excédent, sur
+l'id de la cotisation archivée. Le reste de chaque voisin ne change donc pas,
+et l'excédent reste réparti sur ses autres cotisations. Ses totaux dû et payé,
+eux, baissent du montant archivé, comme le total attendu de la vue
+d'ensemble : les cotisations archivées n'en font plus partie.
+
+Une partition est réécrite en entier (fichier temporaire puis remplacement),
+ses lignes fusionnées par id : un archivage interrompu puis relancé ne crée
+pas de doublon.
+"""
+import gzip
+import json
+import os
+from collections import namedtuple
+from datetime import datetime
+
+from .colonnes import TablePaiements
+from .cumuls import en_centimes, mois_de
+
+DOSSIER_ARCHIVES = 'archives'
+MODE_REPORT = 'Report'
+
+# Données d'années archivées, lues par les rapports comme un instantané
+DonneesArchivees = namedtuple('DonneesArchivees', ['voisins', 'cotisations', 'paiements'])
+
+
+def annee_de(cotisation):
+    """Année de la cotisation, None si sa date est illisible."""
+    mois = mois_de(cotisation.get('date'))
+    return None if mois is None else int(mois[:4])
+
+
+def cotisations_soldees(cumuls, cotisations, avant):
+    """Cotisations datées d'avant l'année `avant` et payées en entier par chaque voisin.
+
+    Sans voisin, rien n'est dû : aucune cotisation n'est tenue pour soldée.
+    """
+    soldees = []
+    if not cumuls['voisins']:
+        return soldees
+    for cotisation in cotisations:
+        annee = annee_de(cotisation)
+        if annee is None or annee >= avant:
+            continue
+        du = en_centimes(cotisation['montant'])
+        if all(cumuls['par_paire'].get((voisin_id, cotisation['id']), [0, 0])[0] >= du
+               for voisin_id in cumuls['voisins']):
+            soldees.append(cotisation)
+    return soldees
+
+
+def reports(cumuls, cotisations, paiements):
+    """Paiements de report (sans id) des excédents payés sur les cotisations archivées."""
+    # Date du dernier paiement de chaque paire : l'excédent a été encaissé ce jour-là
+    dates = {}
+    for paiement in paiements:
+        cle = (paiement.get('voisin_id'), paiement.get('cotisation_id'))
+        if isinstance(paiement.get('date_paiement'), str):
+            dates[cle] = max(dates.get(cle, ''), paiement['date_paiement'])
+    maintenant = datetime.now().strftime("%Y-%m-%d %H:%M")
+    lignes = []
+    for cotisation in cotisations:
+        du = en_centimes(cotisation['montant'])
+        for voisin_id in cumuls['voisins']:
+            paye = cumuls['par_paire'].get((voisin_id, cotisation['id']), [0, 0])[0]
+            if paye > du:
+                lignes.append({
+                    'voisin_id': voisin_id,
+                    'cotisation_id': cotisation['id'],
+                    'montant_paye': (paye - du) / 100,
+                    'montant_du': 0.0,
+                    'date_paiement': dates.get((voisin_id, cotisation['id'])) or maintenant[:10],
+                    'mode_paiement': MODE_REPORT,
+                    'note': f"Excédent de « {cotisation['titre']} » (archivée)",
+                    'date_enregistrement': maintenant,
+                })
+    return lignes
+
+
+class Archives:
+    """Partitions annuelles d'un dossier de données, et leur index."""
+
+    def __init__(self, dossier='.'):
+        self.dossier = os.path.join(dossier, DOSSIER_ARCHIVES)
+
+    def _chemin(self, annee, collection):
+        return os.path.join(self.dossier, str(annee), f"{collection}.jsonl.gz")
+
+    @property
+    def chemin_index(self):
+        return os.path.join(self.dossier, 'index.json')
+
+    # --- Lecture ---
+
+    def index(self):
+        """Lignes de résumé des cotisations archivées, [] sans archives."""
+        if not os.path.exists(self.chemin_index):
+            return []
+        with open(self.chemin_index, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def signature(self):
+        """Change à chaque archivage : clé des lectures mises en cache."""
+        return os.stat(self.chemin_index).st_mtime_ns if os.path.exists(self.chemin_index) else None
+
+    def annees(self):
+        return sorted({ligne['annee'] for ligne in self.index()})
+
+    def _lire(self, annee, collection):
+        chemin = self._chemin(annee, collection)
+        if not os.path.exists(chemin):
+            return []
+        with gzip.open(chemin, 'rt', encoding='utf-8') as f:
+            return [json.loads(ligne) for ligne in f if ligne.strip()]
+
+    def charger(self, annees, voisins):
+        """Données des années données : cotisations et paiements archivés, voisins courants."""
+        cotisations, paiements = [], []
+        for annee in sorted(annees):
+            cotisations += self._lire(annee, 'cotisations')
+            paiements += self._lire(annee, 'paiements')
+        return DonneesArchivees(tuple(voisins), tuple(cotisations), TablePaiements(paiements))
+
+    # --- Écriture ---
+
+    def _ecrire(self, annee, collection, lignes):
+        chemin = self._chemin(annee, collection)
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        with gzip.open(chemin + '.tmp', 'wt', encoding='utf-8') as f:
+            for ligne in lignes:
+                f.write(json.dumps(ligne, ensure_ascii=False) + '\n')
+        os.replace(chemin + '.tmp', chemin)
+
+    def ajouter(self, cotisations, paiements):
+        """Range cotisations et paiements dans leurs partitions ; renvoie les résumés ajoutés."""
+        annees = {c['id']: annee_de(c) for c in cotisations}
+        archivee_le = datetime.now().strftime("%Y-%m-%d %H:%M")
+        resumes = {ligne['id']: ligne for ligne in self.index()}
+        ajoutes = []
+        for annee in sorted(set(annees.values())):
+            # Lignes déjà archivées, remplacées par leur nouvelle version (même id)
+            anciennes = {c['id']: c for c in self._lire(annee, 'cotisations')}
+            anciennes.update({c['id']: c for c in cotisations if annees[c['id']] == annee})
+            archives = {p['id']: p for p in self._lire(annee, 'paiements')}
+            archives.update({p['id']: p for p in paiements if annees.get(p['cotisation_id']) == annee})
+            self._ecrire(annee, 'paiements', archives.values())
+            self._ecrire(annee, 'cotisations', anciennes.values())
+
+            recus = {}
+            for paiement in archives.values():
+                if type(paiement.get('montant_paye')) in (int, float):
+                    recus.setdefault(paiement.get('cotisation_id'), []).append(paiement['montant_paye'])
+            for cotisation in anciennes.values():
+                if annees.get(cotisation['id']) != annee:
+                    continue
+                montants = recus.get(cotisation['id'], [])
+                resume = {
+                    'id': cotisation['id'],
+                    'titre': cotisation['titre'],
+                    'type': cotisation['type'],
+                    'date': cotisation['date'],
+                    'montant': cotisation['montant'],
+                    'annee': annee,
+                    'nb_paiements': len(montants),
+                    'recu': sum(en_centimes(montant) for montant in montants) / 100,
+                    'archivee_le': archivee_le,
+                }
+                resumes[cotisation['id']] = resume
+                ajoutes.append(resume)
+
+        os.makedirs(self.dossier, exist_ok=True)
+        with open(self.chemin_index + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(list(resumes.values()), f, ensure_ascii=False, indent=2)
+        os.replace(self.chemin_index + '.tmp', self.chemin_index)
+        return ajoutes
@@ -0,0 +1,351 @@
+"""Table des paiements rangée en colonnes.
+
+Sous forme de dict, un paiement (dates en texte, mode en texte libre, montants
+flottants) coûte plusieurs centaines d'octets et doit être relu à chaque
+rapport. `TablePaiements` range les mêmes paiements dans des tableaux numpy :
+
+- id, voisin_id, cotisation_id : entiers ;
+- montant_paye, montant_du : centimes entiers ;
+- date_paiement : datetime64[D] ; date_enregistrement : datetime64[m] ;
+- mode_paiement : catégorie (codes vers la liste `modes`) ;
+- note : texte, les notes identiques partageant la même chaîne.
+
+La conversion depuis et vers le schéma JSON est sans perte : une ligne que les
+colonnes ne restituent pas à l'identique (montant au-delà du centime, date dans
+un autre format, champ manquant ou en plus) est aussi gardée telle quelle et
+rendue à la place de sa version décodée.
+
+La table se lit comme le dict id -> ligne qu'elle remplace (get, in, len,
+values, [id] = ligne, update, del). Une suppression masque seulement la
+ligne ; la place est récupérée quand la moitié des lignes sont masquées.
+`figer()` en renvoie une copie que personne ne modifie plus, sans recopier
+les colonnes : elle en garde des vues, et la table copie une colonne partagée
+avant d'y réécrire une ligne (voir __setitem__). Les ajouts vont au-delà des
+vues, les suppressions ne touchent que le masque. `exporter()` et
+`importer()` la sérialisent colonne par colonne.
+"""
+import numpy as np
+
+from .stockage import SCHEMA
+
+CHAMPS = [colonne for colonne, _ in SCHEMA['paiements']]
+
+TYPES = {
+    'id': np.int64,
+    'voisin_id': np.int64,
+    'cotisation_id': np.int64,
+    'montant_paye': np.int64,
+    'montant_du': np.int64,
+    'date_paiement': 'datetime64[D]',
+    'mode_paiement': np.int16,
+    'note': object,
+    'date_enregistrement': 'datetime64[m]',
+}
+
+# Taille des blocs décodés à la fois par values()
+TAILLE_BLOC = 10_000
+
+
+def _dates(valeurs, type_date):
+    # Textes -> datetime64 ; une valeur illisible devient NaT (et sa ligne
+    # est gardée telle quelle, faute de se relire à l'identique)
+    textes = [v if isinstance(v, str) else 'NaT' for v in valeurs]
+    try:
+        return np.array(textes, dtype=type_date)
+    except ValueError:
+        dates = np.empty(len(textes), dtype=type_date)
+        for i, texte in enumerate(textes):
+            try:
+                dates[i] = np.datetime64(texte)
+            except ValueError:
+                dates[i] = np.datetime64('NaT')
+        return dates
+
+
+def _colonne(nom):
+    return property(lambda self: self._vue(nom))
+
+
+class TablePaiements:
+    """Paiements en colonnes numpy, dans l'ordre d'insertion."""
+
+    id = _colonne('id')
+    voisin_id = _colonne('voisin_id')
+    cotisation_id = _colonne('cotisation_id')
+    montant_paye = _colonne('montant_paye')
+    montant_du = _colonne('montant_du')
+    date_paiement = _colonne('date_paiement')
+    mode_paiement = _colonne('mode_paiement')
+    note = _colonne('note')
+    date_enregistrement = _colonne('date_enregistrement')
+
+    def __init__(self, lignes=()):
+        self.modes = []
+        self._codes_modes = {}
+        self._textes = {}
+        self._telles_quelles = {}  # id -> ligne d'origine, si non restituable
+        self._colonnes = {champ: np.empty(0, dtype=TYPES[champ]) for champ in CHAMPS}
+        self._actif = np.empty(0, dtype=bool)
+        self._taille = 0
+        self._positions = {}
+        self._masquees = 0
+        self._partagees = set()  # colonnes dont une copie figée garde une vue
+        self._vues = None  # colonnes sans les lignes masquées, gardées par une copie figée
+        self._ajouter(list(lignes))
+
+    # --- Encodage ---
+
+    def _encoder(self, lignes):
+        # Colonnes encodées, plus les lignes que le décodage ne restitue pas
+        absent = object()
+        brutes = {champ: [ligne.get(champ, absent) for ligne in lignes] for champ in CHAMPS}
+        colonnes = {}
+        for champ in ('id', 'voisin_id', 'cotisation_id'):
+            colonnes[champ] = np.array([v if type(v) is int else -1 for v in brutes[champ]],
+                                       dtype=np.int64)
+        for champ in ('montant_paye', 'montant_du'):
+            montants = np.array([v if type(v) in (int, float) else 0.0 for v in brutes[champ]],
+                                dtype=float)
+            colonnes[champ] = np.round(np.nan_to_num(montants * 100, posinf=0, neginf=0)).astype(np.int64)
+        for champ in ('date_paiement', 'date_enregistrement'):
+            colonnes[champ] = _dates(brutes[champ], TYPES[champ])
+        for mode in brutes['mode_paiement']:
+            if isinstance(mode, str) and mode not in self._codes_modes:
+                self._codes_modes[mode] = len(self.modes)
+                self.modes.append(mode)
+        colonnes['mode_paiement'] = np.array(
+            [self._codes_modes.get(mode, -1) if isinstance(mode, str) else -1
+             for mode in brutes['mode_paiement']], dtype=np.int16)
+        colonnes['note'] = np.array(
+            [self._textes.setdefault(note, note) if isinstance(note, str) else None
+             for note in brutes['note']] + [None], dtype=object)[:-1]
+
+        decodees = self._decoder(colonnes)
+        exactes = np.array([ligne.keys() == set(CHAMPS) for ligne in lignes], dtype=bool)
+        for champ in CHAMPS:
+            exactes &= np.array(brutes[champ] + [None], dtype=object)[:-1] == \
+                np.array(decodees[champ] + [None], dtype=object)[:-1]
+        telles_quelles = {int(colonnes['id'][i]): dict(lignes[i]) for i in np.flatnonzero(~exactes)}
+        return colonnes, telles_quelles
+
+    def _decoder(self, colonnes):
+        # Colonnes -> listes de valeurs au format JSON
+        valeurs = {champ: colonnes[champ].tolist() for champ in ('id', 'voisin_id', 'cotisation_id', 'note')}
+        for champ in ('montant_paye', 'montant_du'):
+            valeurs[champ] = (colonnes[champ] / 100).tolist()
+        valeurs['date_paiement'] = np.datetime_as_string(colonnes['date_paiement'], unit='D').tolist()
+        valeurs['date_enregistrement'] = np.char.replace(
+            np.datetime_as_string(colonnes['date_enregistrement'], unit='m'), 'T', ' ').tolist()
+        valeurs['mode_paiement'] = np.array(self.modes + [None], dtype=object)[colonnes['mode_paiement']].tolist()
+        return valeurs
+
+    def _lignes(self, positions):
+        valeurs = self._decoder({champ: self._colonnes[champ][positions] for champ in CHAMPS})
+        for ligne in zip(*(valeurs[champ] for champ in CHAMPS)):
+            ligne = dict(zip(CHAMPS, ligne))
+            yield self._telles_quelles.get(ligne['id'], ligne)
+
+    # --- Lecture, comme un dict id -> ligne ---
+
+    def _vue(self, nom):
+        colonne = self._colonnes[nom][:self._taille]
+        if not self._masquees:
+            return colonne
+        if self._vues is None:
+            return colonne[self._actif[:self._taille]]
+        if nom not in self._vues:
+            self._vues[nom] = colonne[self._actif[:self._taille]]
+        return self._vues[nom]
+
+    def _position(self, paiement_id):
+        if self._positions is None:
+            positions = np.flatnonzero(self._actif[:self._taille])
+            self._positions = dict(zip(self._colonnes['id'][positions].tolist(), positions.tolist()))
+        return self._positions.get(paiement_id)
+
+    def __len__(self):
+        return self._taille - self._masquees
+
+    def __contains__(self, paiement_id):
+        return self._position(paiement_id) is not None
+
+    def get(self, paiement_id, defaut=None):
+        position = self._position(paiement_id)
+        if position is None:
+            return defaut
+        return next(self._lignes([position]))
+
+    def __getitem__(self, paiement_id):
+        ligne = self.get(paiement_id)
+        if ligne is None:
+            raise KeyError(paiement_id)
+        return ligne
+
+    def values(self):
+        positions = np.arange(self._taille)
+        if self._masquees:
+            positions = positions[self._actif[:self._taille]]
+        for debut in range(0, len(positions), TAILLE_BLOC):
+            yield from self._lignes(positions[debut:debut + TAILLE_BLOC])
+
+    def __iter__(self):
+        return iter(self.id.tolist())
+
+    # --- Écriture ---
+
+    def _ajouter(self, lignes):
+        if not lignes:
+            # Rien à encoder (np.char refuse les tableaux vides)
+            return
+        colonnes, telles_quelles = self._encoder(lignes)
+        taille = self._taille + len(lignes)
+        if taille > len(self._actif):
+            capacite = max(taille, 2 * len(self._actif))
+            for champ in CHAMPS:
+                colonne = np.empty(capacite, dtype=TYPES[champ])
+                colonne[:self._taille] = self._colonnes[champ][:self._taille]
+                self._colonnes[champ] = colonne
+            self._partagees.clear()
+            actif = np.zeros(capacite, dtype=bool)
+            actif[:self._taille] = self._actif[:self._taille]
+            self._actif = actif
+        for champ in CHAMPS:
+            self._colonnes[champ][self._taille:taille] = colonnes[champ]
+        self._actif[self._taille:taille] = True
+        if self._positions is not None:
+            for position, paiement_id in enumerate(colonnes['id'].tolist(), self._taille):
+                self._positions[paiement_id] = position
+        self._telles_quelles.update(telles_quelles)
+        self._taille = taille
+
+    def __setitem__(self, paiement_id, ligne):
+        position = self._position(paiement_id)
+        if position is None:
+            self._ajouter([ligne])
+            return
+        colonnes, telles_quelles = self._encoder([ligne])
+        for champ in CHAMPS:
+            if champ in self._partagees:
+                if colonnes[champ][0] == self._colonnes[champ][position]:
+                    continue
+                # Une copie figée lit encore cette colonne : elle garde l'ancienne
+                self._colonnes[champ] = self._colonnes[champ].copy()
+                self._partagees.discard(champ)
+            self._colonnes[champ][position] = colonnes[champ][0]
+        self._telles_quelles.pop(paiement_id, None)
+        self._telles_quelles.update(telles_quelles)
+
+    def update(self, lignes):
+        # lignes : dict id -> ligne ; les nouvelles sont encodées en un seul lot
+        nouvelles = []
+        for paiement_id, ligne in lignes.items():
+            if self._position(paiement_id) is None:
+                nouvelles.append(ligne)
+            else:
+                self[paiement_id] = ligne
+        self._ajouter(nouvelles)
+
+    def __delitem__(self, paiement_id):
+        position = self._position(paiement_id)
+        if position is None:
+            raise KeyError(paiement_id)
+        del self._positions[paiement_id]
+        self._telles_quelles.pop(paiement_id, None)
+        self._actif[position] = False
+        self._masquees += 1
+        if self._masquees * 2 > self._taille:
+            self._compacter()
+
+    def _compacter(self):
+        actif = self._actif[:self._taille]
+        for champ in CHAMPS:
+            self._colonnes[champ] = self._colonnes[champ][:self._taille][actif]
+        self._taille = len(self._colonnes['id'])
+        self._actif = np.ones(self._taille, dtype=bool)
+        self._masquees = 0
+        self._positions = None
+        self._partagees.clear()
+
+    # --- Copies ---
+
+    def prendre(self, positions):
+        """Nouvelle table avec les lignes vivantes aux positions données."""
+        copie = TablePaiements.__new__(TablePaiements)
+        copie.modes = list(self.modes)
+        copie._codes_modes = dict(self._codes_modes)
+        copie._textes = self._textes
+        copie._colonnes = {champ: self._vue(champ)[positions] for champ in CHAMPS}
+        if isinstance(positions, slice):
+            copie._colonnes = {champ: colonne.copy() for champ, colonne in copie._colonnes.items()}
+        copie._taille = len(copie._colonnes['id'])
+        copie._actif = np.ones(copie._taille, dtype=bool)
+        copie._masquees = 0
+        copie._positions = None
+        copie._partagees = set()
+        copie._vues = None
+        copie._telles_quelles = ({i: self._telles_quelles[i] for i in copie._colonnes['id'].tolist()
+                                  if i in self._telles_quelles} if self._telles_quelles else {})
+        return copie
+
+    def figer(self):
+        """Copie de toutes les lignes, qui garde des vues des colonnes au lieu de les recopier.
+
+        Seul le masque des lignes supprimées est copié ; sans les lignes
+        masquées, chaque colonne n'est extraite qu'une fois, à sa première
+        lecture.
+        """
+        copie = TablePaiements.__new__(TablePaiements)
+        copie.modes = list(self.modes)
+        copie._codes_modes = dict(self._codes_modes)
+        copie._textes = self._textes
+        copie._colonnes = {champ: colonne[:self._taille] for champ, colonne in self._colonnes.items()}
+        copie._taille = self._taille
+        copie._actif = self._actif[:self._taille].copy()
+        copie._masquees = self._masquees
+        copie._positions = None
+        copie._partagees = set()
+        copie._vues = {}
+        copie._telles_quelles = dict(self._telles_quelles)
+        self._partagees = set(CHAMPS)
+        return copie
+
+    # --- Colonnes brutes (points de l'historique) ---
+
+    def exporter(self):
+        """Colonnes des lignes vivantes et leurs tables de codage, sans décodage.
+
+        Les notes sont codées par leur rang dans `textes` ; tout est
+        sérialisable par np.savez et json. Relu par `importer`.
+        """
+        textes = {}
+        colonnes = {champ: self._vue(champ) for champ in CHAMPS if champ != 'note'}
+        colonnes['note'] = np.fromiter((textes.setdefault(note, len(textes)) for note in self._vue('note')),
+                                       dtype=np.int64, count=len(self))
+        ids = set(self._vue('id').tolist()) if self._masquees else None
+        codage = {
+            'modes': list(self.modes),
+            'textes': list(textes),
+            'telles_quelles': [[i, ligne] for i, ligne in self._telles_quelles.items() if ids is None or i in ids],
+        }
+        return colonnes, codage
+
+    @classmethod
+    def importer(cls, colonnes, codage):
+        """Table rendue par `exporter`."""
+        table = cls()
+        table.modes = list(codage['modes'])
+        table._codes_modes = {mode: i for i, mode in enumerate(table.modes)}
+        textes = np.array(codage['textes'] + [None], dtype=object)[:-1]
+        table._textes = {texte: texte for texte in codage['textes'] if isinstance(texte, str)}
+        table._colonnes = {champ: np.asarray(colonnes[champ], dtype=TYPES[champ])
+                           for champ in CHAMPS if champ != 'note'}
+        table._colonnes['note'] = textes[np.asarray(colonnes['note'], dtype=np.int64)]
+        table._taille = len(table._colonnes['id'])
+        table._actif = np.ones(table._taille, dtype=bool)
+        table._positions = None
+        table._telles_quelles = {i: ligne for i, ligne in codage['telles_quelles']}
+        return table
+
+    def memoire(self):
+        """Octets occupés par les colonnes (hors chaînes des notes)."""
+        return sum(colonne.nbytes for colonne in self._colonnes.values()) + self._actif.nbytes
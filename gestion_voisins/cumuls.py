@@ -0,0 +1,297 @@
+"""Cumuls des paiements, tenus à jour à chaque écriture.
+
+Les montants sont en centimes entiers : ajouts et suppressions successifs ne
+laissent aucun résidu d'arrondi.
+
+`mensuel` agrège par (mois, type de cotisation, étage) :
+
+- dû : montant des cotisations datées du mois, pour chaque voisin de l'étage ;
+- encaissé : paiements datés du mois (date_paiement) ;
+- réglé : part des cotisations du mois effectivement payée, quelle que soit la
+  date du paiement (plafonnée au montant dû pour chaque voisin).
+
+Le reste dû d'un mois est donc dû - réglé. Un paiement ne change que deux
+lignes : celle de son mois (encaissé) et celle du mois de sa cotisation (réglé).
+Un voisin ou une cotisation ne change que ses propres lignes, retirées puis
+rajoutées d'après ses seuls paiements : aucune écriture ne reparcourt toute la
+table des paiements.
+"""
+from datetime import datetime
+
+import numpy as np
+
+
+def en_centimes(montant):
+    return int(round(montant * 100))
+
+
+def mois_de(date):
+    # 'AAAA-MM' d'une date en texte, None si elle est illisible
+    try:
+        mois = np.datetime64(date, 'D').astype('datetime64[M]')
+    except (ValueError, TypeError):
+        return None
+    return None if np.isnat(mois) else str(mois)
+
+
+def construire_cumuls(voisins, cotisations, paiements, version):
+    # paiements : TablePaiements, agrégée directement sur ses colonnes
+    voisins = list(voisins)
+    cumuls = {
+        'version': version,
+        'du_par_voisin': sum(en_centimes(c['montant']) for c in cotisations),
+        'voisins': {},  # id -> nombre d'entrées dans la liste des voisins
+        'total_paye': int(paiements.montant_paye.sum()),
+        'total_impaye': 0,
+        'par_voisin': {},  # voisin_id -> [centimes, versements]
+        'par_cotisation': {},  # cotisation_id -> [centimes, versements]
+        'par_paire': {},  # (voisin_id, cotisation_id) -> [centimes, versements]
+    }
+    for v in voisins:
+        cumuls['voisins'][v['id']] = cumuls['voisins'].get(v['id'], 0) + 1
+
+    paires = np.column_stack([paiements.voisin_id, paiements.cotisation_id])
+    for table, cles in (('par_voisin', paiements.voisin_id),
+                        ('par_cotisation', paiements.cotisation_id),
+                        ('par_paire', paires)):
+        cumuls[table] = _grouper(cles, paiements.montant_paye)
+
+    cumuls['total_impaye'] = _total_impaye(cumuls)
+    _construire_mensuel(cumuls, voisins, cotisations, paiements)
+    return cumuls
+
+
+def _positions(cles, ids):
+    # Rang de chaque id parmi les clés (dans leur ordre), -1 s'il n'y figure pas ;
+    # cherché une fois par id distinct
+    rangs = {cle: i for i, cle in enumerate(cles)}
+    uniques, inverse = np.unique(ids, return_inverse=True)
+    return np.array([rangs.get(u, -1) for u in uniques.tolist()], dtype=np.int64)[inverse.ravel()]
+
+
+def _construire_mensuel(cumuls, voisins, cotisations, paiements):
+    # cotisations : id -> (mois, type, centimes dus) ; etages : voisin_id -> étage
+    cumuls['cotisations'] = {c['id']: (mois_de(c['date']), c['type'], en_centimes(c['montant']))
+                             for c in cotisations}
+    cumuls['etages'] = {}
+    for v in voisins:
+        cumuls['etages'].setdefault(v['id'], v['etage'])
+
+    # Une ligne (mois, type, étage) est codée par un entier :
+    # (mois × nb_types + type) × nb_etages + étage
+    types = list(dict.fromkeys(t for _, t, _ in cumuls['cotisations'].values()))
+    etages = list(dict.fromkeys(v['etage'] for v in voisins))
+    nb_types, nb_etages = max(len(types), 1), max(len(etages), 1)
+    code_type = {t: i for i, t in enumerate(types)}
+    code_etage = {e: i for i, e in enumerate(etages)}
+
+    cots = list(cumuls['cotisations'].values())
+    mois_c = np.array([m or 'NaT' for m, _, _ in cots], dtype='datetime64[M]')
+    datee_c = ~np.isnat(mois_c)
+    base_c = np.where(datee_c, mois_c.astype(np.int64), 0) * nb_types \
+        + np.array([code_type[t] for _, t, _ in cots], dtype=np.int64)
+    du_c = np.array([du for _, _, du in cots], dtype=np.int64)
+    etage_v = np.array([code_etage[e] for e in cumuls['etages'].values()], dtype=np.int64)
+
+    # Dû : chaque cotisation datée, pour chaque voisin de chaque étage
+    # Sans voisin, aucun étage : rien n'est dû
+    nb_par_etage = np.bincount(np.array([code_etage[v['etage']] for v in voisins], dtype=np.int64),
+                               minlength=len(etages))
+    codes = [(base_c[datee_c, None] * nb_etages + np.arange(len(etages))).ravel()]
+    montants = [(du_c[datee_c, None] * nb_par_etage).ravel()]
+    colonnes = [np.zeros(len(codes[0]), dtype=np.int64)]
+
+    # Paiements d'un voisin et d'une cotisation connus
+    ci = _positions(cumuls['cotisations'], paiements.cotisation_id)
+    vi = _positions(cumuls['etages'], paiements.voisin_id)
+    connus = (ci >= 0) & (vi >= 0)
+    ci, vi, centimes = ci[connus], vi[connus], paiements.montant_paye[connus]
+
+    # Encaissé : au mois du paiement
+    mois_p = paiements.date_paiement[connus].astype('datetime64[M]')
+    datee_p = ~np.isnat(mois_p)
+    codes.append((mois_p[datee_p].astype(np.int64) * nb_types + base_c[ci[datee_p]] % nb_types) * nb_etages
+                 + etage_v[vi[datee_p]])
+    montants.append(centimes[datee_p])
+    colonnes.append(np.ones(len(codes[-1]), dtype=np.int64))
+
+    # Réglé : total de chaque paire (voisin, cotisation datée), plafonné au dû
+    a_regler = datee_c[ci]
+    paires, inverse = np.unique(vi[a_regler] * len(cots) + ci[a_regler], return_inverse=True)
+    sommes = np.zeros(len(paires), dtype=np.int64)
+    np.add.at(sommes, inverse.ravel(), centimes[a_regler])
+    vi_p, ci_p = np.divmod(paires, max(len(cots), 1))
+    codes.append(base_c[ci_p] * nb_etages + etage_v[vi_p])
+    montants.append(np.minimum(sommes, du_c[ci_p]))
+    colonnes.append(np.full(len(paires), 2, dtype=np.int64))
+
+    codes, inverse = np.unique(np.concatenate(codes), return_inverse=True)
+    table = np.zeros((len(codes), 3), dtype=np.int64)
+    np.add.at(table, (inverse.ravel(), np.concatenate(colonnes)), np.concatenate(montants))
+    reste, etage = np.divmod(codes, nb_etages)
+    mois, type_ = np.divmod(reste, nb_types)
+    cumuls['mensuel'] = {  # (mois, type, etage) -> [dû, encaissé, réglé]
+        (m, types[t], etages[e]): ligne
+        for m, t, e, ligne in zip(np.datetime_as_string(mois.astype('datetime64[M]')).tolist(),
+                                  type_.tolist(), etage.tolist(), table.tolist())
+    }
+
+
+def _total_impaye(cumuls):
+    # Impayé de chaque voisin = max(dû - payé, 0), compté pour chaque entrée
+    return sum(max(cumuls['du_par_voisin'] - cumuls['par_voisin'].get(voisin_id, [0, 0])[0], 0) * nb_entrees
+               for voisin_id, nb_entrees in cumuls['voisins'].items())
+
+
+def _ligne_mensuelle(mensuel, mois, type_cotisation, etage):
+    return mensuel.setdefault((mois, type_cotisation, etage), [0, 0, 0])
+
+
+def _ajouter_mensuel(mensuel, cle, montants):
+    # La ligne est remplacée, jamais modifiée en place : un instantané qui
+    # garde l'ancien dict (voir figer_cumuls) garde aussi ses anciennes lignes
+    mensuel[cle] = [avant + montant for avant, montant in zip(mensuel.get(cle, (0, 0, 0)), montants)]
+
+
+def _grouper(cles, centimes):
+    # {clé: [somme des centimes, nombre]} ; une clé à deux colonnes devient un tuple
+    if len(centimes) == 0:
+        return {}
+    uniques, inverse, nombres = np.unique(cles, axis=0, return_inverse=True, return_counts=True)
+    sommes = np.zeros(len(uniques), dtype=np.int64)
+    np.add.at(sommes, inverse.ravel(), centimes)
+    uniques = [tuple(cle) if isinstance(cle, list) else cle for cle in uniques.tolist()]
+    return {cle: [somme, nombre] for cle, somme, nombre in zip(uniques, sommes.tolist(), nombres.tolist())}
+
+
+def appliquer_paiement(cumuls, paiement, signe):
+    # Ajoute (signe=+1) ou retire (signe=-1) un paiement des cumuls en O(1)
+    centimes = signe * en_centimes(paiement['montant_paye'])
+    voisin_id = paiement['voisin_id']
+    nb_entrees = cumuls['voisins'].get(voisin_id, 0)
+    paye_avant = cumuls['par_voisin'].get(voisin_id, [0, 0])[0]
+    paire_avant = cumuls['par_paire'].get((voisin_id, paiement['cotisation_id']), [0, 0])[0]
+
+    cumuls['total_paye'] += centimes
+    for table, cle in ((cumuls['par_voisin'], voisin_id),
+                       (cumuls['par_cotisation'], paiement['cotisation_id']),
+                       (cumuls['par_paire'], (voisin_id, paiement['cotisation_id']))):
+        ligne = table.setdefault(cle, [0, 0])
+        ligne[0] += centimes
+        ligne[1] += signe
+        if ligne[1] == 0:
+            del table[cle]
+
+    # Impayé du voisin = max(dû - payé, 0), compté pour chaque entrée du voisin
+    reste_avant = max(cumuls['du_par_voisin'] - paye_avant, 0)
+    reste_apres = max(cumuls['du_par_voisin'] - paye_avant - centimes, 0)
+    cumuls['total_impaye'] += (reste_apres - reste_avant) * nb_entrees
+
+    # Agrégats mensuels : encaissé au mois du paiement, réglé au mois de la cotisation
+    cotisation = cumuls['cotisations'].get(paiement['cotisation_id'])
+    etage = cumuls['etages'].get(voisin_id)
+    if cotisation is None or etage is None:
+        return
+    mois_cotisation, type_cotisation, du = cotisation
+    mois = mois_de(paiement['date_paiement'])
+    if mois is not None:
+        _ajouter_mensuel(cumuls['mensuel'], (mois, type_cotisation, etage), (0, centimes, 0))
+    if mois_cotisation is not None:
+        regle = min(paire_avant + centimes, du) - min(paire_avant, du)
+        _ajouter_mensuel(cumuls['mensuel'], (mois_cotisation, type_cotisation, etage), (0, 0, regle))
+
+
+def _part_mensuelle(cumuls, paiements, positions, voisins_ids, cotisations_ids):
+    # Lignes mensuelles des paires (voisin, cotisation) données, d'après les
+    # paiements aux positions données : {(mois, type, étage): [dû, encaissé, réglé]}
+    part = {}
+    for cotisation_id in cotisations_ids:
+        mois, type_cotisation, du = cumuls['cotisations'][cotisation_id]
+        if mois is None:
+            continue
+        for voisin_id in voisins_ids:
+            ligne = _ligne_mensuelle(part, mois, type_cotisation, cumuls['etages'][voisin_id])
+            ligne[0] += du * cumuls['voisins'][voisin_id]
+            ligne[2] += min(cumuls['par_paire'].get((voisin_id, cotisation_id), [0, 0])[0], du)
+
+    voisin_id = paiements.voisin_id[positions]
+    cotisation_id = paiements.cotisation_id[positions]
+    connus = np.isin(voisin_id, list(voisins_ids)) & np.isin(cotisation_id, list(cotisations_ids))
+    mois = paiements.date_paiement[positions][connus].astype('datetime64[M]')
+    datee = ~np.isnat(mois)
+    cles = np.column_stack([mois[datee].astype(np.int64), voisin_id[connus][datee], cotisation_id[connus][datee]])
+    for (mois_p, voisin_id, cotisation_id), (centimes, _) in _grouper(
+            cles, paiements.montant_paye[positions][connus][datee]).items():
+        _, type_cotisation, _ = cumuls['cotisations'][cotisation_id]
+        _ligne_mensuelle(part, str(np.datetime64(mois_p, 'M')), type_cotisation,
+                         cumuls['etages'][voisin_id])[1] += centimes
+    return part
+
+
+def _ajouter_part(cumuls, part, signe):
+    for cle, montants in part.items():
+        _ajouter_mensuel(cumuls['mensuel'], cle, [signe * montant for montant in montants])
+        if signe < 0 and not any(cumuls['mensuel'].get(cle, (0,))):
+            cumuls['mensuel'].pop(cle, None)
+
+
+def appliquer_voisin(cumuls, ancien, nouveau, paiements):
+    # Remplace un voisin (ancien ou nouveau None pour un ajout ou une
+    # suppression) d'après ses seuls paiements ; paiements : TablePaiements
+    if ancien is not None:
+        positions = np.flatnonzero(paiements.voisin_id == ancien['id'])
+        _ajouter_part(cumuls, _part_mensuelle(cumuls, paiements, positions, [ancien['id']],
+                                              list(cumuls['cotisations'])), -1)
+        cumuls['voisins'][ancien['id']] -= 1
+        if cumuls['voisins'][ancien['id']] == 0:
+            del cumuls['voisins'][ancien['id']]
+            del cumuls['etages'][ancien['id']]
+    if nouveau is not None:
+        cumuls['voisins'][nouveau['id']] = cumuls['voisins'].get(nouveau['id'], 0) + 1
+        cumuls['etages'].setdefault(nouveau['id'], nouveau['etage'])
+        positions = np.flatnonzero(paiements.voisin_id == nouveau['id'])
+        _ajouter_part(cumuls, _part_mensuelle(cumuls, paiements, positions, [nouveau['id']],
+                                              list(cumuls['cotisations'])), +1)
+    cumuls['total_impaye'] = _total_impaye(cumuls)
+
+
+def appliquer_cotisation(cumuls, ancienne, nouvelle, paiements):
+    # Remplace une cotisation (ancienne ou nouvelle None pour un ajout ou une
+    # suppression) d'après ses seuls paiements ; paiements : TablePaiements
+    if ancienne is not None:
+        positions = np.flatnonzero(paiements.cotisation_id == ancienne['id'])
+        _ajouter_part(cumuls, _part_mensuelle(cumuls, paiements, positions, list(cumuls['etages']),
+                                              [ancienne['id']]), -1)
+        del cumuls['cotisations'][ancienne['id']]
+        cumuls['du_par_voisin'] -= en_centimes(ancienne['montant'])
+    if nouvelle is not None:
+        cumuls['cotisations'][nouvelle['id']] = (mois_de(nouvelle['date']), nouvelle['type'],
+                                                 en_centimes(nouvelle['montant']))
+        cumuls['du_par_voisin'] += en_centimes(nouvelle['montant'])
+        positions = np.flatnonzero(paiements.cotisation_id == nouvelle['id'])
+        _ajouter_part(cumuls, _part_mensuelle(cumuls, paiements, positions, list(cumuls['etages']),
+                                              [nouvelle['id']]), +1)
+    cumuls['total_impaye'] = _total_impaye(cumuls)
+
+
+def synthese(cumuls, nb_cotisations, nb_paiements):
+    """Totaux d'un immeuble (montants en centimes), persistés à chaque écriture."""
+    nb_voisins = sum(cumuls['voisins'].values())
+    return {
+        'nb_voisins': nb_voisins,
+        'nb_cotisations': nb_cotisations,
+        'nb_paiements': nb_paiements,
+        'total_attendu': cumuls['du_par_voisin'] * nb_voisins,
+        'total_paye': cumuls['total_paye'],
+        'total_impaye': cumuls['total_impaye'],
+        'mise_a_jour': datetime.now().strftime("%Y-%m-%d %H:%M"),
+    }
+
+
+def figer_cumuls(cumuls):
+    # Ce que lit un instantané : les totaux et `mensuel`. Ses lignes n'étant
+    # jamais modifiées en place, une copie du dict suffit ; les tables par id
+    # (jusqu'à voisins × cotisations lignes) restent au magasin.
+    copie = {cle: valeur for cle, valeur in cumuls.items() if not isinstance(valeur, dict)}
+    copie['mensuel'] = dict(cumuls['mensuel'])
+    return copie
@@ -0,0 +1,219 @@
+"""Export des rapports et des paiements en CSV ou Parquet.
+
+    python -m gestion_voisins.export resume impayes --format parquet --sortie exports
+
+Chaque export est un générateur de blocs (DataFrames d'au plus `TAILLE_BLOC`
+lignes) : le détail par cotisation (voisins × cotisations) et les paiements
+bruts ne sont jamais construits d'un seul tenant. Les blocs sont écrits l'un
+après l'autre : en CSV, un morceau de texte par bloc ; en Parquet, un groupe
+de lignes par bloc.
+
+En ligne de commande, le stockage est lu en lecture seule, sans magasin : un
+export n'écrit rien dans le dossier des données (ni synthèse, ni historique).
+"""
+import argparse
+import os
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from .colonnes import CHAMPS, TablePaiements
+from .soldes import calculer_soldes
+from .stockage import une_par_id
+
+TAILLE_BLOC = 10_000
+FORMATS = ('csv', 'parquet')
+
+# Données lues directement dans le stockage, comme un instantané du magasin
+Donnees = namedtuple('Donnees', ['voisins', 'cotisations', 'paiements'])
+
+
+def _voisins(donnees):
+    # Étage, appartement et nom de chaque voisin, dans l'ordre des soldes
+    voisins = pd.DataFrame({
+        'Étage': [v['etage'] for v in donnees.voisins],
+        'Appartement': [v['numero_appt'] for v in donnees.voisins],
+        'Nom': [v['nom'] for v in donnees.voisins],
+    }, index=pd.Index([v['id'] for v in donnees.voisins], name='voisin_id'))
+    return voisins[~voisins.index.duplicated()]
+
+
+def _decouper(tableau):
+    # Au moins un bloc, même vide, pour que les colonnes soient écrites
+    for debut in range(0, max(len(tableau), 1), TAILLE_BLOC):
+        yield tableau.iloc[debut:debut + TAILLE_BLOC]
+
+
+def blocs_resume(donnees, soldes):
+    """Résumé par voisin, du plus gros reste au plus petit."""
+    resume = _voisins(donnees).join(soldes.par_voisin.rename(columns={
+        'total_du': 'Total Dû (DH)', 'total_paye': 'Total Payé (DH)',
+        'reste': 'Reste (DH)', 'taux': 'Taux (%)'})).round(2)
+    yield from _decouper(resume.sort_values('Reste (DH)', ascending=False, kind='stable'))
+
+
+def blocs_impayes(donnees, soldes):
+    """Cotisations non soldées des voisins qui doivent encore, par reste décroissant."""
+    voisins = _voisins(donnees).join(soldes.par_voisin['reste'].round(2).rename('Reste total (DH)'))
+    voisins = voisins[voisins['Reste total (DH)'] > 0].sort_values('Reste total (DH)', ascending=False,
+                                                                   kind='stable')
+    titres = pd.Series({c['id']: c['titre'] for c in donnees.cotisations}, dtype=object)
+    # Assez de voisins par bloc pour environ TAILLE_BLOC cellules
+    par_bloc = max(1, TAILLE_BLOC // max(len(soldes.par_cotisation), 1))
+    colonnes = list(voisins.columns) + ['Cotisation', 'Payé (DH)', 'Dû (DH)', 'Reste (DH)']
+    emis = False
+    for debut in range(0, len(voisins), par_bloc):
+        groupe = voisins.iloc[debut:debut + par_bloc]
+        cellules = soldes.matrice.loc[groupe.index.tolist()]
+        cellules = cellules[cellules['reste'] > 0].reset_index()
+        bloc = groupe.loc[cellules['voisin_id']].reset_index(drop=True)
+        bloc['Cotisation'] = titres.loc[cellules['cotisation_id']].to_numpy()
+        bloc['Payé (DH)'] = cellules['paye'].round(2)
+        bloc['Dû (DH)'] = cellules['du']
+        bloc['Reste (DH)'] = cellules['reste'].round(2)
+        emis = True
+        yield bloc[colonnes]
+    if not emis:
+        yield pd.DataFrame(columns=colonnes)
+
+
+def blocs_cotisations(donnees, soldes):
+    """Détail par cotisation : une ligne par voisin, avec son statut."""
+    voisins = _voisins(donnees)
+    nb_v, nb_c = len(voisins), len(soldes.par_cotisation)
+    paye = soldes.matrice['paye'].to_numpy().reshape(nb_v, nb_c)
+    versements = soldes.matrice['nb_versements'].to_numpy().reshape(nb_v, nb_c)
+    cotisations = {c['id']: c for c in donnees.cotisations}
+    colonnes = ['Cotisation', 'Montant (DH)', 'Étage', 'Appartement', 'Nom', 'Payé (DH)',
+                'Versements', 'Statut']
+    # Assez de cotisations par bloc pour environ TAILLE_BLOC lignes
+    par_bloc = max(1, TAILLE_BLOC // max(nb_v, 1))
+    emis = False
+    for debut in range(0, nb_c, par_bloc):
+        ids = soldes.par_cotisation.index[debut:debut + par_bloc]
+        montants = np.repeat(soldes.par_cotisation['montant'].to_numpy()[debut:debut + par_bloc], nb_v)
+        paye_bloc = paye[:, debut:debut + par_bloc].T.ravel()
+        bloc = pd.concat([voisins] * len(ids), ignore_index=True)
+        bloc.insert(0, 'Cotisation', np.repeat([cotisations[i]['titre'] for i in ids], nb_v))
+        bloc.insert(1, 'Montant (DH)', montants)
+        bloc['Payé (DH)'] = paye_bloc.round(2)
+        bloc['Versements'] = versements[:, debut:debut + par_bloc].T.ravel()
+        bloc['Statut'] = np.select([paye_bloc > montants, paye_bloc == montants, paye_bloc > 0],
+                                   ["Excédent", "Complet", "Partiel"], "Non payé")
+        emis = True
+        yield bloc[colonnes]
+    if not emis:
+        yield pd.DataFrame(columns=colonnes)
+
+
+def blocs_paiements(donnees, soldes=None):
+    """Paiements bruts, tels qu'enregistrés, dans l'ordre d'insertion."""
+    paiements = donnees.paiements
+    for debut in range(0, max(len(paiements), 1), TAILLE_BLOC):
+        bloc = paiements.prendre(slice(debut, debut + TAILLE_BLOC))
+        yield pd.DataFrame(list(bloc.values()), columns=CHAMPS)
+
+
+# Nom -> (libellé, générateur de blocs)
+EXPORTS = {
+    'resume': ("Résumé par voisin", blocs_resume),
+    'impayes': ("Impayés", blocs_impayes),
+    'cotisations': ("Détail par cotisation", blocs_cotisations),
+    'paiements': ("Paiements", blocs_paiements),
+}
+
+
+def octets_csv(blocs):
+    """Morceaux d'un fichier CSV (UTF-8 avec BOM pour Excel), bloc par bloc."""
+    premier = True
+    for bloc in blocs:
+        texte = bloc.to_csv(index=False, header=premier)
+        yield ('\ufeff' + texte if premier else texte).encode('utf-8')
+        premier = False
+
+
+def ecrire_parquet(blocs, destination):
+    """Écrit les blocs dans `destination` (chemin ou fichier), un groupe de lignes chacun."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    ecrivain = None
+    try:
+        for bloc in blocs:
+            if ecrivain is None:
+                # Une colonne vide dans le premier bloc est typée texte
+                schema = pa.Schema.from_pandas(bloc, preserve_index=False)
+                schema = pa.schema([champ.with_type(pa.string()) if pa.types.is_null(champ.type) else champ
+                                    for champ in schema], metadata=schema.metadata)
+                ecrivain = pq.ParquetWriter(destination, schema)
+            ecrivain.write_table(pa.Table.from_pandas(bloc, schema=schema, preserve_index=False))
+    finally:
+        if ecrivain is not None:
+            ecrivain.close()
+
+
+def nom_fichier(nom, format_):
+    return f"{nom}_{date.today().isoformat()}.{format_}"
+
+
+def exporter(nom, format_, donnees, soldes, destination):
+    """Écrit l'export `nom` au format `format_` dans `destination` (chemin ou fichier)."""
+    blocs = EXPORTS[nom][1](donnees, soldes)
+    if format_ == 'parquet':
+        ecrire_parquet(blocs, destination)
+        return
+    if isinstance(destination, (str, os.PathLike)):
+        with open(destination, 'wb') as f:
+            for morceau in octets_csv(blocs):
+                f.write(morceau)
+    else:
+        for morceau in octets_csv(blocs):
+            destination.write(morceau)
+
+
+def charger(stockage):
+    """Données et soldes d'un stockage, sans magasin ni écriture.
+
+    Les soldes sont calculés sur les paiements lus, pas sur les agrégats du
+    stockage : une écriture de l'application entre les deux lectures les
+    ferait diverger des paiements exportés.
+    """
+    donnees = Donnees(une_par_id(stockage.charger('voisins')),
+                      une_par_id(stockage.charger('cotisations')),
+                      TablePaiements(stockage.charger('paiements')))
+    soldes = calculer_soldes(donnees.voisins, donnees.cotisations, donnees.paiements)
+    return donnees, soldes
+
+
+def main(arguments=None):
+    from .stockage import ouvrir_stockage
+
+    parser = argparse.ArgumentParser(description="Exporte les rapports et les paiements.")
+    parser.add_argument('exports', nargs='*', metavar='EXPORT',
+                        help=f"parmi {', '.join(EXPORTS)} (tous par défaut)")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--sortie', default='.', help="dossier des fichiers exportés")
+    parser.add_argument('--donnees', default='.', help="dossier des données de l'application")
+    parser.add_argument('--stockage', choices=['json', 'sqlite'],
+                        default=os.environ.get('VOISINS_STOCKAGE', 'json'))
+    args = parser.parse_args(arguments)
+    inconnus = [nom for nom in args.exports if nom not in EXPORTS]
+    if inconnus:
+        parser.error(f"export inconnu : {', '.join(inconnus)}")
+
+    try:
+        stockage = ouvrir_stockage(args.stockage, args.donnees, lecture_seule=True)
+    except FileNotFoundError as erreur:
+        parser.error(str(erreur))
+    donnees, soldes = charger(stockage)
+    os.makedirs(args.sortie, exist_ok=True)
+    for nom in args.exports or EXPORTS:
+        chemin = os.path.join(args.sortie, nom_fichier(nom, args.format))
+        exporter(nom, args.format, donnees, soldes, chemin)
+        print(chemin)
+
+
+if __name__ == '__main__':
+    main()
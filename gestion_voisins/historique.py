@@ -0,0 +1,273 @@
+"""Historique de toutes les écritures, pour revoir les données à une date passée.
+
+Chaque écriture du magasin est ajoutée, horodatée, au journal
+`historique/journal_<position>.jsonl` (une ligne par opération, avec fsync) :
+
+    {"le": "2026-09-15T18:02:11", "collection": "paiements", "op": "modifier", "cible": {...}}
+
+Les opérations sont celles de `Magasin.ecrire` (la ligne insérée ou modifiée
+entière, l'id supprimé, ou les lignes d'un lot). Un archivage y figure comme
+la suppression de ses cotisations et paiements.
+
+Toutes les `ECRITURES_PAR_POINT` opérations, et au premier chargement, un
+point de reprise est écrit en arrière-plan dans
+`historique/points/point_<horodatage>_<position>.npz`, où la position est
+l'octet du journal où reprendre : les colonnes de la table des paiements
+telles quelles (voir TablePaiements.exporter), voisins et cotisations en JSON,
+le tout compressé. Relire un point ne repasse pas par l'encodage des
+paiements.
+
+Le journal est découpé en segments, un par point : la position d'un segment
+(dans son nom) est celle de sa première ligne dans le journal entier, et un
+point commence toujours un segment. Un ancien `journal.jsonl` d'un seul
+tenant est lu comme le segment 0.
+
+L'état à une date est reconstitué depuis le dernier point antérieur, en ne
+rejouant que les opérations écrites après lui.
+
+Chaque point est une copie complète des données : après l'écriture d'un
+point, seuls sont gardés les `POINTS_RECENTS` derniers et, sur les
+`MOIS_GARDES` derniers mois, le premier point de chaque mois. Les segments du
+journal d'avant le plus ancien point gardé sont supprimés avec lui. Une date
+ancienne rejoue donc au plus un mois d'écritures, et l'historique commence au
+plus ancien point gardé.
+
+Avant le premier point, il n'y a pas d'historique : `reconstituer` renvoie
+None.
+"""
+import json
+import os
+import threading
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from .colonnes import CHAMPS, TablePaiements
+
+DOSSIER_HISTORIQUE = 'historique'
+ECRITURES_PAR_POINT = 5_000
+POINTS_RECENTS = 4
+MOIS_GARDES = 24
+
+# État reconstitué : point de départ (horodatage), opérations rejouées, et
+# collections (dicts id -> ligne, TablePaiements pour les paiements)
+Reconstitution = namedtuple('Reconstitution', ['point', 'rejouees', 'voisins', 'cotisations', 'paiements'])
+
+
+def horodatage():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def fin_du_jour(jour):
+    """Horodatage exclu qui suit le jour donné (datetime.date)."""
+    return (jour + timedelta(days=1)).isoformat() + 'T00:00:00'
+
+
+def _appliquer(lignes, operation, cible):
+    # lignes : dict id -> ligne ou TablePaiements
+    if operation == 'inserer':
+        lignes[cible['id']] = cible
+    elif operation == 'modifier':
+        if cible['id'] in lignes:
+            lignes[cible['id']] = cible
+    elif operation == 'supprimer':
+        if cible in lignes:
+            del lignes[cible]
+    elif operation == 'inserer_lot':
+        lignes.update({ligne['id']: ligne for ligne in cible})
+
+
+class Historique:
+    """Journal des écritures et points de reprise d'un dossier de données."""
+
+    def __init__(self, dossier='.', ecritures_par_point=ECRITURES_PAR_POINT, points_recents=POINTS_RECENTS,
+                 mois_gardes=MOIS_GARDES):
+        self.dossier = os.path.join(dossier, DOSSIER_HISTORIQUE)
+        self.ecritures_par_point = ecritures_par_point
+        self.points_recents = points_recents
+        self.mois_gardes = mois_gardes
+        self._verrou = threading.Lock()
+        self._point_en_cours = None  # thread d'écriture d'un point
+        segments = self.segments()
+        # Segment où sont ajoutées les écritures : (position, chemin)
+        self._segment = segments[-1] if segments else self._nouveau_segment(0)
+        points = self.points()
+        # Opérations depuis le dernier point : ce qu'un rejeu aurait à relire
+        self.depuis_point = self._compter(points[-1][1]) if points else None
+
+    @property
+    def chemin_journal(self):
+        """Segment du journal où sont ajoutées les écritures."""
+        return self._segment[1]
+
+    def _nouveau_segment(self, position):
+        return position, os.path.join(self.dossier, f"journal_{position}.jsonl")
+
+    @property
+    def dossier_points(self):
+        return os.path.join(self.dossier, 'points')
+
+    def segments(self):
+        """Segments du journal, dans l'ordre : (position, chemin)."""
+        if not os.path.isdir(self.dossier):
+            return []
+        segments = []
+        for nom in os.listdir(self.dossier):
+            if nom == 'journal.jsonl':
+                segments.append((0, os.path.join(self.dossier, nom)))
+            elif nom.startswith('journal_') and nom.endswith('.jsonl'):
+                segments.append((int(nom[len('journal_'):-len('.jsonl')]), os.path.join(self.dossier, nom)))
+        return sorted(segments)
+
+    def position(self):
+        """Position dans le journal entier d'un point pris maintenant."""
+        chemin = self.chemin_journal
+        return self._segment[0] + (os.path.getsize(chemin) if os.path.exists(chemin) else 0)
+
+    def _lignes(self, position):
+        # Lignes du journal à partir de la position donnée, segment après segment
+        segments = self.segments()
+        depart = [debut for debut, _ in segments if debut <= position]
+        for debut, chemin in segments:
+            if depart and debut < depart[-1]:
+                continue
+            with open(chemin, 'rb') as f:
+                f.seek(max(position - debut, 0))
+                yield from f
+
+    def _compter(self, position):
+        return sum(1 for _ in self._lignes(position))
+
+    # --- Écriture ---
+
+    def noter(self, collection, modifications):
+        """Ajoute des opérations au journal ; renvoie True quand un point est dû."""
+        le = horodatage()
+        enregistrement = ''.join(json.dumps({'le': le, 'collection': collection, 'op': op, 'cible': cible},
+                                            ensure_ascii=False) + '\n'
+                                 for op, cible in modifications).encode('utf-8')
+        os.makedirs(self.dossier, exist_ok=True)
+        with self._verrou:
+            with open(self.chemin_journal, 'ab') as f:
+                f.write(enregistrement)
+                f.flush()
+                os.fsync(f.fileno())
+            if self.depuis_point is not None:
+                self.depuis_point += len(modifications)
+        return self.point_du()
+
+    def point_du(self):
+        return self.depuis_point is None or self.depuis_point >= self.ecritures_par_point
+
+    def demander_point(self, voisins, cotisations, paiements):
+        """Écrit en arrière-plan un point des collections données (figées), à la position courante.
+
+        Les écritures suivantes vont dans un nouveau segment du journal. Ignoré
+        si un point est déjà en cours d'écriture : le suivant sera demandé à la
+        prochaine écriture.
+        """
+        with self._verrou:
+            if self._point_en_cours is not None and self._point_en_cours.is_alive():
+                return
+            position = self.position()
+            self._segment = self._nouveau_segment(position)
+            self.depuis_point = 0
+            thread = threading.Thread(target=self._ecrire_point,
+                                      args=(horodatage(), position, voisins, cotisations, paiements),
+                                      name="point-historique", daemon=True)
+            self._point_en_cours = thread
+        thread.start()
+
+    def _ecrire_point(self, le, position, voisins, cotisations, paiements):
+        os.makedirs(self.dossier_points, exist_ok=True)
+        nom = f"point_{le.replace('-', '').replace(':', '')}_{position}.npz"
+        chemin = os.path.join(self.dossier_points, nom)
+        colonnes, codage = paiements.exporter()
+        entete = json.dumps({'le': le, 'position': position, 'voisins': list(voisins),
+                             'cotisations': list(cotisations), 'codage': codage}, ensure_ascii=False)
+        with open(chemin + '.tmp', 'wb') as f:
+            np.savez_compressed(f, entete=np.frombuffer(entete.encode('utf-8'), dtype=np.uint8), **colonnes)
+        os.replace(chemin + '.tmp', chemin)
+        self.elaguer()
+
+    def points_gardes(self, points):
+        """Points à garder : les plus récents, et le premier de chaque mois récent."""
+        gardes = set(points[max(len(points) - self.points_recents, 0):])
+        depuis = str(np.datetime64(date.today(), 'M') - self.mois_gardes)
+        mois_vus = set()
+        for point in points:
+            mois = point[0][:7]
+            if mois >= depuis and mois not in mois_vus:
+                mois_vus.add(mois)
+                gardes.add(point)
+        return sorted(gardes)
+
+    def elaguer(self):
+        """Supprime les points qui ne sont plus gardés, et le journal d'avant le plus ancien gardé."""
+        points = self.points()
+        gardes = self.points_gardes(points)
+        if not gardes:
+            return
+        for point in set(points) - set(gardes):
+            os.remove(point[2])
+        # Segments entièrement avant le premier point gardé : le suivant commence avant lui
+        segments = self.segments()
+        for (_, chemin), (suivant, _) in zip(segments, segments[1:]):
+            if suivant <= gardes[0][1]:
+                os.remove(chemin)
+
+    def attendre_point(self):
+        thread = self._point_en_cours
+        if thread is not None:
+            thread.join()
+
+    # --- Lecture ---
+
+    def points(self):
+        """Points écrits, du plus ancien au plus récent : (horodatage, position, chemin)."""
+        if not os.path.isdir(self.dossier_points):
+            return []
+        points = []
+        for nom in os.listdir(self.dossier_points):
+            if not nom.startswith('point_') or not nom.endswith('.npz'):
+                continue
+            _, le, position = nom[:-len('.npz')].split('_')
+            le = datetime.strptime(le, '%Y%m%dT%H%M%S').isoformat()
+            points.append((le, int(position), os.path.join(self.dossier_points, nom)))
+        return sorted(points)
+
+    def debut(self):
+        """Horodatage du premier point, None sans historique."""
+        points = self.points()
+        return points[0][0] if points else None
+
+    def reconstituer(self, limite):
+        """État juste avant l'horodatage `limite`, None s'il précède le premier point."""
+        points = [point for point in self.points() if point[0] < limite]
+        if not points:
+            return None
+        le, position, chemin = points[-1]
+        with np.load(chemin) as point:
+            entete = json.loads(point['entete'].tobytes().decode('utf-8'))
+            paiements = TablePaiements.importer({champ: point[champ] for champ in CHAMPS}, entete['codage'])
+        collections = {
+            'voisins': {ligne['id']: ligne for ligne in entete['voisins']},
+            'cotisations': {ligne['id']: ligne for ligne in entete['cotisations']},
+            'paiements': paiements,
+        }
+
+        rejouees = 0
+        for ligne in self._lignes(position):
+            try:
+                operation = json.loads(ligne)
+            except json.JSONDecodeError:
+                # Ligne tronquée par un arrêt, ou en cours d'écriture
+                continue
+            # Journal dans l'ordre des écritures : la suite est plus récente
+            if operation['le'] >= limite:
+                break
+            _appliquer(collections[operation['collection']], operation['op'], operation['cible'])
+            rejouees += 1
+        return Reconstitution(le, rejouees, collections['voisins'], collections['cotisations'],
+                              collections['paiements'])
@@ -0,0 +1,227 @@
+"""Import groupé de paiements depuis un relevé bancaire (CSV ou Excel).
+
+Le relevé est lu tel quel, puis chaque champ d'un paiement est associé à une
+de ses colonnes (la correspondance est devinée d'après les en-têtes). Toutes
+les lignes sont validées ensemble, colonne par colonne :
+
+- voisin : étage et numéro d'appartement d'un voisin existant (un numéro lu
+  comme nombre entier, 3.0 dans une cellule Excel, vaut « 3 ») ;
+- cotisation : titre d'une cotisation (sans tenir compte des accents ni de
+  la casse), qui ne doit pas désigner deux cotisations ;
+- montant : nombre positif (« 1 250,50 DH » est accepté) ;
+- date : AAAA-MM-JJ ou JJ/MM/AAAA ;
+- mode : Espèces, Virement ou Chèque, le mode par défaut si vide ;
+- un paiement déjà enregistré (même voisin, cotisation, montant, date et
+  note) est écarté, pour qu'un relevé importé deux fois ne compte pas double.
+  Des lignes identiques sont comptées : si le relevé en a trois et que deux
+  sont déjà enregistrées, la troisième est importée.
+
+Les lignes valides sont insérées en une seule écriture
+(('inserer_lot', paiements)) ; les autres sont rendues avec leur motif de rejet.
+"""
+import io
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Champ -> libellé, dans l'ordre du formulaire de correspondance
+CHAMPS_IMPORT = {
+    'etage': "Étage",
+    'numero_appt': "Appartement",
+    'cotisation': "Cotisation",
+    'montant_paye': "Montant",
+    'date_paiement': "Date",
+    'mode_paiement': "Mode",
+    'note': "Note",
+}
+# Champs sans lesquels aucune ligne n'est valide
+CHAMPS_OBLIGATOIRES = ('etage', 'numero_appt', 'cotisation', 'montant_paye', 'date_paiement')
+
+# En-têtes reconnus pour chaque champ (sans accents, en minuscules)
+EN_TETES = {
+    'etage': ['etage', 'niveau'],
+    'numero_appt': ['numero_appt', 'appartement', 'appt', 'numero', 'n appt', 'porte'],
+    'cotisation': ['cotisation', 'titre', 'objet', 'libelle', 'motif'],
+    'montant_paye': ['montant_paye', 'montant', 'credit', 'somme'],
+    'date_paiement': ['date_paiement', 'date', 'date operation', 'date valeur'],
+    'mode_paiement': ['mode_paiement', 'mode', 'moyen'],
+    'note': ['note', 'commentaire', 'reference', 'description'],
+}
+
+Import = namedtuple('Import', ['paiements', 'apercu', 'rejetees'])
+
+
+def normaliser(textes):
+    """Série de textes sans accents, en minuscules et sans espaces superflus."""
+    return (textes.astype(str)
+            .str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+            .str.casefold().str.replace(r'\s+', ' ', regex=True).str.strip())
+
+
+def lire_releve(contenu, nom_fichier):
+    """DataFrame du relevé, valeurs non converties ; lève ValueError si illisible."""
+    try:
+        if nom_fichier.lower().endswith(('.xlsx', '.xlsm')):
+            # Lecture Excel via openpyxl (voir requirements.txt)
+            releve = pd.read_excel(io.BytesIO(contenu), dtype=object)
+            releve = releve.where(releve.notna(), '')
+        else:
+            try:
+                texte = contenu.decode('utf-8-sig')
+            except UnicodeDecodeError:
+                texte = contenu.decode('latin-1')
+            # Séparateur deviné : les exports bancaires utilisent souvent « ; »
+            releve = pd.read_csv(io.StringIO(texte), sep=None, engine='python', dtype=str,
+                                 keep_default_na=False, skipinitialspace=True)
+    except ImportError as erreur:
+        raise ValueError(f"Lecture impossible : {erreur}") from erreur
+    except (ValueError, pd.errors.ParserError) as erreur:
+        raise ValueError(f"Relevé illisible : {erreur}") from erreur
+    releve.columns = [str(colonne).strip() for colonne in releve.columns]
+    return releve
+
+
+def deviner_correspondance(colonnes):
+    """Champ -> colonne du relevé (None si aucune ne convient)."""
+    normalisees = dict(zip(normaliser(pd.Series(list(colonnes), dtype=object)), colonnes))
+    correspondance = {}
+    for champ, en_tetes in EN_TETES.items():
+        correspondance[champ] = next((normalisees[e] for e in en_tetes if e in normalisees), None)
+    return correspondance
+
+
+def _numeros(valeurs):
+    # Un numéro lu comme nombre entier (3.0) est le texte « 3 »
+    return pd.Series([str(int(v)) if isinstance(v, (float, np.floating)) and float(v).is_integer()
+                      else str(v).strip() for v in valeurs], dtype=object)
+
+
+def _appartements(releve, correspondance):
+    etages = pd.to_numeric(releve[correspondance['etage']], errors='coerce')
+    numeros = _numeros(releve[correspondance['numero_appt']])
+    return etages, numeros
+
+
+def _montants(valeurs):
+    textes = (valeurs.astype(str)
+              .str.replace(r'(?i)\s|DH|MAD', '', regex=True)
+              .str.replace(',', '.', regex=False))
+    return pd.to_numeric(textes, errors='coerce').round(2)
+
+
+def _dates(valeurs):
+    # ISO d'abord, puis le format jour/mois/année des relevés
+    dates = pd.to_datetime(valeurs, format='ISO8601', errors='coerce')
+    manquantes = dates.isna()
+    if manquantes.any():
+        dates[manquantes] = pd.to_datetime(valeurs[manquantes].astype(str).str.strip(),
+                                           format='%d/%m/%Y', errors='coerce')
+    return dates.dt.normalize()
+
+
+def valider(releve, correspondance, donnees, modes, mode_defaut):
+    """Valide toutes les lignes du relevé en une passe.
+
+    Renvoie un `Import` : paiements prêts à insérer, aperçu des lignes valides
+    et lignes rejetées (n° de ligne du fichier, colonnes d'origine, motif).
+    """
+    manquants = [CHAMPS_IMPORT[c] for c in CHAMPS_OBLIGATOIRES if not correspondance.get(c)]
+    if manquants:
+        raise ValueError(f"Colonnes à associer : {', '.join(manquants)}")
+    nb = len(releve)
+
+    # Voisin par (étage, appartement)
+    etages, numeros = _appartements(releve, correspondance)
+    voisins = pd.DataFrame({
+        'etage': [v['etage'] for v in donnees.voisins],
+        'numero_appt': _numeros([v['numero_appt'] for v in donnees.voisins]),
+        'voisin_id': [v['id'] for v in donnees.voisins],
+    }, columns=['etage', 'numero_appt', 'voisin_id']).drop_duplicates(['etage', 'numero_appt'])
+    voisins['etage'] = pd.to_numeric(voisins['etage'], errors='coerce')
+    voisin_id = pd.DataFrame({'etage': etages.to_numpy(), 'numero_appt': numeros}).merge(
+        voisins, how='left', on=['etage', 'numero_appt'])['voisin_id'].to_numpy()
+
+    # Cotisation par titre ; un titre porté par deux cotisations est ambigu
+    titres = normaliser(pd.Series([c['titre'] for c in donnees.cotisations], dtype=object))
+    cotisations = pd.DataFrame({'titre': titres,
+                                'cotisation_id': [c['id'] for c in donnees.cotisations],
+                                'montant_du': [c['montant'] for c in donnees.cotisations]})
+    ambigus = cotisations['titre'].duplicated(keep=False)
+    titres_releve = normaliser(releve[correspondance['cotisation']])
+    cotisation = pd.DataFrame({'titre': titres_releve}).merge(
+        cotisations[~ambigus], how='left', on='titre')
+    cotisation_ambigue = titres_releve.isin(cotisations.loc[ambigus, 'titre']).to_numpy()
+
+    montants = _montants(releve[correspondance['montant_paye']]).to_numpy()
+    dates = _dates(releve[correspondance['date_paiement']]).to_numpy()
+
+    if correspondance.get('mode_paiement'):
+        codes = normaliser(releve[correspondance['mode_paiement']])
+        modes_normalises = dict(zip(normaliser(pd.Series(modes, dtype=object)), modes))
+        mode = codes.map(modes_normalises).where(codes != '', mode_defaut).to_numpy()
+    else:
+        mode = np.full(nb, mode_defaut, dtype=object)
+
+    if correspondance.get('note'):
+        notes = releve[correspondance['note']].fillna('').astype(str).str.strip().to_numpy()
+    else:
+        notes = np.full(nb, '', dtype=object)
+
+    # Déjà enregistré : même voisin, cotisation, montant (centimes), date et
+    # note ; la n-ième ligne identique du relevé l'est s'il en existe n
+    cles = pd.DataFrame({
+        'voisin_id': np.nan_to_num(voisin_id.astype(float), nan=-1).astype(np.int64),
+        'cotisation_id': np.nan_to_num(cotisation['cotisation_id'].to_numpy(dtype=float), nan=-1).astype(np.int64),
+        'centimes': np.round(np.nan_to_num(montants) * 100).astype(np.int64),
+        'date': dates,
+        'note': notes,
+    })
+    existants = donnees.paiements
+    concernes = np.isin(existants.voisin_id, cles['voisin_id'].to_numpy())
+    nb_existants = pd.DataFrame({
+        'voisin_id': existants.voisin_id[concernes],
+        'cotisation_id': existants.cotisation_id[concernes],
+        'centimes': existants.montant_paye[concernes],
+        'date': existants.date_paiement[concernes].astype('datetime64[ns]'),
+        'note': [note if isinstance(note, str) else '' for note in existants.note[concernes]],
+    }).groupby(list(cles.columns), dropna=False).size().rename('nb_existants').reset_index()
+    rang = cles.groupby(list(cles.columns), dropna=False).cumcount().to_numpy()
+    deja = rang < cles.merge(nb_existants, how='left', on=list(cles.columns))['nb_existants'].fillna(0).to_numpy()
+
+    # Premier motif de rejet de chaque ligne ('' si valide)
+    motifs = np.select(
+        [np.isnan(voisin_id.astype(float)),
+         cotisation_ambigue,
+         cotisation['cotisation_id'].isna().to_numpy(),
+         ~(montants > 0),
+         pd.isna(dates),
+         pd.isna(mode),
+         deja],
+        ["Voisin introuvable (étage / appartement)",
+         "Cotisation ambiguë (titre en double)",
+         "Cotisation introuvable",
+         "Montant invalide",
+         "Date invalide",
+         "Mode de paiement inconnu",
+         "Déjà enregistré"],
+        '')
+    valides = motifs == ''
+
+    rejetees = releve[~valides].copy()
+    rejetees.insert(0, 'Ligne', np.flatnonzero(~valides) + 2)  # ligne 1 : en-têtes
+    rejetees['Motif'] = motifs[~valides]
+
+    date_enregistrement = datetime.now().strftime("%Y-%m-%d %H:%M")
+    apercu = pd.DataFrame({
+        'voisin_id': voisin_id[valides].astype(np.int64),
+        'cotisation_id': cotisation['cotisation_id'].to_numpy()[valides].astype(np.int64),
+        'montant_paye': montants[valides],
+        'montant_du': cotisation['montant_du'].to_numpy()[valides],
+        'date_paiement': np.datetime_as_string(dates[valides].astype('datetime64[D]')),
+        'mode_paiement': mode[valides],
+        'note': notes[valides],
+    })
+    paiements = apercu.assign(date_enregistrement=date_enregistrement).to_dict('records')
+    return Import(paiements, apercu, rejetees)
@@ -0,0 +1,404 @@
+"""Magasin de données partagé par toutes les sessions du processus.
+
+Les trois collections sont chargées une seule fois. Chaque écriture passe par
+`Magasin.ecrire`, sous verrou : elle met à jour les lignes et leurs index, les
+persiste via le stockage et avance `version`. Les sessions lisent des
+instantanés figés, construits au plus une fois par version et partagés entre
+elles : une ligne modifiée est remplacée par un nouveau dict, jamais modifiée
+en place, et les paiements sont figés dans une table qui partage leurs
+colonnes jusqu'à ce qu'une écriture les modifie (voir colonnes.py), si bien
+qu'un instantané déjà distribué ne change jamais. Un nouvel instantané ne
+recopie donc ni les colonnes des paiements, ni les cumuls par paire : il
+coûte O(voisins + cotisations) et une copie du dict `mensuel`.
+
+Index tenus à jour à chaque écriture :
+
+- voisins et cotisations sont des dicts id -> ligne (ordre d'insertion
+  conservé), les paiements une `TablePaiements` en colonnes ;
+- (etage, numero_appt) -> id du voisin, clé unique ;
+- dernier id attribué par collection, persisté : un id n'est jamais réutilisé ;
+- `recherche` : mots des voisins, cotisations et notes (voir recherche.py).
+
+Les paiements d'un voisin ou d'une cotisation sont retrouvés par l'instantané,
+qui trie une fois les colonnes voisin_id et cotisation_id.
+
+Les agrégats du stockage ne servent qu'à l'instantané courant
+(`agreger_paiements`), lus sous le même verrou que les écritures.
+
+Au chargement puis après chaque écriture, la synthèse de l'immeuble (totaux
+tirés des cumuls) est persistée par le stockage.
+
+`archiver` retire des collections les cotisations soldées des années closes
+et leurs paiements, rangés dans les archives du dossier (voir archives.py).
+
+Chaque écriture est aussi notée dans l'historique du dossier, avec un point de
+reprise périodique (voir historique.py) : `instantane_au` reconstitue les
+données telles qu'elles étaient à la fin d'un jour passé.
+"""
+import threading
+import uuid
+from datetime import date
+
+import numpy as np
+
+from .archives import Archives, cotisations_soldees, reports
+from .colonnes import TablePaiements
+from .cumuls import (appliquer_cotisation, appliquer_paiement, appliquer_voisin, construire_cumuls,
+                     figer_cumuls, synthese)
+from .historique import Historique, fin_du_jour
+from .recherche import IndexRecherche
+from .stockage import COLLECTIONS
+
+
+class ConflitUnicite(ValueError):
+    """Écriture refusée : la clé unique existe déjà."""
+
+
+def cle_appartement(voisin):
+    return (voisin['etage'], voisin['numero_appt'])
+
+
+class Instantane:
+    """Vue figée des données à une version donnée, avec recherches en O(1).
+
+    `estampille` identifie le magasin et la version : elle sert de clé aux
+    calculs mis en cache. Reconstitué depuis l'historique, un instantané n'a
+    pas de version (None) et son estampille porte le jour reconstitué.
+    """
+
+    def __init__(self, estampille, version, voisins, cotisations, paiements, cumuls, appartements):
+        self.estampille = estampille
+        self.version = version
+        self._voisins = voisins
+        self._cotisations = cotisations
+        self.voisins = tuple(voisins.values())
+        self.cotisations = tuple(cotisations.values())
+        self.paiements = paiements
+        self.cumuls = cumuls
+        self._appartements = appartements
+        self._groupes = {}
+        self._verrou = threading.Lock()
+
+    def voisin(self, voisin_id):
+        return self._voisins.get(voisin_id)
+
+    def cotisation(self, cotisation_id):
+        return self._cotisations.get(cotisation_id)
+
+    def paiement(self, paiement_id):
+        with self._verrou:
+            return self.paiements.get(paiement_id)
+
+    def voisin_par_appartement(self, etage, numero_appt):
+        return self._voisins.get(self._appartements.get((etage, numero_appt)))
+
+    def paiements_du_voisin(self, voisin_id):
+        return self.paiements.prendre(self._positions('voisin_id', voisin_id))
+
+    def paiements_de_la_cotisation(self, cotisation_id):
+        return self.paiements.prendre(self._positions('cotisation_id', cotisation_id))
+
+    def _positions(self, colonne, cle):
+        # Tri stable fait une fois par instantané : les positions d'une même
+        # clé sont contiguës et restent dans l'ordre d'insertion
+        with self._verrou:
+            if colonne not in self._groupes:
+                valeurs = getattr(self.paiements, colonne)
+                ordre = np.argsort(valeurs, kind='stable')
+                self._groupes[colonne] = (ordre, valeurs[ordre])
+            ordre, triees = self._groupes[colonne]
+        debut, fin = np.searchsorted(triees, [cle, cle + 1])
+        return ordre[debut:fin]
+
+
+class Magasin:
+
+    def __init__(self, stockage):
+        self.stockage = stockage
+        self.version = 0
+        # Distingue deux magasins du même processus, dont les versions repartent de 0
+        self.jeton = uuid.uuid4().hex
+        self.archives = Archives(stockage.dossier)
+        self.historique = Historique(stockage.dossier)
+        self._verrou = threading.Lock()
+        self._cumuls = None
+        self._instantane = None
+
+        compteurs = stockage.charger_compteurs()
+        self._lignes = {}
+        self._compteurs = {}
+        for collection in COLLECTIONS:
+            lignes = stockage.charger(collection)
+            self._compteurs[collection] = max([compteurs.get(collection, 0)]
+                                              + [ligne['id'] for ligne in lignes])
+            self._lignes[collection] = self._indexer_par_id(collection, lignes)
+        self._lignes['paiements'] = TablePaiements(self._lignes['paiements'].values())
+
+        self._appartements = {}
+        for voisin in self._lignes['voisins'].values():
+            self._appartements.setdefault(cle_appartement(voisin), voisin['id'])
+        self.recherche = IndexRecherche.construire(self._lignes['voisins'].values(),
+                                                   self._lignes['cotisations'].values(),
+                                                   self._lignes['paiements'])
+
+        # Republiée au chargement : les fichiers ont pu changer hors de l'application
+        with self._verrou:
+            self._publier_synthese()
+            # Premier point de l'historique, ou point dû avant l'arrêt précédent
+            if self.historique.point_du():
+                self._point_historique()
+
+    @property
+    def estampille(self):
+        return f"{self.jeton}-{self.version}"
+
+    def _indexer_par_id(self, collection, lignes):
+        # Les anciens fichiers peuvent contenir des ids en double (id = len + 1
+        # après une suppression) : les doublons reçoivent un nouvel id, et la
+        # collection réparée est réécrite une fois.
+        par_id = {}
+        repare = False
+        for ligne in lignes:
+            if ligne['id'] in par_id:
+                self._compteurs[collection] += 1
+                ligne = dict(ligne, id=self._compteurs[collection])
+                repare = True
+            par_id[ligne['id']] = ligne
+        if repare:
+            self.stockage.sauvegarder(collection, par_id.values())
+            self.stockage.sauvegarder_compteurs(self._compteurs)
+        return par_id
+
+    def instantane(self):
+        """Renvoie l'instantané de la version courante."""
+        with self._verrou:
+            if self._instantane is None or self._instantane.version != self.version:
+                paiements = self._lignes['paiements'].figer()
+                self._cumuls_a_jour()
+                self._instantane = Instantane(
+                    self.estampille,
+                    self.version,
+                    dict(self._lignes['voisins']),
+                    dict(self._lignes['cotisations']),
+                    paiements,
+                    figer_cumuls(self._cumuls),
+                    dict(self._appartements),
+                )
+            return self._instantane
+
+    def agreger_paiements(self, donnees):
+        """Agrégats du stockage (voir StockageSQLite), s'ils décrivent bien l'instantané donné.
+
+        Lus sous verrou, quand l'instantané est encore celui de la version
+        courante : aucune écriture ne passe entre la vérification et la
+        lecture. None sinon (instantané dépassé ou reconstitué), ou si le
+        stockage n'agrège pas : les soldes se calculent alors sur les
+        paiements de l'instantané.
+        """
+        with self._verrou:
+            if donnees.estampille != self.estampille:
+                return None
+            return self.stockage.agreger_paiements()
+
+    def _cumuls_a_jour(self):
+        # Sous verrou ; reconstruits seulement au premier usage et après un archivage
+        if self._cumuls is None or self._cumuls['version'] != self.version:
+            self._cumuls = construire_cumuls(self._lignes['voisins'].values(),
+                                             self._lignes['cotisations'].values(),
+                                             self._lignes['paiements'],
+                                             self.version)
+        return self._cumuls
+
+    def _noter(self, collection, modifications):
+        # Sous verrou, après la persistance
+        if self.historique.noter(collection, modifications):
+            self._point_historique()
+
+    def _point_historique(self):
+        # Sous verrou : collections figées à la position courante du journal
+        self.historique.demander_point(tuple(self._lignes['voisins'].values()),
+                                       tuple(self._lignes['cotisations'].values()),
+                                       self._lignes['paiements'].figer())
+
+    def _publier_synthese(self):
+        # Sous verrou
+        self.stockage.sauvegarder_synthese(synthese(self._cumuls_a_jour(),
+                                                    len(self._lignes['cotisations']),
+                                                    len(self._lignes['paiements'])))
+
+    def ecrire(self, collection, modification):
+        """Applique et persiste une écriture, puis avance la version.
+
+        modification : ('inserer', ligne) — l'id est attribué ici —,
+        ('modifier', champs avec l'id), ('supprimer', id) ou
+        ('inserer_lot', lignes), persisté en une seule écriture.
+        Renvoie la ligne insérée ou modifiée (None si l'id est inconnu), ou
+        la liste des lignes insérées par un lot.
+        Lève ConflitUnicite si l'appartement d'un voisin existe déjà.
+        """
+        operation, cible = modification
+        with self._verrou:
+            if operation == 'inserer_lot':
+                return self._inserer_lot(collection, cible)
+            lignes = self._lignes[collection]
+            if operation == 'inserer':
+                ancienne = None
+                nouvelle = {'id': self._compteurs[collection] + 1, **cible}
+            elif operation == 'modifier':
+                ancienne = lignes.get(cible['id'])
+                if ancienne is None:
+                    return None
+                nouvelle = {**ancienne, **cible}
+            elif operation == 'supprimer':
+                ancienne = lignes.get(cible)
+                if ancienne is None:
+                    return None
+                nouvelle = None
+            else:
+                raise ValueError(f"Modification inconnue : {operation}")
+
+            if collection == 'voisins' and nouvelle is not None:
+                occupant = self._appartements.get(cle_appartement(nouvelle))
+                if occupant is not None and occupant != nouvelle['id']:
+                    raise ConflitUnicite(f"L'appartement {cle_appartement(nouvelle)} existe déjà")
+
+            # Index
+            if ancienne is not None:
+                if nouvelle is None:
+                    del lignes[ancienne['id']]
+                if collection == 'voisins' and self._appartements.get(cle_appartement(ancienne)) == ancienne['id']:
+                    del self._appartements[cle_appartement(ancienne)]
+            if nouvelle is not None:
+                lignes[nouvelle['id']] = nouvelle
+                if collection == 'voisins':
+                    self._appartements[cle_appartement(nouvelle)] = nouvelle['id']
+            self.recherche.appliquer(collection, ancienne, nouvelle)
+
+            self.stockage.sauvegarder(collection, lignes.values(),
+                                      (operation, cible if nouvelle is None else nouvelle))
+            self._noter(collection, [(operation, cible if nouvelle is None else nouvelle)])
+            if operation == 'inserer':
+                self._compteurs[collection] = nouvelle['id']
+                self.stockage.sauvegarder_compteurs(self._compteurs)
+
+            a_jour = self._cumuls is not None and self._cumuls['version'] == self.version
+            self.version += 1
+            if a_jour:
+                self._appliquer_cumuls(collection, ancienne, nouvelle)
+            self._publier_synthese()
+            return nouvelle
+
+    def _appliquer_cumuls(self, collection, ancienne, nouvelle):
+        # Sous verrou, cumuls à jour de la version précédente : un paiement en
+        # O(1), un voisin ou une cotisation sur ses seuls paiements
+        if collection == 'paiements':
+            if ancienne is not None:
+                appliquer_paiement(self._cumuls, ancienne, -1)
+            if nouvelle is not None:
+                appliquer_paiement(self._cumuls, nouvelle, +1)
+        elif collection == 'voisins':
+            appliquer_voisin(self._cumuls, ancienne, nouvelle, self._lignes['paiements'])
+        else:
+            appliquer_cotisation(self._cumuls, ancienne, nouvelle, self._lignes['paiements'])
+        self._cumuls['version'] = self.version
+
+    def _inserer_lot(self, collection, lot):
+        # Appelé sous verrou : ids consécutifs, une persistance, une version
+        premier = self._compteurs[collection] + 1
+        nouvelles = [{'id': premier + i, **ligne} for i, ligne in enumerate(lot)]
+        if not nouvelles:
+            return nouvelles
+        if collection == 'voisins':
+            occupes = set(self._appartements)
+            for voisin in nouvelles:
+                if cle_appartement(voisin) in occupes:
+                    raise ConflitUnicite(f"L'appartement {cle_appartement(voisin)} existe déjà")
+                occupes.add(cle_appartement(voisin))
+            for voisin in nouvelles:
+                self._appartements[cle_appartement(voisin)] = voisin['id']
+
+        lignes = self._lignes[collection]
+        lignes.update({ligne['id']: ligne for ligne in nouvelles})
+        for ligne in nouvelles:
+            self.recherche.appliquer(collection, None, ligne)
+        self.stockage.sauvegarder(collection, lignes.values(), ('inserer_lot', nouvelles))
+        self._noter(collection, [('inserer_lot', nouvelles)])
+        self._compteurs[collection] = nouvelles[-1]['id']
+        self.stockage.sauvegarder_compteurs(self._compteurs)
+
+        a_jour = self._cumuls is not None and self._cumuls['version'] == self.version
+        self.version += 1
+        if a_jour:
+            for ligne in nouvelles:
+                self._appliquer_cumuls(collection, None, ligne)
+        self._publier_synthese()
+        return nouvelles
+
+    def archiver(self, avant):
+        """Archive les cotisations soldées datées d'avant l'année `avant`, et leurs paiements.
+
+        Les excédents restent en paiements de report (voir archives.py).
+        Renvoie les résumés des cotisations archivées, [] s'il n'y en a aucune.
+        """
+        with self._verrou:
+            cumuls = self._cumuls_a_jour()
+            cotisations = self._lignes['cotisations']
+            choisies = cotisations_soldees(cumuls, cotisations.values(), avant)
+            # Archivage interrompu : cotisations déjà dans l'index, encore ici
+            deja = {ligne['id'] for ligne in self.archives.index()} - {c['id'] for c in choisies}
+            choisies += [c for c in cotisations.values() if c['id'] in deja]
+            if not choisies:
+                return []
+
+            table = self._lignes['paiements']
+            positions = np.flatnonzero(np.isin(table.cotisation_id, [c['id'] for c in choisies]))
+            archives = list(table.prendre(positions).values())
+            premier = self._compteurs['paiements'] + 1
+            nouveaux = [{'id': premier + i, **ligne}
+                        for i, ligne in enumerate(reports(cumuls, choisies, archives))]
+            # Archives écrites d'abord : rien n'est retiré qui n'y soit déjà
+            resumes = self.archives.ajouter(choisies, archives)
+
+            for cotisation in choisies:
+                del cotisations[cotisation['id']]
+                self.recherche.appliquer('cotisations', cotisation, None)
+            for paiement in archives:
+                del table[paiement['id']]
+                self.recherche.appliquer('paiements', paiement, None)
+            table.update({ligne['id']: ligne for ligne in nouveaux})
+            for ligne in nouveaux:
+                self.recherche.appliquer('paiements', None, ligne)
+            if nouveaux:
+                self._compteurs['paiements'] = nouveaux[-1]['id']
+                self.stockage.sauvegarder_compteurs(self._compteurs)
+            # Paiements avant cotisations : une cotisation encore présente est
+            # reprise par l'archivage suivant
+            self.stockage.sauvegarder('paiements', table.values())
+            self.stockage.sauvegarder('cotisations', cotisations.values())
+            self._noter('paiements', [('supprimer', paiement['id']) for paiement in archives]
+                        + [('inserer_lot', nouveaux)])
+            self._noter('cotisations', [('supprimer', cotisation['id']) for cotisation in choisies])
+
+            self.version += 1
+            self._publier_synthese()
+            return resumes
+
+    def instantane_au(self, jour):
+        """Données à la fin du jour donné (datetime.date), reconstituées depuis l'historique.
+
+        Aujourd'hui ou après, renvoie l'instantané courant ; None si le jour
+        précède le début de l'historique.
+        """
+        if jour >= date.today():
+            return self.instantane()
+        etat = self.historique.reconstituer(fin_du_jour(jour))
+        if etat is None:
+            return None
+        appartements = {}
+        for voisin in etat.voisins.values():
+            appartements.setdefault(cle_appartement(voisin), voisin['id'])
+        paiements = etat.paiements.figer()
+        return Instantane(f"{self.jeton}-au-{jour.isoformat()}", None, etat.voisins, etat.cotisations,
+                          paiements, construire_cumuls(etat.voisins.values(), etat.cotisations.values(),
+                                                       paiements, None),
+                          appartements)
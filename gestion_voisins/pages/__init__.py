@@ -0,0 +1,5 @@
+"""Une page par entrée du menu.
+
+Chaque module expose `afficher(donnees)`. Il n'est importé qu'à l'ouverture
+de sa page : pandas n'est chargé que par les pages qui s'en servent.
+"""
@@ -0,0 +1,88 @@
+"""Page « Cotisations »."""
+from datetime import datetime
+
+import streamlit as st
+
+from ..session import (FICHIER_COTISATIONS, archiver_cotisations, charger_donnees, obtenir_magasin, relancer,
+                       sauvegarder_donnees)
+
+
+def afficher(donnees):
+    st.header("Gestion des Cotisations")
+    _formulaire_et_liste()
+
+
+# Fragment : une création ou une suppression ne réexécute que le formulaire
+# et la liste, avec l'instantané relu après l'écriture
+@st.fragment
+def _formulaire_et_liste():
+    donnees = charger_donnees()
+    
+    col1, col2 = st.columns([1, 2])
+    
+    with col1:
+        st.subheader("Nouvelle Cotisation")
+        
+        with st.form("form_cotisation"):
+            titre = st.text_input("Titre de la cotisation")
+            montant = st.number_input("Montant par appartement (DH)", min_value=0.0, step=10.0)
+            type_cotisation = st.selectbox("Type", ["Achat", "Service"])
+            description = st.text_area("Description")
+            date_cotisation = st.date_input("Date")
+            
+            submitted = st.form_submit_button("Créer la cotisation")
+            
+            if submitted:
+                if titre and montant > 0:
+                    nouvelle_cotisation = {
+                        'titre': titre,
+                        'montant': montant,
+                        'type': type_cotisation,
+                        'description': description,
+                        'date': str(date_cotisation),
+                        'date_creation': datetime.now().strftime("%Y-%m-%d %H:%M")
+                    }
+                    sauvegarder_donnees(FICHIER_COTISATIONS, ('inserer', nouvelle_cotisation))
+                    st.success(f"Cotisation '{titre}' créée!")
+                    relancer()
+                else:
+                    st.error("Veuillez remplir tous les champs obligatoires!")
+    
+    with col2:
+        st.subheader("Liste des Cotisations")
+        
+        if donnees.cotisations:
+            for cotisation in reversed(donnees.cotisations):
+                with st.expander(f"{cotisation['titre']} - {cotisation['montant']} DH ({cotisation['type']})"):
+                    st.write(f"**Description:** {cotisation['description']}")
+                    st.write(f"**Date:** {cotisation['date']}")
+                    st.write(f"**Type:** {cotisation['type']}")
+                    
+                    if st.button("🗑️ Supprimer", key=f"del_cot_{cotisation['id']}"):
+                        sauvegarder_donnees(FICHIER_COTISATIONS, ('supprimer', cotisation['id']))
+                        relancer()
+        else:
+            st.info("Aucune cotisation enregistrée")
+
+        _archivage()
+
+
+def _archivage():
+    # Cotisations soldées des années closes, rangées hors des données courantes
+    with st.expander("🗄️ Archiver les cotisations soldées"):
+        annees = obtenir_magasin().archives.annees()
+        if annees:
+            st.caption(f"Années déjà archivées : {', '.join(map(str, annees))} "
+                       "(consultables dans Rapports › Détails par Cotisation)")
+        avant = st.number_input("Cotisations datées d'avant l'année", min_value=1900, max_value=9999,
+                                value=datetime.now().year, step=1, key="archiver_avant")
+        st.caption("Seules les cotisations payées en entier par chaque voisin sont archivées, avec leurs "
+                   "paiements ; les excédents restent au crédit des voisins. Les totaux dû et payé "
+                   "baissent du montant archivé, les restes ne changent pas.")
+        if st.button("🗄️ Archiver", key="archiver"):
+            resumes = archiver_cotisations(int(avant))
+            if resumes:
+                st.success(f"{len(resumes)} cotisation(s) archivée(s)")
+                relancer()
+            else:
+                st.info("Aucune cotisation soldée à archiver")
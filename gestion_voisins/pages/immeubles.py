@@ -0,0 +1,56 @@
+"""Page « Tous les immeubles » : synthèse de chaque immeuble et totaux.
+
+Les chiffres viennent de la synthèse persistée par chaque immeuble à chaque
+écriture (voir cumuls.synthese) : aucun paiement n'est chargé ici.
+"""
+import pandas as pd
+import streamlit as st
+
+from ..session import creer_immeuble, lire_syntheses, lister_immeubles
+
+
+def afficher(donnees):
+    st.header("Tous les immeubles")
+
+    immeubles = lister_immeubles()
+    syntheses = lire_syntheses(immeubles)
+    tableau = pd.DataFrame({
+        'Immeuble': immeubles,
+        'Voisins': [syntheses[i]['nb_voisins'] for i in immeubles],
+        'Cotisations': [syntheses[i]['nb_cotisations'] for i in immeubles],
+        'Paiements': [syntheses[i]['nb_paiements'] for i in immeubles],
+        'Attendu (DH)': [syntheses[i]['total_attendu'] / 100 for i in immeubles],
+        'Payé (DH)': [syntheses[i]['total_paye'] / 100 for i in immeubles],
+        'Impayés (DH)': [syntheses[i]['total_impaye'] / 100 for i in immeubles],
+        'Mise à jour': [syntheses[i]['mise_a_jour'] for i in immeubles],
+    })
+    attendu = tableau['Attendu (DH)']
+    tableau.insert(7, 'Taux (%)', (tableau['Payé (DH)'] / attendu.where(attendu > 0) * 100).fillna(0).round(1))
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Immeubles", len(immeubles))
+    with col2:
+        st.metric("Voisins", int(tableau['Voisins'].sum()))
+    with col3:
+        st.metric("Total payé", f"{tableau['Payé (DH)'].sum():.2f} DH")
+    with col4:
+        st.metric("Total des impayés", f"{tableau['Impayés (DH)'].sum():.2f} DH")
+
+    st.dataframe(tableau, hide_index=True, use_container_width=True)
+
+    st.subheader("Nouvel immeuble")
+    if 'immeuble_message' in st.session_state:
+        st.success(st.session_state.pop('immeuble_message'))
+    with st.form("form_immeuble", clear_on_submit=True):
+        nom = st.text_input("Nom de l'immeuble")
+        if st.form_submit_button("Créer l'immeuble"):
+            try:
+                creer_immeuble(nom)
+            except ValueError as erreur:
+                st.error(str(erreur))
+            else:
+                # Relance complète : le sélecteur de la barre latérale doit le lister
+                st.session_state['immeuble_message'] = (
+                    f"Immeuble '{nom.strip()}' créé ! Choisissez-le dans la barre latérale.")
+                st.rerun()
@@ -0,0 +1,417 @@
+"""Page « Paiements » : saisie, liste filtrée et paginée, modification."""
+import re
+from datetime import datetime
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from ..importation import CHAMPS_IMPORT, deviner_correspondance, lire_releve, valider
+from ..session import FICHIER_PAIEMENTS, charger_donnees, obtenir_magasin, relancer, sauvegarder_donnees
+
+# Affichés à la place d'un voisin ou d'une cotisation supprimés
+VOISIN_SUPPRIME = {'nom': "Voisin supprimé", 'etage': "?", 'numero_appt': "?"}
+COTISATION_SUPPRIMEE = {'titre': "Cotisation supprimée"}
+
+MODES_PAIEMENT = ["Espèces", "Virement", "Chèque"]
+STATUTS_PAIEMENT = ["✅ Complet", "⚠️ Partiel", "💰 Excédentaire"]
+TAILLES_PAGE = [25, 50, 100, 200]
+
+
+# Statut d'un paiement par rapport au montant dû
+def statut_paiement(paiement):
+    if paiement['montant_paye'] > paiement['montant_du']:
+        return "💰 Excédentaire"
+    if paiement['montant_paye'] == paiement['montant_du']:
+        return "✅ Complet"
+    return "⚠️ Partiel"
+
+
+# Statuts de toute une table de paiements, calculés sur les colonnes
+def statuts_paiements(paiements):
+    return np.select([paiements.montant_paye > paiements.montant_du,
+                      paiements.montant_paye == paiements.montant_du],
+                     ["💰 Excédentaire", "✅ Complet"], "⚠️ Partiel")
+
+
+# Filtre des paiements (voisin, cotisation, période, statuts, recherche dans
+# l'index `recherche`), du plus ancien au plus récent ; part des paiements du
+# voisin ou de la cotisation si possible
+def filtrer_paiements(donnees, voisin_id=None, cotisation_id=None, periode=(), statuts=(),
+                      requete='', recherche=None):
+    if voisin_id is not None:
+        paiements = donnees.paiements_du_voisin(voisin_id)
+    elif cotisation_id is not None:
+        paiements = donnees.paiements_de_la_cotisation(cotisation_id)
+    else:
+        paiements = donnees.paiements
+    
+    masque = np.ones(len(paiements), dtype=bool)
+    if cotisation_id is not None:
+        masque &= paiements.cotisation_id == cotisation_id
+    if len(periode) > 0:
+        masque &= paiements.date_paiement >= np.datetime64(periode[0], 'D')
+    if len(periode) > 1:
+        masque &= paiements.date_paiement <= np.datetime64(periode[1], 'D')
+    if statuts:
+        masque &= np.isin(statuts_paiements(paiements), statuts)
+    if requete:
+        masque &= recherche.masque(paiements, requete)
+    if masque.all():
+        return paiements
+    return paiements.prendre(np.flatnonzero(masque))
+
+
+def afficher(donnees):
+    st.header("Enregistrement des Paiements")
+    _saisie_et_liste()
+
+
+# Fragment : saisir, modifier ou supprimer un paiement, filtrer ou changer de
+# page ne réexécute que la saisie et la page de la liste affichée, avec
+# l'instantané relu (les arguments d'un fragment datent du dernier passage
+# complet)
+@st.fragment
+def _saisie_et_liste():
+    donnees = charger_donnees()
+    
+    if not donnees.voisins:
+        st.warning("Veuillez d'abord ajouter des voisins dans le menu 'Gestion des Voisins'")
+    elif not donnees.cotisations:
+        st.warning("Veuillez d'abord créer une cotisation dans le menu 'Cotisations'")
+    else:
+        _import_groupe(donnees)
+        
+        col1, col2 = st.columns([1, 2])
+        
+        with col1:
+            st.subheader("Nouveau Paiement")
+            
+            with st.form("form_paiement"):
+                # Sélection du voisin
+                voisins_options = {
+                    f"Étage {v['etage']} - Appt {v['numero_appt']} ({v['nom']})": v['id'] 
+                    for v in donnees.voisins
+                }
+                voisin_selectionne = st.selectbox("Voisin", list(voisins_options.keys()))
+                
+                # Sélection de la cotisation
+                cotisations_options = {
+                    f"{c['titre']} - {c['montant']} DH": c['id'] 
+                    for c in donnees.cotisations
+                }
+                cotisation_selectionnee = st.selectbox("Cotisation", list(cotisations_options.keys()))
+                
+                montant_paye = st.number_input("Montant payé (DH)", min_value=0.0, step=10.0)
+                date_paiement = st.date_input("Date de paiement")
+                mode_paiement = st.selectbox("Mode de paiement", MODES_PAIEMENT)
+                note = st.text_input("Note (facultatif)", placeholder="Ex: Premier versement, Paiement complet...")
+                
+                submitted = st.form_submit_button("Enregistrer le paiement")
+                
+                if submitted:
+                    if montant_paye > 0:
+                        voisin_id = voisins_options[voisin_selectionne]
+                        cotisation_id = cotisations_options[cotisation_selectionnee]
+                        
+                        # Récupérer le montant de la cotisation
+                        cotisation = donnees.cotisation(cotisation_id)
+                        
+                        nouveau_paiement = {
+                            'voisin_id': voisin_id,
+                            'cotisation_id': cotisation_id,
+                            'montant_paye': montant_paye,
+                            'montant_du': cotisation['montant'],
+                            'date_paiement': str(date_paiement),
+                            'mode_paiement': mode_paiement,
+                            'note': note,
+                            'date_enregistrement': datetime.now().strftime("%Y-%m-%d %H:%M")
+                        }
+                        sauvegarder_donnees(FICHIER_PAIEMENTS, ('inserer', nouveau_paiement))
+                        
+                        if montant_paye >= cotisation['montant']:
+                            st.success("✅ Paiement complet enregistré!")
+                        elif montant_paye < cotisation['montant']:
+                            st.success(f"⚠️ Paiement partiel enregistré ({montant_paye}/{cotisation['montant']} DH)")
+                        else:
+                            st.info(f"💰 Paiement excédentaire enregistré (+{montant_paye - cotisation['montant']} DH)")
+                        relancer()
+                    else:
+                        st.error("Le montant doit être supérieur à 0!")
+        
+        with col2:
+            st.subheader("Liste des Paiements")
+            
+            requete = _recherche()
+            
+            # Filtres, appliqués avant tout affichage
+            col_f1, col_f2 = st.columns(2)
+            with col_f1:
+                filtre_voisin = st.selectbox(
+                    "Filtrer par voisin",
+                    [None] + [v['id'] for v in donnees.voisins],
+                    format_func=lambda voisin_id: "Tous" if voisin_id is None else
+                        f"Étage {donnees.voisin(voisin_id)['etage']} - Appt {donnees.voisin(voisin_id)['numero_appt']}"
+                )
+            with col_f2:
+                filtre_cotisation = st.selectbox(
+                    "Filtrer par cotisation",
+                    [None] + [c['id'] for c in donnees.cotisations],
+                    format_func=lambda cotisation_id: "Toutes" if cotisation_id is None else
+                        donnees.cotisation(cotisation_id)['titre']
+                )
+            col_f3, col_f4 = st.columns(2)
+            with col_f3:
+                periode = st.date_input("Période", value=(), format="YYYY-MM-DD")
+            with col_f4:
+                filtre_statuts = st.multiselect("Statut", STATUTS_PAIEMENT)
+            
+            if donnees.paiements:
+                paiements_affiches = filtrer_paiements(donnees, filtre_voisin, filtre_cotisation,
+                                                       periode, filtre_statuts,
+                                                       requete, obtenir_magasin().recherche)
+                
+                # Pagination : seule la page courante est envoyée au navigateur
+                col_p1, col_p2 = st.columns(2)
+                with col_p1:
+                    taille_page = st.selectbox("Paiements par page", TAILLES_PAGE)
+                nb_pages = max(1, -(-len(paiements_affiches) // taille_page))
+                with col_p2:
+                    page = st.number_input("Page", min_value=1, max_value=nb_pages, value=1, step=1,
+                                           key=f"page_paiements_{nb_pages}")
+                st.caption(f"{len(paiements_affiches)} paiement(s) - page {page}/{nb_pages}")
+                
+                # Les plus récents d'abord
+                fin = len(paiements_affiches) - (page - 1) * taille_page
+                page_paiements = list(paiements_affiches.prendre(
+                    np.arange(fin - 1, max(fin - taille_page, 0) - 1, -1)).values())
+                
+                lignes_tableau = []
+                for paiement in page_paiements:
+                    # Un paiement peut survivre à la suppression de son voisin ou de sa cotisation
+                    voisin = donnees.voisin(paiement['voisin_id']) or VOISIN_SUPPRIME
+                    cotisation = donnees.cotisation(paiement['cotisation_id']) or COTISATION_SUPPRIMEE
+                    lignes_tableau.append({
+                        'Statut': statut_paiement(paiement),
+                        'Voisin': voisin['nom'],
+                        'Étage/Appt': f"{voisin['etage']}/{voisin['numero_appt']}",
+                        'Cotisation': cotisation['titre'],
+                        'Payé (DH)': paiement['montant_paye'],
+                        'Dû (DH)': paiement['montant_du'],
+                        'Date': paiement['date_paiement'],
+                        'Mode': paiement['mode_paiement'],
+                        'Note': paiement.get('note', ''),
+                    })
+                
+                # La sélection est gardée par id (voir _selectionner) et réinitialisée
+                # dès que la page ou les filtres changent
+                cle_table = (f"table_paiements_{filtre_voisin}_{filtre_cotisation}_{periode}_"
+                             f"{filtre_statuts}_{requete}_{taille_page}_{page}")
+                ids = [paiement['id'] for paiement in page_paiements]
+                st.dataframe(
+                    pd.DataFrame(lignes_tableau, index=pd.Index(ids, name='id')),
+                    hide_index=True,
+                    on_select=partial(_selectionner, cle_table, ids),
+                    selection_mode="single-row",
+                    key=cle_table
+                )
+                
+                # Un paiement supprimé entre-temps (ici ou par une autre session)
+                # n'est plus proposé
+                selection = st.session_state.get('paiement_selectionne')
+                paiement = (donnees.paiements.get(selection[1])
+                            if selection is not None and selection[0] == cle_table else None)
+                if paiement is None:
+                    st.caption("Sélectionnez un paiement pour voir son détail ou le modifier.")
+                else:
+                    voisin = donnees.voisin(paiement['voisin_id']) or VOISIN_SUPPRIME
+                    cotisation = donnees.cotisation(paiement['cotisation_id']) or COTISATION_SUPPRIMEE
+                    
+                    with st.container(border=True):
+                        st.write(f"**{statut_paiement(paiement)} - {voisin['nom']} - "
+                                 f"{cotisation['titre']} ({paiement['date_paiement']})**")
+                        col_a, col_b = st.columns(2)
+                        with col_a:
+                            st.write(f"**Voisin:** {voisin['nom']}")
+                            st.write(f"**Étage/Appt:** {voisin['etage']}/{voisin['numero_appt']}")
+                            st.write(f"**Cotisation:** {cotisation['titre']}")
+                            st.write(f"**Montant payé:** {paiement['montant_paye']} DH")
+                            st.write(f"**Montant dû:** {paiement['montant_du']} DH")
+                        
+                        with col_b:
+                            st.write(f"**Date:** {paiement['date_paiement']}")
+                            st.write(f"**Mode:** {paiement['mode_paiement']}")
+                            if paiement.get('note'):
+                                st.write(f"**Note:** {paiement['note']}")
+                            
+                            if paiement['montant_paye'] > paiement['montant_du']:
+                                excedent = paiement['montant_paye'] - paiement['montant_du']
+                                st.info(f"Excédent: +{excedent} DH")
+                            elif paiement['montant_paye'] < paiement['montant_du']:
+                                reste = paiement['montant_du'] - paiement['montant_paye']
+                                st.warning(f"Reste à payer: {reste} DH")
+                        
+                        # Boutons de modification et suppression
+                        col_mod, col_sup = st.columns(2)
+                        with col_mod:
+                            if st.button("✏️ Modifier", key=f"mod_{paiement['id']}"):
+                                st.session_state[f'edit_{paiement["id"]}'] = True
+                                relancer()
+                        
+                        with col_sup:
+                            if st.button("🗑️ Supprimer", key=f"del_{paiement['id']}"):
+                                sauvegarder_donnees(FICHIER_PAIEMENTS, ('supprimer', paiement['id']))
+                                del st.session_state['paiement_selectionne']
+                                relancer()
+                        
+                        # Formulaire de modification
+                        if st.session_state.get(f'edit_{paiement["id"]}', False):
+                            st.write("---")
+                            st.write("**Modifier le paiement:**")
+                            
+                            with st.form(f"form_edit_{paiement['id']}"):
+                                new_montant = st.number_input("Nouveau montant", 
+                                                             value=float(paiement['montant_paye']), 
+                                                             min_value=0.0, step=10.0)
+                                new_date = st.date_input("Nouvelle date", 
+                                                        value=datetime.strptime(paiement['date_paiement'], "%Y-%m-%d"))
+                                # Un mode hors de la liste (report d'archive, import, ancien
+                                # fichier) reste proposé tel quel
+                                modes = MODES_PAIEMENT + ([paiement['mode_paiement']]
+                                                          if paiement['mode_paiement'] not in MODES_PAIEMENT else [])
+                                new_mode = st.selectbox("Nouveau mode", 
+                                                       modes,
+                                                       index=modes.index(paiement['mode_paiement']))
+                                new_note = st.text_input("Nouvelle note", value=paiement.get('note', ''))
+                                
+                                col1, col2 = st.columns(2)
+                                with col1:
+                                    submit_edit = st.form_submit_button("💾 Sauvegarder")
+                                with col2:
+                                    cancel_edit = st.form_submit_button("❌ Annuler")
+                                
+                                if submit_edit:
+                                    sauvegarder_donnees(FICHIER_PAIEMENTS, ('modifier', {
+                                        'id': paiement['id'],
+                                        'montant_paye': new_montant,
+                                        'date_paiement': str(new_date),
+                                        'mode_paiement': new_mode,
+                                        'note': new_note
+                                    }))
+                                    del st.session_state[f'edit_{paiement["id"]}']
+                                    del st.session_state['paiement_selectionne']
+                                    st.success("Paiement modifié!")
+                                    relancer()
+                                
+                                if cancel_edit:
+                                    del st.session_state[f'edit_{paiement["id"]}']
+                                    relancer()
+            else:
+                st.info("Aucun paiement enregistré")
+
+
+
+def _selectionner(cle_table, ids):
+    # La ligne choisie est une position dans la page affichée : c'est l'id du
+    # paiement qui est gardé, valable même si la table est redessinée (autre
+    # écriture, suppression) avant le clic suivant
+    lignes = st.session_state[cle_table]['selection']['rows']
+    st.session_state['paiement_selectionne'] = (cle_table, ids[lignes[0]]) if lignes else None
+
+
+def _recherche():
+    # Recherche par mots ou débuts de mots ; les mots de l'index qui complètent
+    # le dernier sont proposés, et remplacent ce dernier mot d'un clic
+    requete = st.text_input("🔎 Rechercher", key="recherche_paiements",
+                            placeholder="Nom, appartement, cotisation ou note...")
+    suggestions = obtenir_magasin().recherche.completer(requete)
+    if suggestions:
+        st.pills("Suggestions", suggestions, selection_mode="multi", key=f"suggestions_{requete}",
+                 label_visibility="collapsed", on_change=_completer, args=(f"suggestions_{requete}",))
+    return requete
+
+
+def _completer(cle):
+    mots = st.session_state[cle]
+    if mots:
+        requete = st.session_state['recherche_paiements']
+        st.session_state['recherche_paiements'] = re.sub(r'\w+$', mots[-1], requete) + ' '
+
+
+# Le relevé n'est relu que si le fichier change
+@st.cache_data(max_entries=2, show_spinner=False)
+def _lire_releve(contenu, nom_fichier):
+    return lire_releve(contenu, nom_fichier)
+
+
+def _import_groupe(donnees):
+    # Relevé bancaire : colonnes associées aux champs, aperçu, puis une seule écriture
+    with st.expander("📥 Import groupé (relevé CSV ou Excel)"):
+        if 'import_message' in st.session_state:
+            st.success(st.session_state.pop('import_message'))
+        
+        # Changer de clé vide le champ de fichier après un import
+        essai = st.session_state.get('import_essai', 0)
+        fichier = st.file_uploader("Relevé bancaire", type=['csv', 'xlsx'], key=f"import_fichier_{essai}")
+        if fichier is None:
+            st.caption("Colonnes attendues : étage, appartement, cotisation, montant et date "
+                       "(mode et note facultatifs).")
+            return
+        
+        try:
+            releve = _lire_releve(fichier.getvalue(), fichier.name)
+        except ValueError as erreur:
+            st.error(str(erreur))
+            return
+        
+        # Correspondance des colonnes, devinée d'après les en-têtes
+        colonnes = [None] + list(releve.columns)
+        devinee = deviner_correspondance(releve.columns)
+        correspondance = {}
+        cols = st.columns(4)
+        for i, (champ, libelle) in enumerate(CHAMPS_IMPORT.items()):
+            with cols[i % 4]:
+                correspondance[champ] = st.selectbox(
+                    libelle, colonnes, index=colonnes.index(devinee[champ]),
+                    format_func=lambda colonne: "—" if colonne is None else colonne,
+                    key=f"import_{champ}_{essai}"
+                )
+        with cols[len(CHAMPS_IMPORT) % 4]:
+            mode_defaut = st.selectbox("Mode par défaut", MODES_PAIEMENT,
+                                       index=MODES_PAIEMENT.index("Virement"),
+                                       key=f"import_mode_defaut_{essai}")
+        
+        try:
+            resultat = valider(releve, correspondance, donnees, MODES_PAIEMENT, mode_defaut)
+        except ValueError as erreur:
+            st.warning(str(erreur))
+            return
+        
+        nb_valides = len(resultat.paiements)
+        st.caption(f"{nb_valides} paiement(s) valide(s), {len(resultat.rejetees)} ligne(s) rejetée(s)")
+        if nb_valides:
+            apercu = resultat.apercu.head(100)
+            voisins = [donnees.voisin(voisin_id) for voisin_id in apercu['voisin_id'].tolist()]
+            st.dataframe(pd.DataFrame({
+                'Voisin': [v['nom'] for v in voisins],
+                'Étage/Appt': [f"{v['etage']}/{v['numero_appt']}" for v in voisins],
+                'Cotisation': [donnees.cotisation(c)['titre'] for c in apercu['cotisation_id'].tolist()],
+                'Payé (DH)': apercu['montant_paye'],
+                'Dû (DH)': apercu['montant_du'],
+                'Date': apercu['date_paiement'],
+                'Mode': apercu['mode_paiement'],
+                'Note': apercu['note'],
+            }), hide_index=True)
+            if nb_valides > len(apercu):
+                st.caption(f"Aperçu des {len(apercu)} premiers paiements.")
+        if len(resultat.rejetees):
+            st.write("**Lignes rejetées :**")
+            st.dataframe(resultat.rejetees, hide_index=True)
+        
+        if st.button(f"📥 Importer {nb_valides} paiement(s)", disabled=not nb_valides,
+                     key=f"import_valider_{essai}"):
+            sauvegarder_donnees(FICHIER_PAIEMENTS, ('inserer_lot', resultat.paiements))
+            st.session_state['import_essai'] = essai + 1
+            st.session_state['import_message'] = f"✅ {nb_valides} paiement(s) importé(s)"
+            relancer()
@@ -0,0 +1,494 @@
+"""Page « Rapports » : vue d'ensemble, impayés, partiels, détails, classement,
+évolution mensuelle.
+
+Les rapports sont servis depuis la dernière publication du précalcul (voir
+gestion_voisins.precalcul), recalculée en arrière-plan après chaque écriture :
+la page n'attend aucun calcul et indique l'âge des chiffres affichés. Tant
+qu'aucune publication n'existe, seul le rapport choisi est calculé ici, en
+cache par estampille de l'instantané.
+
+Les impayés, partiels et détails peuvent être vus avec les soldes bruts ou
+avec le crédit de chaque voisin réparti sur ses cotisations dues, les plus
+anciennes d'abord (voir soldes.repartir_credits).
+
+Un jour passé peut être choisi : les rapports sont alors calculés ici sur les
+données de la fin de ce jour, reconstituées depuis l'historique des écritures
+(voir gestion_voisins.historique), et gardés en cache par jour.
+
+Les cotisations archivées (voir gestion_voisins.archives) ne sont lues que si
+des années sont choisies sous les détails par cotisation ; seul leur résumé,
+tenu dans l'index des archives, est affiché sans lecture.
+
+Les exports (CSV ou Parquet) ne sont produits qu'au clic sur le bouton de
+téléchargement, bloc par bloc (voir gestion_voisins.export).
+"""
+import io
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from .. import profilage
+from .. import rapports
+from ..export import EXPORTS, FORMATS, exporter, nom_fichier
+from ..session import obtenir_magasin, obtenir_precalcul
+from ..soldes import calculer_soldes, repartir_credits
+
+
+# Calcul sur place, avant la première publication. Les résultats en cache ne
+# sont que lus par les fonctions d'affichage : cache_resource les partage sans
+# la copie que ferait cache_data à chaque exécution.
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _soldes(estampille, _donnees):
+    # Agrégats du stockage seulement s'ils sont ceux de l'instantané (ni
+    # dépassé par une écriture, ni reconstitué)
+    return calculer_soldes(_donnees.voisins,
+                           _donnees.cotisations,
+                           _donnees.paiements,
+                           agregats=obtenir_magasin().agreger_paiements(_donnees))
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _soldes_repartis(estampille, _donnees):
+    return repartir_credits(_soldes(estampille, _donnees), _donnees.cotisations)
+
+
+@st.cache_resource(max_entries=20, show_spinner=False)
+def _rapport(nom, repartir, estampille, _donnees):
+    soldes = _soldes_repartis(estampille, _donnees) if repartir else _soldes(estampille, _donnees)
+    return getattr(rapports, nom)(_donnees, soldes)
+
+
+# Données d'un jour passé : elles ne changent plus ; quatre jours gardés au plus
+@st.cache_resource(max_entries=4, show_spinner="Reconstitution depuis l'historique...")
+def _instantane_au(jour, jeton, _magasin):
+    return _magasin.instantane_au(jour)
+
+
+# Années archivées : partitions lues au premier affichage, relues après un
+# nouvel archivage (signature) ou un changement des voisins (estampille)
+@st.cache_resource(max_entries=4, show_spinner="Lecture des archives...")
+def _annees_archivees(annees, signature, estampille, _archives, _donnees):
+    archivees = _archives.charger(annees, _donnees.voisins)
+    soldes = calculer_soldes(archivees.voisins, archivees.cotisations, archivees.paiements)
+    return rapports.details_cotisations(archivees, soldes)
+
+
+def afficher(donnees):
+    st.header("Rapports et Statistiques")
+
+    # Un seul rapport affiché à la fois
+    choix = st.radio(
+        "Rapport",
+        list(RAPPORTS),
+        horizontal=True,
+        label_visibility="collapsed",
+        key="rapport"
+    )
+
+    releve = profilage.courant()
+    nom, afficher_rapport = RAPPORTS[choix]
+    precalcul = obtenir_precalcul()
+    publication = precalcul.publication
+
+    jour = st.date_input("Données au", value=None, max_value=date.today() - timedelta(days=1),
+                         format="DD/MM/YYYY", key="rapports_au",
+                         help="Rapport tel qu'il était à la fin de ce jour ; vide : données actuelles")
+    repartir = False
+    if nom in rapports.PAR_COTISATION:
+        repartir = st.toggle("Répartir les excédents sur les cotisations dues (les plus anciennes d'abord)",
+                             key="repartir_credits")
+
+    if jour is not None:
+        magasin = obtenir_magasin()
+        # Vérifié avant le cache, qui garderait un None
+        debut = magasin.historique.debut()
+        if debut is None:
+            st.warning("L'historique des écritures n'a pas encore de point de reprise : "
+                       "aucune donnée passée n'est disponible.")
+            return
+        if jour < datetime.fromisoformat(debut).date():
+            st.warning(f"L'historique des écritures commence le {datetime.fromisoformat(debut):%d/%m/%Y} : "
+                       "aucune donnée n'est disponible pour ce jour.")
+            return
+        with releve.section("rapports : reconstitution"):
+            donnees = _instantane_au(jour, magasin.jeton, magasin)
+        st.caption(f"🕰️ Données à la fin du {jour:%d/%m/%Y}, reconstituées depuis l'historique")
+        with releve.section("rapports : soldes"):
+            soldes = (_soldes_repartis if repartir else _soldes)(donnees.estampille, donnees)
+        resultat = _rapport(nom, repartir, donnees.estampille, donnees)
+    elif publication is None:
+        with releve.section("rapports : soldes"):
+            soldes = (_soldes_repartis if repartir else _soldes)(donnees.estampille, donnees)
+        resultat = _rapport(nom, repartir, donnees.estampille, donnees)
+    else:
+        _age(donnees, publication, precalcul.erreur)
+        donnees = publication.donnees
+        soldes = publication.soldes_repartis if repartir else publication.soldes
+        resultat = publication.rapports[nom, repartir]
+
+    with releve.section(f"rapport : {choix}"):
+        afficher_rapport(donnees, resultat)
+
+    _exports(donnees, soldes)
+
+
+def _age(donnees, publication, erreur):
+    # Âge de la publication servie, et écritures qu'elle ne contient pas encore
+    age = time.time() - publication.calculee_le
+    texte = f"🕒 Calculé il y a {_duree(age)} (en {publication.duree:.1f} s)"
+    en_retard = publication.estampille != donnees.estampille
+    if en_retard:
+        attente = donnees.version - publication.version
+        texte += (f" · {attente} modification(s) en cours de calcul" if attente > 0
+                  else " · mise à jour en cours")
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        st.caption(texte)
+    with col2:
+        if en_retard:
+            st.button("🔄 Actualiser", key="actualiser_rapports")
+    if erreur is not None:
+        st.warning(f"Le dernier calcul a échoué ({erreur}) : les chiffres affichés sont les précédents.")
+
+
+def _duree(secondes):
+    if secondes < 60:
+        return f"{secondes:.0f} s"
+    if secondes < 3600:
+        return f"{secondes // 60:.0f} min"
+    return f"{secondes // 3600:.0f} h"
+
+
+def _exports(donnees, soldes):
+    with st.expander("⬇️ Exporter les données"):
+        col1, col2 = st.columns(2)
+        with col1:
+            export = st.selectbox("Données", list(EXPORTS), format_func=lambda nom: EXPORTS[nom][0],
+                                  key="export")
+        with col2:
+            format_ = st.selectbox("Format", FORMATS, format_func=str.upper, key="format_export")
+
+        # Le fichier n'est produit qu'au clic, hors de l'exécution du script.
+        # Streamlit le sert depuis la mémoire, en un seul bloc d'octets : le
+        # téléchargement n'est pas diffusé au fil des blocs (seuls les
+        # tableaux intermédiaires restent bornés, voir export.py).
+        def fichier():
+            tampon = io.BytesIO()
+            exporter(export, format_, donnees, soldes, tampon)
+            return tampon.getvalue()
+
+        st.download_button(
+            "⬇️ Télécharger",
+            data=fichier,
+            file_name=nom_fichier(export, format_),
+            mime="text/csv" if format_ == 'csv' else "application/vnd.apache.parquet",
+            on_click="ignore"
+        )
+
+
+def _colonne_taux(libelle):
+    return st.column_config.ProgressColumn(libelle, min_value=0, max_value=100, format="%.1f %%")
+
+
+def _colonne_dh(libelle):
+    return st.column_config.NumberColumn(libelle, format="%.2f DH")
+
+
+def _vue_ensemble(donnees, resultat):
+    st.subheader("Vue d'ensemble")
+
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        st.metric("Nombre de voisins", resultat['nb_voisins'])
+
+    with col2:
+        total_cotisations = resultat['total_attendu']
+        st.metric("Total attendu", f"{total_cotisations:.2f} DH")
+
+    with col3:
+        total_paye = resultat['total_paye']
+        st.metric("Total payé", f"{total_paye:.2f} DH")
+
+    with col4:
+        reste_total = total_cotisations - total_paye
+        st.metric("Reste à collecter", f"{reste_total:.2f} DH")
+
+    # Résumé par voisin
+    st.subheader("Résumé des paiements par voisin")
+
+    if resultat['resume'] is not None:
+        # Taux en barre de progression (plafonnée à 100 %)
+        st.dataframe(
+            resultat['resume'],
+            hide_index=True,
+            use_container_width=True,
+            column_config={'Taux (%)': _colonne_taux("Taux (%)")}
+        )
+
+
+def _impayes(donnees, resultat):
+    st.subheader("Impayés Totaux par Voisin")
+
+    if donnees.voisins and donnees.cotisations:
+        # Afficher le total général des impayés
+        st.error(f"### 💰 Total des impayés : {resultat['total']:.2f} DH")
+
+        if resultat['voisins']:
+            st.write("---")
+            # Triés par montant impayé décroissant
+            for item in resultat['voisins']:
+                voisin = item['voisin']
+                with st.expander(
+                    f"❌ {voisin['nom']} - Étage {voisin['etage']}, Appt {voisin['numero_appt']} "
+                    f"→ Reste : {item['reste']:.2f} DH"
+                ):
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.metric("Total Dû", f"{item['total_du']:.2f} DH")
+                    with col2:
+                        st.metric("Total Payé", f"{item['total_paye']:.2f} DH")
+                    with col3:
+                        st.metric("Reste", f"{item['reste']:.2f} DH", delta=f"-{item['reste']:.2f}")
+
+                    # Détail par cotisation
+                    st.write("**Détail par cotisation:**")
+                    for cotisation, total_paye_cot, reste_cot, nb_versements in item['cotisations']:
+                        if reste_cot > 0:
+                            st.write(f"  • {cotisation['titre']}: "
+                                    f"{total_paye_cot:.2f}/{cotisation['montant']:.2f} DH "
+                                    f"(Reste: {reste_cot:.2f} DH)")
+                        elif nb_versements > 1:
+                            st.write(f"  • ✅ {cotisation['titre']}: Payé en {nb_versements} versements")
+                        else:
+                            st.write(f"  • ✅ {cotisation['titre']}: Payé")
+        else:
+            st.success("🎉 Aucun impayé ! Tous les voisins sont à jour.")
+    else:
+        st.info("Aucune donnée disponible")
+
+
+def _partiels(donnees, resultat):
+    st.subheader("Paiements Partiels par Cotisation")
+
+    if donnees.cotisations and donnees.voisins:
+        if resultat.empty:
+            st.success("✅ Aucun paiement partiel")
+        else:
+            st.caption(f"⚠️ {len(resultat)} paiement(s) partiel(s), "
+                       f"reste total : {resultat['Reste (DH)'].sum():.2f} DH")
+            st.dataframe(
+                resultat,
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    'Montant (DH)': _colonne_dh("Montant"),
+                    'Payé (DH)': _colonne_dh("Payé"),
+                    'Dont crédit (DH)': _colonne_dh("Dont crédit"),
+                    'Reste (DH)': _colonne_dh("Reste"),
+                    'Taux (%)': _colonne_taux("Payé (%)"),
+                }
+            )
+    else:
+        st.info("Aucune donnée disponible")
+
+
+# Matrice voisins × cotisations : valeur affichée dans chaque cellule
+AFFICHAGES_MATRICE = {"Statut": 'statut', "Montant payé": 'paye', "Taux payé": 'taux'}
+
+
+def _details_cotisations(donnees, resultat):
+    st.subheader("Détails par cotisation")
+
+    if donnees.cotisations:
+        st.dataframe(
+            resultat['resume'],
+            hide_index=True,
+            use_container_width=True,
+            column_config={'Taux (%)': _colonne_taux("Taux reçu (%)")}
+        )
+
+        st.write("**Détails par voisin :**")
+        affichage = st.radio("Afficher", list(AFFICHAGES_MATRICE), horizontal=True, key="details_affichage")
+        cle = AFFICHAGES_MATRICE[affichage]
+        if cle == 'paye':
+            colonnes = {titre: _colonne_dh(titre) for titre in resultat['titres']}
+        elif cle == 'taux':
+            colonnes = {titre: _colonne_taux(titre) for titre in resultat['titres']}
+        else:
+            colonnes = {}
+        st.caption(" · ".join(rapports.STATUTS))
+        st.dataframe(
+            resultat[cle],
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                'Étage': st.column_config.NumberColumn("Étage", pinned=True),
+                'Appartement': st.column_config.TextColumn("Appt", pinned=True),
+                'Nom': st.column_config.TextColumn("Nom", pinned=True),
+                **colonnes,
+            }
+        )
+    else:
+        st.info("Aucune cotisation enregistrée")
+
+    _cotisations_archivees(donnees)
+
+
+COLONNES_ARCHIVES = {'annee': 'Année', 'titre': 'Cotisation', 'type': 'Type', 'date': 'Date',
+                     'montant': 'Montant (DH)', 'nb_paiements': 'Paiements', 'recu': 'Reçu (DH)',
+                     'archivee_le': 'Archivée le'}
+
+
+def _cotisations_archivees(donnees):
+    archives = obtenir_magasin().archives
+    resumes = archives.index()
+    if not resumes:
+        return
+    with st.expander(f"🗄️ Cotisations archivées ({len(resumes)})"):
+        resume = pd.DataFrame(resumes)[list(COLONNES_ARCHIVES)].rename(columns=COLONNES_ARCHIVES)
+        st.dataframe(resume.sort_values(['Année', 'Date'], kind='stable'), hide_index=True,
+                     use_container_width=True)
+        annees = st.multiselect("Détails des années", archives.annees(), key="annees_archivees",
+                                placeholder="Choisir les années à relire dans les archives")
+        if not annees:
+            return
+        resultat = _annees_archivees(tuple(sorted(annees)), archives.signature(), donnees.estampille,
+                                      archives, donnees)
+        st.dataframe(
+            resultat['paye'],
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                'Étage': st.column_config.NumberColumn("Étage", pinned=True),
+                'Appartement': st.column_config.TextColumn("Appt", pinned=True),
+                'Nom': st.column_config.TextColumn("Nom", pinned=True),
+                **{titre: _colonne_dh(titre) for titre in resultat['titres']},
+            }
+        )
+
+
+def _classement(donnees, resultat):
+    st.subheader("Classement des Voisins")
+
+    if donnees.voisins and donnees.cotisations:
+        # Graphique des meilleurs payeurs
+        st.write("### 🏆 Top 5 des meilleurs payeurs")
+        top_payeurs = resultat['meilleurs']
+
+        if not top_payeurs.empty:
+            fig_top = pd.DataFrame({
+                'Voisin': top_payeurs['Nom'].astype(str) + ' (E' + top_payeurs['Étage'].astype(str) + '/A' + top_payeurs['Appt'].astype(str) + ')',
+                'Montant Payé (DH)': top_payeurs['Total Payé']
+            })
+            st.bar_chart(fig_top.set_index('Voisin'))
+
+            for idx, row in top_payeurs.iterrows():
+                if row['Différence'] > 0:
+                    st.success(f"🌟 {row['Nom']} - Payé: {row['Total Payé']:.2f} DH (Excédent: +{row['Différence']:.2f} DH)")
+                else:
+                    st.info(f"✅ {row['Nom']} - Payé: {row['Total Payé']:.2f} DH")
+
+        st.write("---")
+
+        # Graphique des moins bons payeurs
+        st.write("### ⚠️ Top 5 des payeurs à relancer")
+        moins_payeurs = resultat['moins_bons']
+
+        if not moins_payeurs.empty:
+            fig_moins = pd.DataFrame({
+                'Voisin': moins_payeurs['Nom'].astype(str) + ' (E' + moins_payeurs['Étage'].astype(str) + '/A' + moins_payeurs['Appt'].astype(str) + ')',
+                'Montant Payé (DH)': moins_payeurs['Total Payé']
+            })
+            st.bar_chart(fig_moins.set_index('Voisin'))
+
+            for idx, row in moins_payeurs.iterrows():
+                reste = row['Total Dû'] - row['Total Payé']
+                pourcentage = (row['Total Payé'] / row['Total Dû'] * 100) if row['Total Dû'] > 0 else 0
+
+                if reste > 0:
+                    st.warning(f"❌ {row['Nom']} - Payé: {row['Total Payé']:.2f}/{row['Total Dû']:.2f} DH ({pourcentage:.1f}%) - Reste: {reste:.2f} DH")
+                else:
+                    st.success(f"✅ {row['Nom']} - À jour")
+
+        st.write("---")
+
+        # Tableau complet
+        st.write("### 📊 Tableau de classement complet")
+        complet = resultat['complet']
+        st.dataframe(
+            complet,
+            hide_index=True,
+            use_container_width=True,
+            column_config={'Total Payé': st.column_config.ProgressColumn(
+                "Total Payé", min_value=0, max_value=max(float(complet['Total Payé'].max()), 1.0),
+                format="%.2f DH")}
+        )
+    else:
+        st.info("Aucune donnée disponible pour générer le classement")
+
+
+# Ancienneté des arriérés : (libellé, âge maximal en mois) ; au-delà, la dernière
+TRANCHES_ANCIENNETE = [("Moins de 3 mois", 2), ("3 à 6 mois", 5), ("6 à 12 mois", 11), ("Plus d'un an", None)]
+
+
+def _evolution_mensuelle(donnees, resultat):
+    st.subheader("Évolution mensuelle")
+
+    if resultat.empty:
+        st.info("Aucune donnée disponible")
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        types = sorted(resultat['Type'].unique())
+        types_choisis = st.multiselect("Types de cotisation", types, default=types, key="mensuel_types")
+    with col2:
+        etage = st.selectbox("Étage", ["Tous"] + sorted(resultat['Étage'].unique().tolist()),
+                             key="mensuel_etage")
+
+    lignes = resultat[resultat['Type'].isin(types_choisis)]
+    if etage != "Tous":
+        lignes = lignes[lignes['Étage'] == etage]
+    par_mois = lignes.groupby('Mois')[['Dû (DH)', 'Encaissé (DH)', 'Réglé (DH)']].sum()
+    par_mois['Reste (DH)'] = par_mois['Dû (DH)'] - par_mois['Réglé (DH)']
+    du = par_mois['Dû (DH)']
+    par_mois['Taux (%)'] = (par_mois['Réglé (DH)'] / du.where(du > 0) * 100).round(1)
+
+    # Taux de recouvrement de chaque mois de cotisation
+    st.write("### 📈 Taux de recouvrement par mois de cotisation")
+    st.line_chart(par_mois['Taux (%)'].dropna())
+
+    st.write("### 💳 Encaissements par mois")
+    st.bar_chart(par_mois['Encaissé (DH)'])
+
+    # Reste dû de chaque mois, coloré selon son ancienneté
+    st.write("### ⏳ Ancienneté des arriérés")
+    age = pd.Period.now('M').ordinal - pd.PeriodIndex(par_mois.index, freq='M').asi8
+    tranche = np.full(len(par_mois), TRANCHES_ANCIENNETE[-1][0], dtype=object)
+    for libelle, age_max in reversed(TRANCHES_ANCIENNETE[:-1]):
+        tranche[age <= age_max] = libelle
+    arrieres = pd.DataFrame({libelle: par_mois['Reste (DH)'].where(tranche == libelle, 0).clip(lower=0)
+                             for libelle, _ in TRANCHES_ANCIENNETE}, index=par_mois.index)
+
+    colonnes = st.columns(len(TRANCHES_ANCIENNETE))
+    for colonne, (libelle, _) in zip(colonnes, TRANCHES_ANCIENNETE):
+        with colonne:
+            st.metric(libelle, f"{arrieres[libelle].sum():.2f} DH")
+    st.bar_chart(arrieres)
+
+    st.dataframe(par_mois.reset_index(), hide_index=True, use_container_width=True)
+
+
+# Libellé -> (fonction de gestion_voisins.rapports, fonction d'affichage)
+RAPPORTS = {
+    "📊 Vue d'ensemble": ('vue_ensemble', _vue_ensemble),
+    "❌ Impayés Totaux": ('impayes', _impayes),
+    "⚠️ Paiements Partiels": ('partiels', _partiels),
+    "💰 Détails par Cotisation": ('details_cotisations', _details_cotisations),
+    "📈 Classement Voisins": ('classement', _classement),
+    "📅 Évolution mensuelle": ('evolution_mensuelle', _evolution_mensuelle),
+}
@@ -0,0 +1,69 @@
+"""Page « Gestion des Voisins »."""
+from datetime import datetime
+
+import streamlit as st
+
+from ..magasin import ConflitUnicite
+from ..session import FICHIER_VOISINS, charger_donnees, relancer, sauvegarder_donnees
+
+
+def afficher(donnees):
+    st.header("Gestion des Voisins")
+    _formulaire_et_liste()
+
+
+# Fragment : un ajout ou une suppression ne réexécute que le formulaire et la
+# liste. Les arguments d'un fragment sont ceux du dernier passage complet :
+# l'instantané est donc relu ici.
+@st.fragment
+def _formulaire_et_liste():
+    donnees = charger_donnees()
+    
+    col1, col2 = st.columns([1, 2])
+    
+    with col1:
+        st.subheader("Ajouter un voisin")
+        
+        with st.form("form_voisin"):
+            etage = st.number_input("Étage", min_value=0, max_value=20, value=0, step=1)
+            numero_appt = st.text_input("Numéro d'appartement", value="")
+            nom_personne = st.text_input("Nom (facultatif)", value="")
+            
+            submitted = st.form_submit_button("Ajouter")
+            
+            if submitted:
+                if numero_appt:
+                    nouveau_voisin = {
+                        'etage': etage,
+                        'numero_appt': numero_appt,
+                        'nom': nom_personne if nom_personne else f"Appartement {numero_appt}",
+                        'date_ajout': datetime.now().strftime("%Y-%m-%d")
+                    }
+                    # L'appartement (étage, numéro) est une clé unique du magasin
+                    try:
+                        sauvegarder_donnees(FICHIER_VOISINS, ('inserer', nouveau_voisin))
+                    except ConflitUnicite:
+                        st.error("Cet appartement existe déjà!")
+                    else:
+                        st.success(f"Voisin ajouté : Étage {etage}, Appt {numero_appt}")
+                        relancer()
+                else:
+                    st.error("Le numéro d'appartement est obligatoire!")
+    
+    with col2:
+        st.subheader("Liste des Voisins")
+        
+        if donnees.voisins:
+            voisins_tries = sorted(donnees.voisins, key=lambda v: (v['etage'], v['numero_appt']))
+            
+            # Affichage avec possibilité de suppression
+            for voisin in voisins_tries:
+                col_a, col_b = st.columns([4, 1])
+                with col_a:
+                    st.write(f"**Étage {voisin['etage']} - Appt {voisin['numero_appt']}** : {voisin['nom']}")
+                with col_b:
+                    if st.button("🗑️", key=f"del_{voisin['id']}"):
+                        sauvegarder_donnees(FICHIER_VOISINS, ('supprimer', voisin['id']))
+                        relancer()
+        else:
+            st.info("Aucun voisin enregistré")
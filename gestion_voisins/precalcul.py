@@ -0,0 +1,98 @@
+"""Rapports calculés en arrière-plan après chaque écriture.
+
+`Precalcul.signaler()` est appelé après chaque écriture (voir
+session.sauvegarder_donnees) : un thread du pool recalcule les soldes et les
+données de tous les rapports sur l'instantané courant, puis remplace
+`publication`. La page Rapports sert la dernière publication sans attendre.
+Les rapports y sont rangés par (nom, répartition) : ceux qui changent quand
+les crédits sont répartis (rapports.PAR_COTISATION) sont calculés deux fois.
+
+Les écritures rapprochées sont regroupées : le calcul attend
+`DELAI_REGROUPEMENT` secondes avant de lire l'instantané, et les signaux
+reçus pendant un calcul n'en déclenchent qu'un seul de plus, sur la version
+la plus récente.
+
+Une publication n'est jamais modifiée : c'est un tuple nommé dont les
+rapports sont dans un mappingproxy, et l'instantané qu'elle porte est figé.
+"""
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+# Fonctions de gestion_voisins.rapports calculées à chaque publication
+RAPPORTS_PRECALCULES = ('vue_ensemble', 'impayes', 'partiels', 'details_cotisations', 'classement',
+                        'evolution_mensuelle')
+DELAI_REGROUPEMENT = 0.2
+
+Publication = namedtuple('Publication', ['estampille', 'version', 'donnees', 'soldes', 'soldes_repartis',
+                                         'rapports', 'calculee_le', 'duree'])
+
+
+def publier(donnees, magasin):
+    """Calcule les soldes et tous les rapports d'un instantané."""
+    # Importés au premier calcul, dans le thread du pool : pandas reste hors
+    # du démarrage des pages
+    from . import rapports
+    from .soldes import calculer_soldes, repartir_credits
+
+    debut = time.perf_counter()
+    # Agrégats du stockage seulement s'ils sont ceux de l'instantané
+    soldes = calculer_soldes(donnees.voisins, donnees.cotisations, donnees.paiements,
+                             agregats=magasin.agreger_paiements(donnees))
+    repartis = repartir_credits(soldes, donnees.cotisations)
+    resultats = {}
+    for nom in RAPPORTS_PRECALCULES:
+        resultats[nom, False] = getattr(rapports, nom)(donnees, soldes)
+        resultats[nom, True] = (getattr(rapports, nom)(donnees, repartis) if nom in rapports.PAR_COTISATION
+                                else resultats[nom, False])
+    return Publication(donnees.estampille, donnees.version, donnees, soldes, repartis,
+                       MappingProxyType(resultats), time.time(), time.perf_counter() - debut)
+
+
+class Precalcul:
+    """Un thread de calcul par magasin ; `publication` est None jusqu'au premier calcul."""
+
+    def __init__(self, magasin):
+        self._magasin = magasin
+        self._executeur = ThreadPoolExecutor(max_workers=1, thread_name_prefix='precalcul')
+        self._verrou = threading.Lock()
+        self._en_cours = False
+        self._a_refaire = False
+        self.publication = None
+        self.erreur = None
+        self.nb_calculs = 0
+        # Premier calcul dès la création
+        self.signaler()
+
+    def signaler(self):
+        """Demande un recalcul ; pendant un calcul, les demandes sont regroupées en une seule."""
+        with self._verrou:
+            if self._en_cours:
+                self._a_refaire = True
+                return
+            self._en_cours = True
+        self._executeur.submit(self._calculer)
+
+    def _calculer(self):
+        while True:
+            time.sleep(DELAI_REGROUPEMENT)
+            with self._verrou:
+                self._a_refaire = False
+            try:
+                donnees = self._magasin.instantane()
+                if self.publication is None or self.publication.estampille != donnees.estampille:
+                    self.publication = publier(donnees, self._magasin)
+                    self.nb_calculs += 1
+                self.erreur = None
+            except Exception as erreur:
+                # Gardée pour la page ; la publication précédente reste servie
+                self.erreur = erreur
+            with self._verrou:
+                if not self._a_refaire:
+                    self._en_cours = False
+                    return
+
+    def arreter(self):
+        self._executeur.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,238 @@
+"""Profilage des exécutions du script, activé à la demande.
+
+Le profilage s'active avec la variable d'environnement VOISINS_PROFILAGE=1 ou
+le paramètre d'URL ?profilage=1. Chaque exécution du script a alors son
+relevé : durée et nombre d'appels de chaque section (chargement, page du
+menu, rapport affiché, sauvegarde), éléments affichés et octets écrits
+par le stockage. Le relevé est affiché dans la barre latérale et, si
+VOISINS_PROFILAGE_CSV donne un chemin, ajouté à ce fichier CSV.
+
+Les mesures sont celles de la session profilée, même quand d'autres sessions
+du processus écrivent en même temps :
+
+- les éléments sont comptés sur le relevé rattaché au contexte d'exécution
+  du script (get_script_run_ctx) ; le compteur passe par la méthode privée
+  DeltaGenerator._enqueue, remplacée une fois pour tout le processus et
+  seulement pour les versions de Streamlit vérifiées (`VERSIONS_ENQUEUE`) :
+  ailleurs, les éléments ne sont pas comptés (affichés « - ») ;
+- les octets écrits sont ceux du thread du script (voir
+  stockage.octets_du_thread) : ni les écritures des autres sessions, ni les
+  compactions en arrière-plan n'y figurent.
+
+Désactivé, `demarrer` renvoie `INACTIF`, dont `section()` rend un contexte
+vide partagé et dont les autres méthodes ne font rien : le coût se limite à
+un appel de méthode par section.
+"""
+import csv
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+COLONNES_CSV = ['horodatage', 'session', 'page', 'section', 'duree_ms', 'appels',
+                'elements', 'octets_ecrits']
+# Versions de Streamlit (majeure, mineure) où DeltaGenerator._enqueue reçoit
+# chaque élément envoyé : [première vérifiée, première exclue)
+VERSIONS_ENQUEUE = ((1, 53), (2, 0))
+
+
+class ReleveInactif:
+    """Relevé du mode désactivé : ne mesure rien."""
+
+    _contexte = nullcontext()
+    page = None
+
+    def section(self, nom):
+        return self._contexte
+
+    def debut(self, nom):
+        pass
+
+    def fin(self, nom):
+        pass
+
+    def suivre(self, stockage):
+        pass
+
+    def terminer(self):
+        pass
+
+
+INACTIF = ReleveInactif()
+
+
+class Releve:
+    """Mesures d'une exécution du script."""
+
+    def __init__(self, session):
+        self.horodatage = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.session = session
+        self.page = None
+        self.sections = {}  # nom -> [durée en s, appels], dans l'ordre d'ouverture
+        self.elements = 0  # None si la version de Streamlit ne permet pas de les compter
+        self.octets = 0
+        self.duree = 0.0
+        self.termine = False
+        self._debut = time.perf_counter()
+        self._ouvertes = {}
+        self._stockage = None
+        self._octets_initiaux = 0
+
+    def debut(self, nom):
+        self.sections.setdefault(nom, [0.0, 0])
+        self._ouvertes[nom] = time.perf_counter()
+
+    def fin(self, nom):
+        mesure = self.sections[nom]
+        mesure[0] += time.perf_counter() - self._ouvertes.pop(nom)
+        mesure[1] += 1
+
+    @contextmanager
+    def section(self, nom):
+        self.debut(nom)
+        try:
+            yield
+        finally:
+            self.fin(nom)
+
+    def suivre(self, stockage):
+        # Les octets écrits par ce thread sont comptés à partir d'ici
+        self._stockage = stockage
+        self._octets_initiaux = stockage.octets_du_thread()
+
+    def lignes(self):
+        sections = [("exécution", self.duree, 1)] + [(nom, duree, appels) for nom, (duree, appels)
+                                                     in self.sections.items()]
+        return [{'horodatage': self.horodatage, 'session': self.session, 'page': self.page,
+                 'section': nom, 'duree_ms': round(duree * 1000, 3), 'appels': appels,
+                 'elements': self.elements, 'octets_ecrits': self.octets}
+                for nom, duree, appels in sections]
+
+    def clore(self):
+        # Les sections encore ouvertes (exécution interrompue) sont closes ici
+        for nom in list(self._ouvertes):
+            self.fin(nom)
+        self.duree = time.perf_counter() - self._debut
+        if self._stockage is not None:
+            self.octets = self._stockage.octets_du_thread() - self._octets_initiaux
+
+    def terminer(self):
+        import streamlit as st
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        # Le panneau lui-même n'est ni chronométré ni compté
+        self.clore()
+        self.termine = True
+        ctx = get_script_run_ctx()
+        if ctx is not None:
+            ctx.releve_profilage = None
+        _ecrire_csv(self)
+        afficher(st.sidebar, self, st.session_state.get('_profilage_interrompu'))
+
+
+def actif():
+    if os.environ.get('VOISINS_PROFILAGE', '') not in ('', '0'):
+        return True
+    import streamlit as st
+    return st.query_params.get('profilage', '') not in ('', '0')
+
+
+def demarrer():
+    """Ouvre le relevé de l'exécution en cours (INACTIF si le mode est coupé).
+
+    Une exécution interrompue par st.rerun() (après une sauvegarde) n'a pas
+    pu afficher son relevé : il est gardé pour l'exécution suivante.
+    """
+    import streamlit as st
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    if not actif():
+        # La session a pu être profilée auparavant (?profilage=1 retiré)
+        ctx = get_script_run_ctx()
+        if getattr(ctx, 'releve_profilage', None) is not None:
+            ctx.releve_profilage = None
+        return INACTIF
+
+    precedent = st.session_state.get('_profilage')
+    if precedent is not None and not precedent.termine:
+        precedent.clore()
+        _ecrire_csv(precedent)
+        st.session_state['_profilage_interrompu'] = precedent
+    elif precedent is not None:
+        st.session_state.pop('_profilage_interrompu', None)
+
+    ctx = get_script_run_ctx()
+    releve = Releve(ctx.session_id if ctx else None)
+    st.session_state['_profilage'] = releve
+    if not _compter_elements():
+        releve.elements = None
+    if ctx is not None:
+        ctx.releve_profilage = releve
+    return releve
+
+
+def courant():
+    """Relevé de l'exécution en cours, pour les modules qui n'en ont pas reçu."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    return getattr(get_script_run_ctx(), 'releve_profilage', None) or INACTIF
+
+
+def _compter_elements():
+    # Chaque élément envoyé au navigateur passe par DeltaGenerator._enqueue ;
+    # le compteur n'est relevé que pour les exécutions profilées. Renvoie
+    # False, sans rien remplacer, hors des versions vérifiées.
+    import streamlit
+    from streamlit.delta_generator import DeltaGenerator
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    if getattr(getattr(DeltaGenerator, '_enqueue', None), 'compte_elements', False):
+        return True
+    try:
+        version = tuple(int(partie) for partie in streamlit.__version__.split('.')[:2])
+    except ValueError:
+        return False
+    if not VERSIONS_ENQUEUE[0] <= version < VERSIONS_ENQUEUE[1] or not hasattr(DeltaGenerator, '_enqueue'):
+        return False
+    original = DeltaGenerator._enqueue
+
+    def _enqueue(self, *args, **kwargs):
+        releve = getattr(get_script_run_ctx(), 'releve_profilage', None)
+        if releve is not None:
+            releve.elements += 1
+        return original(self, *args, **kwargs)
+
+    _enqueue.compte_elements = True
+    DeltaGenerator._enqueue = _enqueue
+    return True
+
+
+def _ecrire_csv(releve):
+    chemin = os.environ.get('VOISINS_PROFILAGE_CSV')
+    if not chemin:
+        return
+    nouveau = not os.path.exists(chemin)
+    with open(chemin, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=COLONNES_CSV)
+        if nouveau:
+            writer.writeheader()
+        writer.writerows(releve.lignes())
+
+
+def afficher(conteneur, releve, interrompu=None):
+    """Panneau du relevé (et de l'exécution interrompue qui l'a précédé)."""
+    import pandas as pd
+
+    panneau = conteneur.expander("⏱️ Profilage", expanded=True)
+    for titre, mesure in (("Exécution précédente (interrompue)", interrompu),
+                          ("Cette exécution", releve)):
+        if mesure is None:
+            continue
+        panneau.caption(f"{titre} : {mesure.page or '-'} - {mesure.duree * 1000:.1f} ms - "
+                        f"{'-' if mesure.elements is None else mesure.elements} éléments - "
+                        f"{mesure.octets} octets écrits")
+        panneau.dataframe(
+            pd.DataFrame([{'Section': nom, 'Durée (ms)': round(duree * 1000, 1), 'Appels': appels}
+                          for nom, (duree, appels) in mesure.sections.items()],
+                         columns=['Section', 'Durée (ms)', 'Appels']),
+            hide_index=True,
+        )
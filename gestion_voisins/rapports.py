@@ -0,0 +1,187 @@
+"""Données de chaque rapport, calculées à partir d'un instantané et de ses soldes.
+
+Chaque fonction renvoie tout ce que sa vue affiche, sans rien afficher : la
+page Rapports peut ainsi garder le résultat en cache pour une version donnée
+des données et ne calculer que le rapport ouvert.
+
+Les soldes sont bruts (chaque paiement reste sur sa cotisation) ou répartis
+(voir soldes.repartir_credits) ; seuls les rapports de `PAR_COTISATION`
+changent avec la répartition.
+"""
+import numpy as np
+import pandas as pd
+
+
+def vue_ensemble(donnees, soldes):
+    # Totaux globaux tenus à jour à chaque écriture
+    cumuls = donnees.cumuls
+    resultat = {
+        'nb_voisins': len(donnees.voisins),
+        'total_attendu': cumuls['du_par_voisin'] * len(donnees.voisins) / 100,
+        'total_paye': cumuls['total_paye'] / 100,
+        'resume': None,
+    }
+    if donnees.voisins and donnees.cotisations:
+        totaux_voisins = soldes.par_voisin.to_dict('index')
+        data_resume = []
+        for voisin in donnees.voisins:
+            # Total dû, payé (TOUS les paiements du voisin), reste et taux
+            totaux = totaux_voisins[voisin['id']]
+            data_resume.append({
+                'Étage': voisin['etage'],
+                'Appartement': voisin['numero_appt'],
+                'Nom': voisin['nom'],
+                'Total Dû (DH)': totaux['total_du'],
+                'Total Payé (DH)': totaux['total_paye'],
+                'Reste (DH)': totaux['reste'],
+                'Taux (%)': totaux['taux']
+            })
+        resultat['resume'] = pd.DataFrame(data_resume).sort_values('Reste (DH)', ascending=False)
+    return resultat
+
+
+def impayes(donnees, soldes):
+    """Voisins qui doivent encore quelque chose, du plus gros reste au plus petit."""
+    totaux_voisins = soldes.par_voisin.to_dict('index')
+    cellules = soldes.matrice.to_dict('index')
+    impaye_data = []
+    for voisin in donnees.voisins:
+        # Total dû, total payé (somme de tous les paiements) et reste
+        totaux = totaux_voisins[voisin['id']]
+        if totaux['reste'] > 0:
+            impaye_data.append({
+                'voisin': voisin,
+                'total_du': totaux['total_du'],
+                'total_paye': totaux['total_paye'],
+                'reste': totaux['reste'],
+                # Paiements de chaque cotisation : (cotisation, payé, reste, versements)
+                'cotisations': [(cotisation,) + tuple(cellules[(voisin['id'], cotisation['id'])][cle]
+                                                      for cle in ('paye', 'reste', 'nb_versements'))
+                                for cotisation in donnees.cotisations],
+            })
+    impaye_data.sort(key=lambda x: x['reste'], reverse=True)
+    return {'total': donnees.cumuls['total_impaye'] / 100, 'voisins': impaye_data}
+
+
+# Rapports qui lisent les soldes cotisation par cotisation
+PAR_COTISATION = ('impayes', 'partiels', 'details_cotisations')
+
+# Statut d'une cellule voisin × cotisation, du plus au moins favorable
+STATUTS = ["💰 Excédent", "✅ Payé", "⚠️ Partiel", "❌ Non payé"]
+
+
+def _appartements(donnees):
+    # Étage, appartement et nom de chaque voisin, dans l'ordre des soldes
+    appartements = pd.DataFrame({
+        'Étage': [v['etage'] for v in donnees.voisins],
+        'Appartement': [v['numero_appt'] for v in donnees.voisins],
+        'Nom': [v['nom'] for v in donnees.voisins],
+    }, index=pd.Index([v['id'] for v in donnees.voisins], name='voisin_id'))
+    return appartements[~appartements.index.duplicated()]
+
+
+def _titres(donnees, ids):
+    # Titre de chaque cotisation ; un titre porté par plusieurs reçoit son id
+    titres = pd.Series({c['id']: c['titre'] for c in donnees.cotisations}, dtype=object)
+    doubles = titres.duplicated(keep=False)
+    titres[doubles] = titres[doubles] + ' #' + titres.index[doubles].astype(str)
+    return titres.loc[ids]
+
+
+def partiels(donnees, soldes):
+    """Paires voisin × cotisation payées en partie seulement, cotisation par cotisation."""
+    matrice = soldes.matrice
+    cellules = matrice[(matrice['paye'] > 0) & (matrice['paye'] < matrice['du'])].reset_index()
+    # Ordre des cotisations, puis des voisins
+    rang = soldes.par_cotisation.index.get_indexer(cellules['cotisation_id'])
+    cellules = cellules.iloc[np.argsort(rang, kind='stable')]
+    tableau = _appartements(donnees).loc[cellules['voisin_id']].reset_index(drop=True)
+    tableau.insert(0, 'Cotisation', _titres(donnees, cellules['cotisation_id']).to_numpy())
+    tableau.insert(1, 'Montant (DH)', cellules['du'].to_numpy())
+    tableau['Versements'] = cellules['nb_versements'].to_numpy()
+    tableau['Payé (DH)'] = cellules['paye'].round(2).to_numpy()
+    if 'credit_recu' in cellules:
+        # Soldes répartis : part du payé venue du crédit du voisin
+        tableau['Dont crédit (DH)'] = cellules['credit_recu'].round(2).to_numpy()
+    tableau['Reste (DH)'] = cellules['reste'].round(2).to_numpy()
+    tableau['Taux (%)'] = (cellules['paye'] / cellules['du'] * 100).round(1).to_numpy()
+    return tableau
+
+
+def details_cotisations(donnees, soldes):
+    """Résumé par cotisation et matrice voisins × cotisations (payé, taux, statut)."""
+    cotisations = soldes.par_cotisation
+    infos = {c['id']: c for c in donnees.cotisations}
+    titres = _titres(donnees, cotisations.index)
+    resume = pd.DataFrame({
+        'Cotisation': titres.to_numpy(),
+        'Type': [infos[i]['type'] for i in cotisations.index],
+        'Date': [infos[i]['date'] for i in cotisations.index],
+        'Montant (DH)': cotisations['montant'].to_numpy(),
+        'Attendu (DH)': cotisations['total_attendu'].to_numpy(),
+        # Total reçu pour cette cotisation (somme de tous les paiements)
+        'Reçu (DH)': cotisations['total_recu'].round(2).to_numpy(),
+    })
+    resume['Reste (DH)'] = (resume['Attendu (DH)'] - resume['Reçu (DH)']).round(2)
+    attendu = resume['Attendu (DH)']
+    resume['Taux (%)'] = (resume['Reçu (DH)'] / attendu.where(attendu > 0) * 100).round(1)
+
+    # Cellules de la matrice : une ligne par voisin, une colonne par cotisation
+    appartements = _appartements(donnees)
+    forme = (len(appartements), len(cotisations))
+    paye = soldes.matrice['paye'].to_numpy().reshape(forme)
+    du = soldes.matrice['du'].to_numpy().reshape(forme)
+    statut = np.select([paye > du, paye == du, paye > 0], STATUTS[:3], STATUTS[3])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        taux = np.where(du > 0, paye / du * 100, 100.0)
+
+    def matrice(valeurs):
+        return pd.concat([appartements, pd.DataFrame(valeurs, index=appartements.index,
+                                                     columns=titres.to_numpy())], axis=1)
+
+    return {
+        'resume': resume,
+        'titres': titres.tolist(),
+        'statut': matrice(statut),
+        'paye': matrice(paye.round(2)),
+        'taux': matrice(taux.round(1)),
+    }
+
+
+def classement(donnees, soldes):
+    """Classement complet, 5 meilleurs et 5 moins bons payeurs."""
+    totaux_voisins = soldes.par_voisin.to_dict('index')
+    classement_data = []
+    for voisin in donnees.voisins:
+        totaux = totaux_voisins[voisin['id']]
+        classement_data.append({
+            'Nom': voisin['nom'],
+            'Étage': voisin['etage'],
+            'Appt': voisin['numero_appt'],
+            'Total Payé': totaux['total_paye'],
+            'Total Dû': totaux['total_du'],
+            'Différence': totaux['total_paye'] - totaux['total_du']
+        })
+    # Colonnes nommées et typées : un immeuble sans voisins donne un classement vide
+    df_classement = pd.DataFrame(classement_data, columns=['Nom', 'Étage', 'Appt', 'Total Payé', 'Total Dû',
+                                                           'Différence'])
+    df_classement = df_classement.astype({'Total Payé': float, 'Total Dû': float, 'Différence': float})
+    return {
+        'meilleurs': df_classement.nlargest(5, 'Total Payé'),
+        'moins_bons': df_classement.nsmallest(5, 'Total Payé'),
+        'complet': df_classement.sort_values('Total Payé', ascending=False),
+    }
+
+
+def evolution_mensuelle(donnees, soldes):
+    """Dû, encaissé et réglé (DH) par mois, type de cotisation et étage, lus dans les cumuls."""
+    mensuel = donnees.cumuls['mensuel']
+    montants = np.array(list(mensuel.values()), dtype=np.int64).reshape(-1, 3) / 100
+    return pd.DataFrame({
+        'Mois': [mois for mois, _, _ in mensuel],
+        'Type': [type_cotisation for _, type_cotisation, _ in mensuel],
+        'Étage': [etage for _, _, etage in mensuel],
+        'Dû (DH)': montants[:, 0],
+        'Encaissé (DH)': montants[:, 1],
+        'Réglé (DH)': montants[:, 2],
+    }).sort_values('Mois', kind='stable')
@@ -0,0 +1,155 @@
+"""Index de recherche des paiements : appartement, nom, cotisation et note.
+
+Les textes sont découpés en mots, sans accents ni majuscules. Chaque mot
+renvoie aux voisins (nom, étage, appartement), aux cotisations (titre) et aux
+notes de paiement qui le contiennent. Le vocabulaire est gardé trié : un mot
+de la recherche est cherché par son début (« benn » trouve « Bennani »).
+
+Une recherche de plusieurs mots garde les paiements qui les contiennent tous,
+chacun par le voisin, la cotisation ou la note du paiement. Les notes sont
+indexées une fois par texte distinct et comptées : une note sort de l'index
+avec son dernier paiement.
+
+L'index est tenu à jour par le magasin à chaque écriture (`appliquer`) ; les
+recherches des sessions passent par son propre verrou.
+"""
+import bisect
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+# Mots proposés au plus par `completer`
+NB_SUGGESTIONS = 8
+
+
+def _normaliser(texte):
+    # Sans accents ni majuscules ; les autres écritures sont gardées
+    decompose = unicodedata.normalize('NFKD', str(texte))
+    return ''.join(c for c in decompose if not unicodedata.combining(c)).casefold()
+
+
+def mots(texte):
+    """Mots d'un texte, sans accents ni majuscules."""
+    return set(re.findall(r'\w+', _normaliser(texte)))
+
+
+def _texte_voisin(voisin):
+    return f"{voisin['etage']} {voisin['numero_appt']} {voisin['nom']}"
+
+
+class IndexRecherche:
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._vocabulaire = []  # mots triés
+        self._occurrences = {}  # mot -> nombre de clés qui le contiennent
+        # genre -> mot -> clés (ids de voisins ou de cotisations, textes des notes)
+        self._cles = {'voisins': {}, 'cotisations': {}, 'notes': {}}
+        self._mots = {'voisins': {}, 'cotisations': {}, 'notes': {}}  # genre -> clé -> mots
+        self._notes = {}  # note -> nombre de paiements
+
+    @classmethod
+    def construire(cls, voisins, cotisations, paiements):
+        # paiements : TablePaiements ; ses notes sont comptées en une passe
+        index = cls()
+        for voisin in voisins:
+            index._ajouter('voisins', voisin['id'], _texte_voisin(voisin))
+        for cotisation in cotisations:
+            index._ajouter('cotisations', cotisation['id'], cotisation['titre'])
+        for note, nombre in Counter(paiements.note.tolist()).items():
+            index._compter_note(note, nombre)
+        return index
+
+    # --- Mise à jour ---
+
+    def _ajouter(self, genre, cle, texte):
+        self._retirer(genre, cle)
+        nouveaux = mots(texte)
+        self._mots[genre][cle] = nouveaux
+        for mot in nouveaux:
+            self._cles[genre].setdefault(mot, set()).add(cle)
+            if mot not in self._occurrences:
+                bisect.insort(self._vocabulaire, mot)
+            self._occurrences[mot] = self._occurrences.get(mot, 0) + 1
+
+    def _retirer(self, genre, cle):
+        for mot in self._mots[genre].pop(cle, ()):
+            cles = self._cles[genre][mot]
+            cles.discard(cle)
+            if not cles:
+                del self._cles[genre][mot]
+            self._occurrences[mot] -= 1
+            if not self._occurrences[mot]:
+                del self._occurrences[mot]
+                del self._vocabulaire[bisect.bisect_left(self._vocabulaire, mot)]
+
+    def _compter_note(self, note, nombre):
+        if not isinstance(note, str) or not note:
+            return
+        avant = self._notes.pop(note, 0)
+        if avant + nombre <= 0:
+            self._retirer('notes', note)
+            return
+        self._notes[note] = avant + nombre
+        if not avant:
+            self._ajouter('notes', note, note)
+
+    def appliquer(self, collection, ancienne, nouvelle):
+        """Reporte une écriture : ligne avant (None si insérée), ligne après (None si supprimée)."""
+        with self._verrou:
+            if collection == 'paiements':
+                if ancienne is not None:
+                    self._compter_note(ancienne.get('note'), -1)
+                if nouvelle is not None:
+                    self._compter_note(nouvelle.get('note'), +1)
+                return
+            genre, texte = (('voisins', _texte_voisin) if collection == 'voisins'
+                            else ('cotisations', lambda cotisation: cotisation['titre']))
+            if nouvelle is None:
+                self._retirer(genre, ancienne['id'])
+            else:
+                self._ajouter(genre, nouvelle['id'], texte(nouvelle))
+
+    # --- Recherche ---
+
+    def _commencant_par(self, prefixe):
+        debut = bisect.bisect_left(self._vocabulaire, prefixe)
+        fin = bisect.bisect_left(self._vocabulaire, prefixe + '\U0010ffff', debut)
+        return self._vocabulaire[debut:fin]
+
+    def completer(self, prefixe, nombre=NB_SUGGESTIONS):
+        """Mots de l'index qui commencent par le dernier mot de `prefixe`."""
+        # Rien à compléter si la requête se termine par un espace
+        derniers = re.findall(r'\w+$', _normaliser(prefixe))
+        if not derniers:
+            return []
+        with self._verrou:
+            return self._commencant_par(derniers[-1])[:nombre]
+
+    def criteres(self, requete):
+        """Pour chaque mot de la requête : (ids de voisins, ids de cotisations, notes)."""
+        with self._verrou:
+            resultat = []
+            for prefixe in sorted(mots(requete)):
+                trouves = {genre: set() for genre in self._cles}
+                for mot in self._commencant_par(prefixe):
+                    for genre, cles in self._cles.items():
+                        trouves[genre] |= cles.get(mot, set())
+                resultat.append((trouves['voisins'], trouves['cotisations'], trouves['notes']))
+            return resultat
+
+    def masque(self, paiements, requete):
+        """Masque des paiements (TablePaiements) qui contiennent tous les mots de la requête."""
+        masque = np.ones(len(paiements), dtype=bool)
+        for voisins, cotisations, notes_trouvees in self.criteres(requete):
+            correspond = np.isin(paiements.voisin_id, list(voisins)) | \
+                np.isin(paiements.cotisation_id, list(cotisations))
+            if notes_trouvees:
+                # Notes en texte libre (ou None) : comparées une à une à l'ensemble trouvé
+                correspond |= np.fromiter((note in notes_trouvees for note in paiements.note),
+                                          dtype=bool, count=len(paiements))
+            masque &= correspond
+        return masque
@@ -0,0 +1,161 @@
+"""Accès aux données depuis les pages Streamlit.
+
+Un seul magasin par immeuble et par processus, partagé par toutes les
+sessions ; chaque session garde l'instantané qu'elle affiche dans
+st.session_state.
+
+Avec VOISINS_IMMEUBLES, chaque sous-dossier de ce dossier est un immeuble,
+avec ses propres fichiers (ou sa propre base) : seul l'immeuble choisi dans la
+session est chargé, et au plus IMMEUBLES_CHARGES magasins restent en mémoire
+(le moins récemment utilisé est libéré). Sans cette variable, le dossier
+courant est l'unique immeuble.
+
+Chaque écriture est signalée au précalcul du magasin (voir precalcul.py), qui
+recalcule les rapports en arrière-plan.
+
+Les formulaires et les listes qu'ils modifient sont des fragments
+(st.fragment) : après une écriture, `relancer()` ne réexécute que le
+fragment, qui relit ses données avec `charger_donnees()`.
+"""
+import os
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from . import profilage
+from .magasin import Magasin
+from .precalcul import Precalcul
+from .stockage import collection_du_fichier, ouvrir_stockage
+
+# Fichiers de sauvegarde
+FICHIER_VOISINS = "voisins.json"
+FICHIER_COTISATIONS = "cotisations.json"
+FICHIER_PAIEMENTS = "paiements.json"
+
+# Stockage : fichiers JSON (par défaut) ou base SQLite (VOISINS_STOCKAGE=sqlite)
+TYPE_STOCKAGE = os.environ.get("VOISINS_STOCKAGE", "json")
+
+
+# Immeubles : un sous-dossier par immeuble (VOISINS_IMMEUBLES=dossier)
+DOSSIER_IMMEUBLES = os.environ.get("VOISINS_IMMEUBLES")
+IMMEUBLE_PAR_DEFAUT = "principal"
+IMMEUBLES_CHARGES = int(os.environ.get("VOISINS_IMMEUBLES_CHARGES", "4"))
+
+
+@st.cache_resource(max_entries=IMMEUBLES_CHARGES)
+def _magasin(type_stockage, dossier):
+    return Magasin(ouvrir_stockage(type_stockage, dossier))
+
+
+# Stockage de chaque immeuble ouvert en lecture seule, une fois par processus :
+# la vue des immeubles relit leurs synthèses sans schéma ni migration
+@st.cache_resource(show_spinner=False)
+def _stockage_lecture(type_stockage, dossier):
+    return ouvrir_stockage(type_stockage, dossier, lecture_seule=True)
+
+
+# Un précalcul par magasin (jeton) ; son thread est arrêté quand il sort du cache
+@st.cache_resource(max_entries=IMMEUBLES_CHARGES, on_release=Precalcul.arreter)
+def _precalcul(jeton, _magasin):
+    return Precalcul(_magasin)
+
+
+def lister_immeubles():
+    """Noms des immeubles, triés ; [] sans VOISINS_IMMEUBLES.
+
+    Un premier immeuble est créé si le dossier n'en contient aucun.
+    """
+    if not DOSSIER_IMMEUBLES:
+        return []
+    os.makedirs(DOSSIER_IMMEUBLES, exist_ok=True)
+    immeubles = sorted(nom for nom in os.listdir(DOSSIER_IMMEUBLES)
+                       if os.path.isdir(os.path.join(DOSSIER_IMMEUBLES, nom)))
+    if not immeubles:
+        creer_immeuble(IMMEUBLE_PAR_DEFAUT)
+        immeubles = [IMMEUBLE_PAR_DEFAUT]
+    return immeubles
+
+
+def creer_immeuble(nom):
+    """Crée le dossier d'un nouvel immeuble ; lève ValueError si le nom ne convient pas."""
+    nom = nom.strip()
+    if not nom or nom.startswith('.') or os.sep in nom or (os.altsep and os.altsep in nom):
+        raise ValueError(f"Nom d'immeuble invalide : {nom!r}")
+    chemin = os.path.join(DOSSIER_IMMEUBLES, nom)
+    if os.path.exists(chemin):
+        raise ValueError(f"L'immeuble {nom} existe déjà")
+    os.makedirs(chemin)
+    return nom
+
+
+def dossier_immeuble(immeuble):
+    return os.path.join(DOSSIER_IMMEUBLES, immeuble) if DOSSIER_IMMEUBLES and immeuble else '.'
+
+
+# Immeuble choisi dans la session (sélecteur de la barre latérale)
+def immeuble_courant():
+    return st.session_state.get('immeuble')
+
+
+def obtenir_magasin(immeuble=None):
+    return _magasin(TYPE_STOCKAGE, dossier_immeuble(immeuble or immeuble_courant()))
+
+
+def obtenir_precalcul(immeuble=None):
+    magasin = obtenir_magasin(immeuble)
+    return _precalcul(magasin.jeton, magasin)
+
+
+def lire_syntheses(immeubles):
+    """Synthèse de chaque immeuble, lue dans son stockage sans charger ses paiements.
+
+    Un immeuble encore jamais ouvert n'a pas de synthèse (ni de base SQLite) :
+    il est chargé une fois pour la produire.
+    """
+    syntheses = {}
+    for immeuble in immeubles:
+        try:
+            synthese = _stockage_lecture(TYPE_STOCKAGE, dossier_immeuble(immeuble)).charger_synthese()
+        except FileNotFoundError:
+            synthese = None
+        if synthese is None:
+            synthese = obtenir_magasin(immeuble).stockage.charger_synthese()
+        syntheses[immeuble] = synthese
+    return syntheses
+
+
+# L'instantané de la session n'est relu que si le magasin (immeuble changé)
+# ou sa version ont changé
+def charger_donnees():
+    magasin = obtenir_magasin()
+    donnees = st.session_state.get('donnees')
+    if donnees is None or donnees.estampille != magasin.estampille:
+        donnees = magasin.instantane()
+        st.session_state.donnees = donnees
+    return donnees
+
+
+# modification : ('inserer', ligne), ('modifier', ligne) ou ('supprimer', id) ;
+# l'écriture est aussitôt visible des autres sessions, et les rapports sont
+# recalculés en arrière-plan
+def sauvegarder_donnees(fichier, modification):
+    with profilage.courant().section("sauvegarde"):
+        resultat = obtenir_magasin().ecrire(collection_du_fichier(fichier), modification)
+    obtenir_precalcul().signaler()
+    return resultat
+
+
+# Archive les cotisations soldées datées d'avant l'année donnée, avec leurs
+# paiements (voir archives.py) ; renvoie leurs résumés
+def archiver_cotisations(avant):
+    with profilage.courant().section("archivage"):
+        resumes = obtenir_magasin().archiver(avant)
+    obtenir_precalcul().signaler()
+    return resumes
+
+
+# Relance le fragment en cours ; le script entier si le fragment s'exécute
+# dans un passage complet (st.rerun(scope="fragment") y est refusé)
+def relancer():
+    ctx = get_script_run_ctx()
+    st.rerun(scope="fragment" if ctx is not None and ctx.fragment_ids_this_run else "app")
@@ -0,0 +1,114 @@
+"""Moteur des rapports : soldes voisin × cotisation calculés en une seule passe."""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+Soldes = namedtuple('Soldes', ['matrice', 'par_voisin', 'par_cotisation'])
+
+
+def calculer_soldes(voisins, cotisations, paiements, agregats=None):
+    """Construit la matrice voisin × cotisation (payé, dû, reste, versements).
+
+    - matrice : indexée par (voisin_id, cotisation_id), toutes les paires
+    - par_voisin : total dû / payé / reste / taux, tous paiements du voisin confondus
+    - par_cotisation : total attendu / reçu, tous paiements de la cotisation confondus
+
+    Les sommes passent par np.bincount sur les montants en centimes entiers de
+    la table des paiements ; elles sont exactes et converties en DH à la fin.
+
+    agregats : lignes (voisin_id, cotisation_id, centimes payés, versements)
+    déjà agrégées par le stockage ; la table des paiements n'est alors pas lue.
+    """
+    ids_voisins = pd.Index([v['id'] for v in voisins]).unique()
+    ids_cotisations = pd.Index([c['id'] for c in cotisations]).unique()
+    montants_cotisations = pd.Series({c['id']: c['montant'] for c in cotisations},
+                                     dtype=float).reindex(ids_cotisations)
+    nb_v, nb_c = len(ids_voisins), len(ids_cotisations)
+
+    if agregats is None:
+        voisin_ids, cotisation_ids = paiements.voisin_id, paiements.cotisation_id
+        centimes = paiements.montant_paye
+        versements = np.ones(len(centimes), dtype=np.int64)
+    else:
+        agregats = np.array(agregats, dtype=np.int64).reshape(-1, 4)
+        voisin_ids, cotisation_ids, centimes, versements = agregats.T
+    code_v = ids_voisins.get_indexer(voisin_ids)
+    code_c = ids_cotisations.get_indexer(cotisation_ids)
+    montants = centimes.astype(float)
+
+    # Cellules voisin × cotisation (paiements dont le voisin et la cotisation existent)
+    connus = (code_v >= 0) & (code_c >= 0)
+    cellule = code_v[connus] * nb_c + code_c[connus]
+    paye = np.bincount(cellule, weights=montants[connus], minlength=nb_v * nb_c) / 100
+    nb_versements = np.bincount(cellule, weights=versements[connus], minlength=nb_v * nb_c).astype(np.int64)
+    du = np.tile(montants_cotisations.to_numpy(), nb_v)
+    matrice = pd.DataFrame(
+        {'paye': paye, 'du': du, 'reste': du - paye, 'nb_versements': nb_versements},
+        index=pd.MultiIndex.from_product([ids_voisins, ids_cotisations],
+                                         names=['voisin_id', 'cotisation_id'])
+    )
+
+    # Totaux par voisin : tous ses paiements, même sur une cotisation supprimée
+    total_du = sum(c['montant'] for c in cotisations)
+    total_paye = np.bincount(code_v[code_v >= 0], weights=montants[code_v >= 0], minlength=nb_v) / 100
+    par_voisin = pd.DataFrame({'total_du': float(total_du), 'total_paye': total_paye},
+                              index=ids_voisins.rename('voisin_id'))
+    par_voisin['reste'] = par_voisin['total_du'] - par_voisin['total_paye']
+    par_voisin['taux'] = (par_voisin['total_paye'] / par_voisin['total_du'] * 100) if total_du > 0 else 0.0
+
+    # Totaux par cotisation : tous ses paiements, même d'un voisin supprimé
+    total_recu = np.bincount(code_c[code_c >= 0], weights=montants[code_c >= 0], minlength=nb_c) / 100
+    par_cotisation = pd.DataFrame({'montant': montants_cotisations.to_numpy(),
+                                   'total_recu': total_recu},
+                                  index=ids_cotisations.rename('cotisation_id'))
+    par_cotisation['total_attendu'] = par_cotisation['montant'] * len(voisins)
+
+    return Soldes(matrice, par_voisin, par_cotisation)
+
+
+def repartir_credits(soldes, cotisations):
+    """Soldes où le crédit de chaque voisin règle ses cotisations dues, les plus anciennes d'abord.
+
+    Le crédit d'un voisin est ce qu'il a payé au-delà du dû de chaque
+    cotisation, plus ses paiements sur des cotisations supprimées. Il est
+    versé aux cotisations qui lui restent dues, par date (puis dans l'ordre
+    des cotisations), pour tous les voisins à la fois : la somme cumulée des
+    besoins dit ce que chaque cellule reçoit.
+
+    La matrice garde `paye_brut` et gagne `credit_recu` ; `paye` et `reste`
+    sont ceux après répartition, jamais au-delà du dû. Le crédit qui reste
+    après avoir tout réglé est dans `par_voisin['credit_restant']`. Les totaux
+    par voisin ne changent pas.
+    """
+    nb_v, nb_c = len(soldes.par_voisin), len(soldes.par_cotisation)
+    matrice = soldes.matrice
+    # En centimes entiers : les sommes cumulées restent exactes
+    paye = np.round(matrice['paye'].to_numpy() * 100).astype(np.int64).reshape(nb_v, nb_c)
+    du = np.round(matrice['du'].to_numpy() * 100).astype(np.int64).reshape(nb_v, nb_c)
+    regle = np.minimum(paye, du)
+    total_paye = np.round(soldes.par_voisin['total_paye'].to_numpy() * 100).astype(np.int64)
+    credit = total_paye - regle.sum(axis=1)
+
+    # Cotisations par date ; sans date, en dernier
+    dates = {c['id']: c.get('date') or '' for c in cotisations}
+    cles = [(not dates.get(i), dates.get(i, '')) for i in soldes.par_cotisation.index]
+    ordre = np.array(sorted(range(nb_c), key=cles.__getitem__), dtype=np.int64)
+
+    besoin = np.maximum(du - paye, 0)[:, ordre]
+    avant = np.cumsum(besoin, axis=1) - besoin
+    recu = np.empty_like(besoin)
+    recu[:, ordre] = np.clip(credit[:, None] - avant, 0, besoin)
+
+    repartie = matrice.copy()
+    paye_reparti = regle + recu
+    repartie['paye_brut'] = matrice['paye']
+    repartie['credit_recu'] = recu.ravel() / 100
+    repartie['paye'] = paye_reparti.ravel() / 100
+    repartie['reste'] = repartie['du'] - repartie['paye']
+
+    par_voisin = soldes.par_voisin.copy()
+    par_voisin['credit_restant'] = (credit - recu.sum(axis=1)) / 100
+    par_cotisation = soldes.par_cotisation.copy()
+    par_cotisation['total_recu'] += (paye_reparti - paye).sum(axis=0) / 100
+    return Soldes(repartie, par_voisin, par_cotisation)
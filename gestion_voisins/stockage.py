@@ -0,0 +1,486 @@
+"""Stockage des voisins, cotisations et paiements.
+
+Deux implémentations partagent la même interface :
+
+- StockageJSON : un fichier JSON par collection (le format historique de
+  l'application) ; les écritures de paiements sont ajoutées à un journal
+  JSONL, replié périodiquement dans le fichier ;
+- StockageSQLite : une base SQLite en mode WAL, avec des tables indexées et
+  des écritures d'une seule ligne.
+
+`sauvegarder(collection, donnees, modification)` reçoit toujours toutes les
+lignes (une liste ou une vue, parcourue seulement si besoin) ; `modification`
+décrit l'écriture qui vient d'être faite et permet au stockage de ne
+persister que cette ligne :
+
+    ('inserer', ligne) | ('modifier', ligne) | ('supprimer', id)
+    | ('inserer_lot', lignes)
+
+Un lot est écrit d'un bloc : un seul ajout au journal (une ligne par
+insertion) ou une seule transaction SQLite.
+
+Les compteurs d'identifiants (dernier id attribué par collection) sont
+persistés à part, pour qu'un id supprimé ne soit jamais réattribué. La
+synthèse de l'immeuble (quelques totaux, voir cumuls.synthese) l'est aussi :
+la vue de tous les immeubles la lit sans charger leurs paiements.
+
+Ouvert en lecture seule (`lecture_seule=True`), un stockage ne crée ni ne
+modifie rien : pas de compaction du journal au chargement, pas de schéma ni de
+migration SQLite, base ouverte en mode `ro`. C'est ainsi que le lisent les
+exports et rapports en ligne de commande.
+
+`octets_ecrits` cumule le volume écrit depuis l'ouverture : la taille exacte
+des fichiers et lignes de journal pour StockageJSON, la taille des valeurs
+écrites (hors pages et index) pour StockageSQLite. `octets_du_thread()` n'en
+garde que la part écrite par le thread appelant : celle d'une exécution du
+script, quand plusieurs sessions partagent le stockage.
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+COLLECTIONS = ('voisins', 'cotisations', 'paiements')
+
+# Colonnes de chaque table, dans l'ordre des champs JSON
+SCHEMA = {
+    'voisins': [
+        ('id', 'INTEGER NOT NULL'),
+        ('etage', 'INTEGER'),
+        ('numero_appt', 'TEXT'),
+        ('nom', 'TEXT'),
+        ('date_ajout', 'TEXT'),
+    ],
+    'cotisations': [
+        ('id', 'INTEGER NOT NULL'),
+        ('titre', 'TEXT'),
+        ('montant', 'REAL'),
+        ('type', 'TEXT'),
+        ('description', 'TEXT'),
+        ('date', 'TEXT'),
+        ('date_creation', 'TEXT'),
+    ],
+    'paiements': [
+        ('id', 'INTEGER NOT NULL'),
+        ('voisin_id', 'INTEGER'),
+        ('cotisation_id', 'INTEGER'),
+        ('montant_paye', 'REAL'),
+        ('montant_du', 'REAL'),
+        ('date_paiement', 'TEXT'),
+        ('mode_paiement', 'TEXT'),
+        ('note', 'TEXT'),
+        ('date_enregistrement', 'TEXT'),
+    ],
+}
+
+INDEX = [
+    'CREATE INDEX IF NOT EXISTS idx_voisins_id ON voisins(id)',
+    'CREATE INDEX IF NOT EXISTS idx_voisins_appt ON voisins(etage, numero_appt)',
+    'CREATE INDEX IF NOT EXISTS idx_cotisations_id ON cotisations(id)',
+    'CREATE INDEX IF NOT EXISTS idx_paiements_id ON paiements(id)',
+    'CREATE INDEX IF NOT EXISTS idx_paiements_voisin ON paiements(voisin_id, cotisation_id)',
+    'CREATE INDEX IF NOT EXISTS idx_paiements_cotisation ON paiements(cotisation_id)',
+]
+
+
+def collection_du_fichier(fichier):
+    # "paiements.json" -> "paiements"
+    return os.path.splitext(os.path.basename(fichier))[0]
+
+
+def une_par_id(lignes):
+    """Première ligne de chaque id, comme les lit le magasin."""
+    par_id = {}
+    for ligne in lignes:
+        par_id.setdefault(ligne['id'], ligne)
+    return tuple(par_id.values())
+
+
+def rejouer_journal(lignes, operations):
+    """Applique des opérations de journal à une liste de lignes.
+
+    Le rejeu est idempotent : une insertion déjà présente à l'identique est
+    ignorée, ce qui permet de rejouer sans risque un journal déjà replié
+    (arrêt brutal pendant une compaction).
+    """
+    positions = {}
+    for i, ligne in enumerate(lignes):
+        positions.setdefault(ligne['id'], []).append(i)
+    supprimees = set()
+
+    for operation, cible in operations:
+        if operation == 'inserer':
+            existantes = [i for i in positions.get(cible['id'], []) if i not in supprimees]
+            if any(lignes[i] == cible for i in existantes):
+                continue
+            positions.setdefault(cible['id'], []).append(len(lignes))
+            lignes.append(dict(cible))
+        elif operation == 'modifier':
+            for i in positions.get(cible['id'], []):
+                lignes[i] = dict(cible)
+        elif operation == 'supprimer':
+            supprimees.update(positions.pop(cible, []))
+
+    if supprimees:
+        return [ligne for i, ligne in enumerate(lignes) if i not in supprimees]
+    return lignes
+
+
+class CompteurOctets:
+    """Octets écrits par un stockage : en tout, et par thread."""
+
+    def _initialiser_compteur(self):
+        self.octets_ecrits = 0
+        self._octets_thread = threading.local()
+
+    def _compter(self, octets):
+        self.octets_ecrits += octets
+        self._octets_thread.octets = self.octets_du_thread() + octets
+
+    def octets_du_thread(self):
+        return getattr(self._octets_thread, 'octets', 0)
+
+
+class StockageJSON(CompteurOctets):
+    """Un fichier `<collection>.json` par collection.
+
+    Pour les collections journalisées (les paiements), une écriture d'une
+    ligne n'est pas suivie d'une réécriture du fichier : elle est ajoutée au
+    journal `<collection>.journal.jsonl` (avec fsync). Le chargement rejoue le
+    fichier puis le journal. Quand le journal dépasse `seuil_compaction`
+    octets, il est replié dans le fichier par un thread en arrière-plan.
+    """
+
+    nom = 'json'
+    journalisees = ('paiements',)
+
+    def __init__(self, dossier='.', seuil_compaction=1_000_000, lecture_seule=False):
+        self.dossier = dossier
+        self.seuil_compaction = seuil_compaction
+        self.lecture_seule = lecture_seule
+        self._verrou = threading.Lock()
+        self._compactions = {}  # collection -> thread en cours
+        self._generation = {}  # collection -> nombre de sauvegardes complètes
+        self._initialiser_compteur()
+
+    def chemin(self, collection):
+        return os.path.join(self.dossier, f"{collection}.json")
+
+    def chemin_journal(self, collection, suffixe=''):
+        return os.path.join(self.dossier, f"{collection}.journal{suffixe}.jsonl")
+
+    def charger_compteurs(self):
+        chemin = os.path.join(self.dossier, 'compteurs.json')
+        if os.path.exists(chemin):
+            with open(chemin, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def sauvegarder_compteurs(self, compteurs):
+        with self._verrou:
+            self._ecrire_fichier(os.path.join(self.dossier, 'compteurs.json'), compteurs)
+
+    def charger_synthese(self):
+        chemin = os.path.join(self.dossier, 'synthese.json')
+        if os.path.exists(chemin):
+            with open(chemin, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return None
+
+    def sauvegarder_synthese(self, synthese):
+        with self._verrou:
+            self._ecrire_fichier(os.path.join(self.dossier, 'synthese.json'), synthese)
+
+    def charger(self, collection, defaut=None):
+        chemin = self.chemin(collection)
+        lignes = None
+        operations = []
+        # Fichier et journaux lus ensemble : une compaction ne peut pas
+        # remplacer le fichier entre les deux lectures
+        with self._verrou:
+            if os.path.exists(chemin):
+                with open(chemin, 'r', encoding='utf-8') as f:
+                    lignes = json.load(f)
+            if collection in self.journalisees:
+                # Journal en cours de compaction (ou interrompu), puis journal courant
+                operations = (self._lire_journal(self.chemin_journal(collection, '.compaction'))
+                              + self._lire_journal(self.chemin_journal(collection)))
+        if operations:
+            lignes = rejouer_journal(lignes if lignes is not None else [], operations)
+        if collection in self.journalisees and not self.lecture_seule:
+            self._compacter_si_necessaire(collection)
+        if lignes is None:
+            return [] if defaut is None else defaut
+        return lignes
+
+    def sauvegarder(self, collection, donnees, modification=None):
+        if collection in self.journalisees and modification is not None:
+            self._journaliser(collection, modification)
+            self._compacter_si_necessaire(collection)
+            return
+
+        with self._verrou:
+            self._ecrire_fichier(self.chemin(collection), donnees)
+            if collection in self.journalisees:
+                # Le fichier contient tout : journaux et compaction en cours sont caducs
+                self._generation[collection] = self._generation.get(collection, 0) + 1
+                for suffixe in ('', '.compaction'):
+                    if os.path.exists(self.chemin_journal(collection, suffixe)):
+                        os.remove(self.chemin_journal(collection, suffixe))
+
+    @staticmethod
+    def _ecrire_json(chemin, donnees):
+        # Renvoie le nombre d'octets écrits
+        if not isinstance(donnees, (list, dict)):
+            donnees = list(donnees)
+        with open(chemin, 'w', encoding='utf-8') as f:
+            json.dump(donnees, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+            return os.fstat(f.fileno()).st_size
+
+    def _ecrire_fichier(self, chemin, donnees):
+        # Écriture atomique : fichier temporaire puis remplacement
+        self._compter(self._ecrire_json(chemin + '.tmp', donnees))
+        os.replace(chemin + '.tmp', chemin)
+
+    @staticmethod
+    def _lire_journal(chemin):
+        operations = []
+        if not os.path.exists(chemin):
+            return operations
+        with open(chemin, 'r', encoding='utf-8') as f:
+            for ligne in f:
+                try:
+                    enregistrement = json.loads(ligne)
+                except json.JSONDecodeError:
+                    # Dernière ligne tronquée par un arrêt brutal
+                    break
+                operations.append((enregistrement['op'], enregistrement['cible']))
+        return operations
+
+    def _journaliser(self, collection, modification):
+        operation, cible = modification
+        # Un lot est journalisé comme autant d'insertions, en une seule écriture
+        operations = [('inserer', ligne) for ligne in cible] if operation == 'inserer_lot' \
+            else [modification]
+        enregistrement = ''.join(json.dumps({'op': op, 'cible': c}, ensure_ascii=False) + '\n'
+                                 for op, c in operations).encode('utf-8')
+        with self._verrou:
+            with open(self.chemin_journal(collection), 'ab') as f:
+                f.write(enregistrement)
+                f.flush()
+                os.fsync(f.fileno())
+            self._compter(len(enregistrement))
+
+    def _compacter_si_necessaire(self, collection):
+        journal = self.chemin_journal(collection)
+        mis_de_cote = self.chemin_journal(collection, '.compaction')
+        with self._verrou:
+            en_cours = self._compactions.get(collection)
+            if en_cours is not None and en_cours.is_alive():
+                return
+            if not os.path.exists(mis_de_cote):
+                if not os.path.exists(journal) or os.path.getsize(journal) < self.seuil_compaction:
+                    return
+                # Le journal courant est mis de côté ; les écritures suivantes
+                # repartent dans un journal neuf pendant la compaction
+                os.replace(journal, mis_de_cote)
+            # Sinon, une compaction interrompue est reprise telle quelle
+            thread = threading.Thread(target=self.compacter,
+                                      args=(collection, self._generation.get(collection, 0)),
+                                      name=f"compaction-{collection}", daemon=True)
+            self._compactions[collection] = thread
+        thread.start()
+
+    def compacter(self, collection, generation=None):
+        """Replie le journal mis de côté dans le fichier de la collection."""
+        chemin = self.chemin(collection)
+        mis_de_cote = self.chemin_journal(collection, '.compaction')
+        lignes = []
+        if os.path.exists(chemin):
+            with open(chemin, 'r', encoding='utf-8') as f:
+                lignes = json.load(f)
+        lignes = rejouer_journal(lignes, self._lire_journal(mis_de_cote))
+
+        temporaire = chemin + '.compaction.tmp'
+        octets = self._ecrire_json(temporaire, lignes)
+        with self._verrou:
+            self._compter(octets)
+            if generation is not None and self._generation.get(collection, 0) != generation:
+                # Une sauvegarde complète est passée entre-temps : elle fait foi
+                os.remove(temporaire)
+                return
+            os.replace(temporaire, chemin)
+            if os.path.exists(mis_de_cote):
+                os.remove(mis_de_cote)
+
+    def agreger_paiements(self):
+        # Pas d'agrégation côté stockage : les rapports calculent sur la liste
+        return None
+
+
+class StockageSQLite(CompteurOctets):
+    """Base SQLite (mode WAL) avec une table indexée par collection.
+
+    Les lignes sont rendues dans leur ordre d'insertion (rowid), comme dans
+    les fichiers JSON. La colonne `id` n'est pas une clé primaire : les
+    fichiers historiques peuvent contenir des doublons, qui sont migrés tels
+    quels et modifiés ou supprimés ensemble, comme avec les listes.
+    """
+
+    nom = 'sqlite'
+
+    def __init__(self, chemin, lecture_seule=False):
+        self.chemin = chemin
+        self.dossier = os.path.dirname(chemin) or '.'
+        self.lecture_seule = lecture_seule
+        self._initialiser_compteur()
+        if lecture_seule:
+            if not os.path.exists(chemin):
+                raise FileNotFoundError(f"Base introuvable : {chemin}")
+            return
+        with self._transaction() as cx:
+            cx.execute('PRAGMA journal_mode=WAL')
+            for collection, colonnes in SCHEMA.items():
+                definition = ', '.join(f"{nom} {type_sql}" for nom, type_sql in colonnes)
+                cx.execute(f"CREATE TABLE IF NOT EXISTS {collection} ({definition})")
+            for requete in INDEX:
+                cx.execute(requete)
+            cx.execute('CREATE TABLE IF NOT EXISTS meta (cle TEXT PRIMARY KEY, valeur TEXT)')
+
+    @contextmanager
+    def _transaction(self):
+        if self.lecture_seule:
+            cx = sqlite3.connect(f"file:{self.chemin}?mode=ro", uri=True, timeout=30)
+        else:
+            cx = sqlite3.connect(self.chemin, timeout=30)
+        try:
+            cx.execute('PRAGMA synchronous=NORMAL')
+            with cx:
+                yield cx
+        finally:
+            cx.close()
+
+    @staticmethod
+    def _colonnes(collection):
+        return [nom for nom, _ in SCHEMA[collection]]
+
+    @staticmethod
+    def _valeurs(collection, ligne):
+        return [ligne.get(nom) for nom, _ in SCHEMA[collection]]
+
+    @staticmethod
+    def _taille(valeurs):
+        return sum(len(str(v).encode('utf-8')) for v in valeurs if v is not None)
+
+    def charger(self, collection, defaut=None):
+        colonnes = self._colonnes(collection)
+        with self._transaction() as cx:
+            lignes = cx.execute(
+                f"SELECT {', '.join(colonnes)} FROM {collection} ORDER BY rowid"
+            ).fetchall()
+        # Les champs absents du JSON d'origine sont stockés à NULL
+        return [{c: v for c, v in zip(colonnes, ligne) if v is not None} for ligne in lignes]
+
+    def sauvegarder(self, collection, donnees, modification=None):
+        colonnes = self._colonnes(collection)
+        marqueurs = ', '.join('?' for _ in colonnes)
+        with self._transaction() as cx:
+            if modification is None:
+                cx.execute(f"DELETE FROM {collection}")
+                valeurs = [self._valeurs(collection, ligne) for ligne in donnees]
+                cx.executemany(f"INSERT INTO {collection} ({', '.join(colonnes)}) VALUES ({marqueurs})",
+                               valeurs)
+                self._compter(sum(self._taille(v) for v in valeurs))
+                return
+
+            operation, cible = modification
+            if operation == 'inserer':
+                valeurs = self._valeurs(collection, cible)
+                cx.execute(f"INSERT INTO {collection} ({', '.join(colonnes)}) VALUES ({marqueurs})",
+                           valeurs)
+            elif operation == 'inserer_lot':
+                lot = [self._valeurs(collection, ligne) for ligne in cible]
+                cx.executemany(f"INSERT INTO {collection} ({', '.join(colonnes)}) VALUES ({marqueurs})",
+                               lot)
+                valeurs = [v for ligne in lot for v in ligne]
+            elif operation == 'modifier':
+                affectations = ', '.join(f"{c} = ?" for c in colonnes[1:])
+                valeurs = self._valeurs(collection, cible)[1:] + [cible['id']]
+                cx.execute(f"UPDATE {collection} SET {affectations} WHERE id = ?", valeurs)
+            elif operation == 'supprimer':
+                valeurs = [cible]
+                cx.execute(f"DELETE FROM {collection} WHERE id = ?", valeurs)
+            else:
+                raise ValueError(f"Modification inconnue : {operation}")
+            self._compter(self._taille(valeurs))
+
+    def charger_compteurs(self):
+        with self._transaction() as cx:
+            ligne = cx.execute("SELECT valeur FROM meta WHERE cle = 'compteurs'").fetchone()
+        return json.loads(ligne[0]) if ligne else {}
+
+    def sauvegarder_compteurs(self, compteurs):
+        valeur = json.dumps(compteurs)
+        with self._transaction() as cx:
+            cx.execute("INSERT OR REPLACE INTO meta (cle, valeur) VALUES ('compteurs', ?)", (valeur,))
+        self._compter(len(valeur))
+
+    def charger_synthese(self):
+        with self._transaction() as cx:
+            ligne = cx.execute("SELECT valeur FROM meta WHERE cle = 'synthese'").fetchone()
+        return json.loads(ligne[0]) if ligne else None
+
+    def sauvegarder_synthese(self, synthese):
+        valeur = json.dumps(synthese)
+        with self._transaction() as cx:
+            cx.execute("INSERT OR REPLACE INTO meta (cle, valeur) VALUES ('synthese', ?)", (valeur,))
+        self._compter(len(valeur))
+
+    def agreger_paiements(self):
+        # Total payé (en centimes) et nombre de versements par (voisin, cotisation)
+        with self._transaction() as cx:
+            return cx.execute(
+                "SELECT voisin_id, cotisation_id, SUM(CAST(ROUND(montant_paye * 100) AS INTEGER)), COUNT(*) "
+                "FROM paiements GROUP BY voisin_id, cotisation_id"
+            ).fetchall()
+
+    def migrer_depuis_json(self, dossier='.'):
+        """Importe une seule fois les fichiers JSON existants dans la base.
+
+        Renvoie True si la migration a eu lieu, False si elle était déjà faite.
+        """
+        source = StockageJSON(dossier)
+        with self._transaction() as cx:
+            if cx.execute("SELECT 1 FROM meta WHERE cle = 'migration_json'").fetchone():
+                return False
+            for collection in COLLECTIONS:
+                colonnes = self._colonnes(collection)
+                marqueurs = ', '.join('?' for _ in colonnes)
+                cx.executemany(f"INSERT INTO {collection} ({', '.join(colonnes)}) VALUES ({marqueurs})",
+                               [self._valeurs(collection, ligne) for ligne in source.charger(collection)])
+            cx.execute("INSERT OR REPLACE INTO meta (cle, valeur) VALUES ('compteurs', ?)",
+                       (json.dumps(source.charger_compteurs()),))
+            cx.execute("INSERT INTO meta (cle, valeur) VALUES ('migration_json', ?)",
+                       (datetime.now().strftime("%Y-%m-%d %H:%M"),))
+        return True
+
+
+def ouvrir_stockage(type_stockage='json', dossier='.', base='voisins.db', lecture_seule=False):
+    """Ouvre le stockage demandé ("json" ou "sqlite") pour le dossier donné.
+
+    À la première ouverture d'une base SQLite, les fichiers JSON du dossier
+    (journal des paiements compris) y sont migrés ; en lecture seule, la base
+    doit déjà exister (FileNotFoundError sinon).
+    """
+    if type_stockage == 'json':
+        return StockageJSON(dossier, lecture_seule=lecture_seule)
+    if type_stockage == 'sqlite':
+        stockage = StockageSQLite(os.path.join(dossier, base), lecture_seule=lecture_seule)
+        if not lecture_seule:
+            stockage.migrer_depuis_json(dossier)
+        return stockage
+    raise ValueError(f"Stockage inconnu : {type_stockage}")